@@ -26,62 +26,690 @@ users to earn rewards for completing individualized tasks.
 """
 import tkinter as tk #Import Tkiner library for GUI dev
 import tkinter.font as tkFont #Import the font mod from Tkinter for custom fonts
-import pickle #Import pickle to save and load persistent data
-import random  #Import random to allow for random selection of rewards
 from tkinter import messagebox #Import messagebox for validation checking
+from tkinter import ttk #Import ttk for the child picker in kiosk mode
+import argparse #Import argparse to choose the client and database at launch
+import queue #Import queue to read changes pushed by the sync server and failed saves
+import time #Import time to stamp entries saved in the background
+from datetime import date, datetime #Import datetime to read the date of a balance lookup and today's tasks
+from contextlib import nullcontext #Import nullcontext for saves that are already batched
+from assets import AssetManager #Import the cached image loader
+from balance_index import BalanceIndex #Import the as-of balance index
+from crdt import COUNTER_KEY, PNCounter, load_device_id, new_device_id #Import the conflict-free balance counter
+from ledger import RECORD_SIGNS #Import the sign each ledger record applies to the balance
+from metrics import REGISTRY, count, record_startup, serve_metrics, timed, write_metrics #Import the instrumentation
+from portal_editor import VirtualTable, build_rows, column_values #Import the virtualized portal editor
+from profiles import DEFAULT_WARM_PROFILES, ProfileCache #Import the warm profile cache
+from reward_catalog import RewardCatalog #Import the sorted reward cost index
+from schedule import SCHEDULES_KEY, CalendarIndex, ScheduleError, parse_schedule #Import the task schedules
+from scoring import ScoringError, score_entry #Import the headless scoring rules
+from scoring_rules import RULES_KEY, RuleError, minute_of_day, parse_rules, rescore, streak_on #Import the compiled scoring rules
+from search_index import SearchIndex #Import the search-as-you-type index over task and reward names
+from session_history import HISTORY_KEY, SessionHistory #Import the compact session history
+from startup_timer import StartupTimer #Import the launch phase timer
+from statefile import StateFileBackend #Import the binary state file backend
+from stats import SNAPSHOT_EVERY, STATS_KEY, StatsEngine #Import the running statistics
+from storage import DEFAULT_CLIENT, SQLiteBackend, check_client_id, diff_list #Import the storage backends
+from sync_service import DEFAULT_PORT, RemoteBackend #Import the sync server client
+from undo import (INVERSE_KINDS, EVENT_SLOTS, CHECKPOINT_SLOTS, UNDO_CHECKPOINTS_KEY, UNDO_EVENTS_KEY, UNDO_KEY,
+                  EventLog, apply_catalog, diff_both_ways) #Import the undo event log
+from view_pool import BoundLabel, Debouncer, ResourceGauge, WidgetPool #Import the widget reuse helpers
+from watchdog import StallWatchdog #Import the event loop stall watchdog
+from write_behind import WriteBehindQueue, merge_list_changes #Import the background writer
+
+#prefix of the counter entry a ledger from before PN-counters is carried over under
+LEDGER_DEVICE = "ledger"
+
+#storage key of the ledger position saved with the stats, where the next catch-up starts reading
+LEDGER_POSITION_KEY = "ledger_position"
+
+#milliseconds between applying changes pushed by the sync server
+REMOTE_CHECK_MS = 200
+
+#number of lines shown under the Stats header
+STATS_LINES = 6
+
+#milliseconds between rewrites of the --metrics-file export
+METRICS_EXPORT_MS = 15000
+
+#milliseconds between checks for saves the background writer gave up on
+SAVE_ERROR_CHECK_MS = 1000
+
+#number of editable rows the Parent Portal shows at once
+PORTAL_VISIBLE_ROWS = 10
+
+#milliseconds of quiet typing in a filter box before the filtered list is redrawn
+FILTER_DEBOUNCE_MS = 120
+
+#default tasks, rewards and costs for a client with no saved data
+DEFAULT_TASKS = ["Task 1", "Task 2", "Task 3", "Task 4", "Task 5", "Task 6", "Task 7"]
+DEFAULT_REWARDS = ["Reward 1", "Reward 2", "Reward 3"]
+DEFAULT_REWARD_COSTS = [10, 20, 30]
 
 class DataManager:
     """
-    DataManager class handles loading and saving data using pickle.
-    Manges tasks, rewards, reward costs, and total points earned
+    DataManager class handles loading and saving data through a storage backend.
+    Manges tasks, rewards, reward costs, and total points earned for one client.
+    Points are kept in an append-only ledger instead of a single pickled number,
+    and the balance is a per-device PN-counter so offline tablets merge cleanly.
     """
-    def __init__(self):
-        """Initialize the data by loading from files or setting defaults"""
+    def __init__(self, client_id=DEFAULT_CLIENT, backend=None, write_behind=False, device_id=None,
+                 close_backend=True, on_save_error=None):
+        """
+        Initialize the data by loading from the backend or setting defaults
+        Arguments:
+            client_id(str): client whose data is loaded
+            backend(StorageBackend): storage to use (defaults to the state file)
+            write_behind(bool): perform saves on a background thread instead of the caller's
+            device_id(str): id this device's awards are counted under (defaults to .device_id)
+            close_backend(bool): close the backend in close() (off when several clients share it)
+            on_save_error(callable): called from the writer thread with each save that keeps failing
+        """
+        self.client_id = client_id
+        self.backend = backend if backend is not None else StateFileBackend()
+        self.close_backend = close_backend
 
         # Load task list from file or use defualt names is file doesn't exist
-        self.tasks = self.load_data("tasks.pkl", [
-            "Task 1", "Task 2", "Task 3",
-            "Task 4", "Task 5", "Task 6", "Task 7"
-         ])
+        self.tasks = self.load_data("tasks.pkl", list(DEFAULT_TASKS))
+
         #load reward list from file of use defualt names if file doesn't exist 
-        self.rewards = self.load_data("rewards.pkl", ["Reward 1", "Reward 2", "Reward 3"])
+        self.rewards = self.load_data("rewards.pkl", list(DEFAULT_REWARDS))
 
         #load reward costs from file or set to default if no saved data
-        self.reward_costs = self.load_data("reward_costs.pkl", [10, 20, 30])
+        self.reward_costs = self.load_data("reward_costs.pkl", list(DEFAULT_REWARD_COSTS))
+
+        #load the schedule of each task ("" is every day), kept the same length as the tasks
+        self.task_schedules = self.fit_schedules(self.load_data(SCHEDULES_KEY, []), self.tasks)
+
+        #which tasks apply on each day, precomputed so the checklist never evaluates a rule
+        self.calendar = CalendarIndex(self.tasks, self.task_schedules)
+
+        #scoring rule lines from the Parent Portal, compiled once into the scoring function
+        self.scoring_rules = self.load_data(RULES_KEY, [])
+        self.rules = self.compile_rules(self.scoring_rules)
+
+        #open the client's points ledger and rebuild the balance from it
+        self.ledger = self.backend.open_ledger(self.client_id)
+
+        #the balance is a PN-counter with one entry per device, merged without conflicts
+        self.device_id = device_id or load_device_id()
+        stored_counter = self.load_data(COUNTER_KEY, None)
+        self.counter = PNCounter.from_dict(stored_counter)
+        self.counter_sync = {} #id(backend) -> (our clock last sent, its clock last seen)
+
+        #a ledger from before counters existed is carried over once per store, under its own
+        #entry so merging with another store's seed adds the two instead of keeping the larger
+        seed_counter = stored_counter is None and self.ledger.balance != 0
+        if seed_counter:
+            self.count_points(new_device_id(LEDGER_DEVICE), self.ledger.balance)
+
+        #total accumulated points as merged across every device
+        self.total_points = self.counter.value()
+
+        #optional background writer so saves never block the Tk main loop
+        self.writer = None
+        if write_behind:
+            self.ledger.sync = False #the writer syncs once per batch instead of once per append
+            self.writer = WriteBehindQueue(self.backend.transaction, self.ledger.flush, on_error=on_save_error)
+        if seed_counter:
+            self.persist(("counter",), self.sync_counter)
+
+        #as-of balance index, built from the ledger the first time it is queried
+        #(set before the catch-up below, which folds records into it once it exists)
+        self.balance_index = None
+
+        #running stats, rebuilt from the last snapshot plus the records appended since
+        self.stats = StatsEngine.from_dict(self.load_data(STATS_KEY, None))
+
+        #every scored session in typed arrays, older months compressed, caught up the same way
+        self.session_history = SessionHistory.from_dict(self.load_data(HISTORY_KEY, None))
+        self.ledger_start = self.load_data(LEDGER_POSITION_KEY, None) #(sequence, offset) or None
+        self.catch_up_stats()
+
+        #every change is recorded as an invertible event for undo and redo
+        self.undo_log = EventLog.from_stored(
+            self.load_data(UNDO_KEY, None), self.load_data(UNDO_EVENTS_KEY, []),
+            self.load_data(UNDO_CHECKPOINTS_KEY, []), self.catalog_state(), self.total_points
+            )
+
+        #rewards sorted by cost, told about every balance change for threshold events
+        self.reward_catalog = RewardCatalog(self.rewards, self.reward_costs)
+        self.reward_catalog.update_balance(self.total_points)
 
-        #load and initialize the total accumulated points from file or set to 0 if not found
-        self.total_points = self.load_data("total_points.pkl", 0) 
+        #word prefix indexes over the task and reward names, built the first time each is searched
+        self.search_indexes = {}
 
 
+    @staticmethod
+    def fit_schedules(schedules, tasks):
+        """Return the schedules cut or padded with "" (every day) to one per task"""
+        return [schedule or "" for schedule in schedules[:len(tasks)]] + [""] * max(0, len(tasks) - len(schedules))
+
+    @staticmethod
+    def compile_rules(lines):
+        """Return the compiled rules, or the default scoring if the saved rules can't be read"""
+        try:
+            return parse_rules(lines)
+        except RuleError as e:
+            print(f"Ignoring the saved scoring rules: {e}")
+            return parse_rules([])
+
+    def storage_key(self, filename):
+        """Return the backend key for a legacy file name (e.g. "tasks.pkl" -> "tasks")"""
+        return filename[:-4] if filename.endswith(".pkl") else filename
+
+    @timed("load_data", "Time to load one stored value")
     def load_data(self, filename, default_data):
         """
-        Load data from a file using Pickle. If File not found - return default value.
+        Load data for this client from the storage backend. If not found - return default value.
         Arguments: 
-            filename(str): name of the file to load data from
-            default_data(any): default data to return if file doesn't exist
+            filename(str): name of the value to load (legacy file names are accepted)
+            default_data(any): default data to return if nothing is stored
         Returns:
-            loaded data or defualt value if no file found
+            loaded data or defualt value if nothing found
         """
+        return self.backend.load(self.client_id, self.storage_key(filename), default_data)
 
-        try:
-            #attmpt to open the file in binary read mode and load its contents
-            with open(filename, "rb") as f: 
-                return pickle.load(f) #deserialize and return stored data
-        except FileNotFoundError:
-            #if the file is missing, return default data
-            return default_data
-
+    @timed("save_data", "Time to save one stored value (or queue it for the background writer)")
     def save_data(self, filename, data):
         """
-        Save the data to a file using Pickle
+        Save the data for this client to the storage backend
         Arguments:
-            filename(str): Name of the file to save data to
-            data(any): the data to be serialized and saved
+            filename(str): name of the value to save (legacy file names are accepted)
+            data(any): the data to be saved
         """
+        key = self.storage_key(filename)
+        self.persist(("value", key), self.backend.save, self.client_id, key, data)
 
-        #open the file in binary write mode and dave the data using pickle
-        with open(filename, "wb") as f:
-            pickle.dump(data, f) #serialize and write data to file
+    @timed("persist", "Time the caller spends on any write, run now or queued")
+    def persist(self, key, function, *args, merge=None, **kwargs):
+        """
+        Run a write now, or hand it to the write-behind queue if one is running.
+        Arguments:
+            key(hashable): queued writes with the same key are coalesced (None never coalesces)
+            function(callable): the write to perform
+            merge(callable): combines a queued write's arguments with a newer one's
+        """
+        if self.writer is None:
+            return function(*args, **kwargs)
+        self.writer.submit(key, function, *args, merge=merge, **kwargs)
+
+    def flush(self):
+        """Block until every queued write has reached the backend"""
+        if self.writer is not None:
+            self.writer.flush()
+
+    def update_catalog(self, tasks, rewards, reward_costs, task_schedules=None, scoring_rules=None, record=True):
+        """
+        Replace the tasks, rewards and reward costs, saving only the records that changed.
+        Arguments:
+            tasks(list): new task names
+            rewards(list): new reward names
+            reward_costs(list): new reward costs
+            task_schedules(list): new schedule per task (None keeps the current ones)
+            scoring_rules(list): new scoring rule lines (None keeps the current ones)
+            record(bool): record the change so it can be undone (off while undoing)
+        Raises:
+            RuleError: if a scoring rule can't be read, before anything is saved
+        """
+        task_schedules = self.fit_schedules(self.task_schedules if task_schedules is None else task_schedules, tasks)
+        scoring_rules = list(self.scoring_rules if scoring_rules is None else scoring_rules)
+        rules = parse_rules(scoring_rules) if scoring_rules != self.scoring_rules else self.rules
+        event = {"type": "catalog", "forward": {}, "backward": {}}
+        with self.backend.transaction() if self.writer is None else nullcontext():
+            for key, new in (("tasks", tasks), ("rewards", rewards), ("reward_costs", reward_costs),
+                             (SCHEDULES_KEY, task_schedules), (RULES_KEY, scoring_rules)):
+                changes = diff_list(getattr(self, key), new)
+                if changes is not None:
+                    #queued diffs to the same list are merged into one save
+                    self.persist(("list", key), self.backend.save_changes,
+                                 self.client_id, key, changes, len(new), merge=merge_list_changes)
+                    event["forward"][key], event["backward"][key] = diff_both_ways(getattr(self, key), new)
+
+        self.update_calendar(tasks, task_schedules)
+        self.update_search(tasks, rewards)
+        self.tasks, self.rewards, self.reward_costs = tasks, rewards, reward_costs
+        self.task_schedules = task_schedules
+        self.reward_catalog.load(self.rewards, self.reward_costs)
+        if rules is not self.rules:
+            self.scoring_rules, old_rules, self.rules = scoring_rules, self.rules, rules
+            self.rescore_history(old_rules)
+        if record and event["forward"]:
+            self.record_event(event)
+
+    def rescore_history(self, old_rules):
+        """
+        Score the sessions a rule change affects again, appending a "rescore" record for each difference.
+        Only the days the change can reach are recomputed, the rest of the history is never read.
+        Arguments:
+            old_rules(RuleSet): rules the history was scored with
+        Returns:
+            int: number of sessions whose points changed
+        """
+        #the stats and history must hold every ledger record before they are compared against
+        self.flush()
+        self.catch_up_stats()
+        adjustments = rescore(self.session_history, self.stats.daily_points, old_rules, self.rules)
+        for ts, delta in adjustments:
+            self.append_points("rescore", delta, rescored_ts=ts)
+        return len(adjustments)
+
+    def score_session(self, self_grade, bonus, tasks, ts):
+        """
+        Score an entry with the compiled rules.
+        Arguments:
+            self_grade(float): validated self-grade
+            bonus(float): validated bonus points
+            tasks(list): names of the checked tasks
+            ts(float): time of the entry, for time-of-day rules, streaks and the day cap
+        Returns:
+            float: points earned
+        """
+        day = date.fromtimestamp(ts)
+        daily_points = self.stats.daily_points
+        return self.rules.score(self_grade, bonus, tasks, minute_of_day(ts), streak_on(daily_points, day),
+                                daily_points.get(day.isoformat(), 0))
+
+    def update_calendar(self, tasks, task_schedules):
+        """Recompute the calendar only for the task positions whose name or schedule changed"""
+        for position, (task, schedule) in enumerate(zip(tasks, task_schedules)):
+            if (position >= len(self.tasks) or self.tasks[position] != task
+                    or self.task_schedules[position] != schedule):
+                self.calendar.update(position, task, schedule)
+        self.calendar.resize(len(tasks))
+
+    def update_search(self, tasks, rewards):
+        """Re-index only the task and reward positions whose name changed, in the indexes built so far"""
+        for key, names in (("tasks", tasks), ("rewards", rewards)):
+            if key in self.search_indexes:
+                self.search_indexes[key].update(names)
+
+    def search_catalog(self, key, query):
+        """
+        Return the positions of the tasks or rewards whose words start with the words of a query.
+        Arguments:
+            key(str): "tasks" or "rewards"
+            query(str): text typed in a filter box
+        Returns:
+            list: matching positions in the list, in list order
+        """
+        if key not in self.search_indexes:
+            self.search_indexes[key] = SearchIndex(getattr(self, key))
+        return self.search_indexes[key].search(query)
+
+    def tasks_for(self, day=None):
+        """
+        Return the tasks that apply on a day.
+        Arguments:
+            day(date): day to look up (defaults to today)
+        Returns:
+            tuple: task names in their list order
+        """
+        return self.calendar.tasks_on(day or date.today())
+
+    def award_points(self, points, **details):
+        """
+        Record points earned from an entry as a new ledger record.
+        Arguments:
+            points(float): number of points earned
+            details: extra information to keep with the entry (self grade, bonus, tasks)
+        Returns:
+            float: the new total points
+        """
+        details.setdefault("ts", time.time())
+        total = self.append_points("award", points, **details)
+        self.record_event({"type": "points", "kind": "award", "amount": points, "details": details})
+        return total
+
+    def redeem_points(self, reward, cost):
+        """
+        Record a reward redemption as a new ledger record.
+        Arguments:
+            reward(str): name of the redeemed reward
+            cost(float): number of points the reward costs
+        Returns:
+            float: the new total points
+        """
+        details = {"reward": reward, "ts": time.time()}
+        total = self.append_points("redeem", cost, **details)
+        self.record_event({"type": "points", "kind": "redeem", "amount": cost, "details": details})
+        return total
+
+    def catalog_state(self):
+        """Return copies of the tasks, rewards, reward costs, task schedules and scoring rules"""
+        return {"tasks": list(self.tasks), "rewards": list(self.rewards), "reward_costs": list(self.reward_costs),
+                SCHEDULES_KEY: list(self.task_schedules), RULES_KEY: list(self.scoring_rules)}
+
+    def record_event(self, event):
+        """Add a change that was just made to the undo log and save the log"""
+        self.undo_log.record(event, lambda: {"catalog": self.catalog_state(), "balance": self.total_points})
+        self.save_undo_log()
+
+    def save_undo_log(self):
+        """Save the undo log's new events and checkpoints and its header, queued saves are merged"""
+        header, events, checkpoints = self.undo_log.take_changes()
+        for key, changes, slots in ((UNDO_EVENTS_KEY, events, EVENT_SLOTS),
+                                    (UNDO_CHECKPOINTS_KEY, checkpoints, CHECKPOINT_SLOTS)):
+            if changes:
+                self.persist(("list", key), self.backend.save_changes,
+                             self.client_id, key, changes, slots, merge=merge_list_changes)
+        self.persist(("value", UNDO_KEY), self.backend.save, self.client_id, UNDO_KEY, header)
+
+    def apply_event(self, event, direction):
+        """
+        Apply an event again ("forward") or reverse it ("backward") without recording it.
+        Points are reversed by a compensating ledger record, never by removing one.
+        """
+        if event["type"] == "points":
+            details = dict(event["details"])
+            if direction == "forward":
+                self.append_points(event["kind"], event["amount"], **details)
+            else:
+                #an award rescored since it was made first has its rescoring taken back
+                session = self.session_history.find(details["ts"]) if event["kind"] == "award" else None
+                if session is not None and session.points != event["amount"]:
+                    self.append_points("rescore", event["amount"] - session.points, rescored_ts=details["ts"])
+                details["undone_ts"] = details.pop("ts")
+                self.append_points(INVERSE_KINDS[event["kind"]], event["amount"], **details)
+        else:
+            catalog = apply_catalog(self.catalog_state(), event, direction)
+            self.update_catalog(catalog["tasks"], catalog["rewards"], catalog["reward_costs"],
+                                catalog[SCHEDULES_KEY], catalog[RULES_KEY], record=False)
+
+    def undo(self):
+        """
+        Undo the last change.
+        Returns:
+            dict: the event undone, or None if there was nothing to undo
+        """
+        if not self.undo_log.can_undo():
+            return None
+        event = self.undo_log.undo()
+        self.apply_event(event, "backward")
+        self.save_undo_log()
+        return event
+
+    def redo(self):
+        """
+        Redo the last undone change.
+        Returns:
+            dict: the event redone, or None if there was nothing to redo
+        """
+        if not self.undo_log.can_redo():
+            return None
+        event = self.undo_log.redo()
+        self.apply_event(event, "forward")
+        self.save_undo_log()
+        return event
+
+    def undo_to(self, position):
+        """
+        Undo every change after a position in the undo log.
+        Points are reversed one record each; the catalog is rebuilt once from the
+        nearest checkpoint instead of reversing every Parent Portal save in turn.
+        Arguments:
+            position(int): log position to go back to (clamped to the oldest kept event)
+        """
+        position = max(position, self.undo_log.base)
+        catalog_changed = False
+        while self.undo_log.cursor > position:
+            event = self.undo_log.undo()
+            if event["type"] == "points":
+                self.apply_event(event, "backward")
+            else:
+                catalog_changed = True
+        if catalog_changed:
+            catalog = self.undo_log.state_at(position)["catalog"]
+            #checkpoints from before schedules or rules existed have none, so the current ones are kept
+            self.update_catalog(catalog["tasks"], catalog["rewards"], catalog["reward_costs"],
+                                catalog.get(SCHEDULES_KEY), catalog.get(RULES_KEY), record=False)
+        self.save_undo_log()
+
+    def append_points(self, kind, amount, **details):
+        """
+        Append one record to the ledger, now or through the write-behind queue.
+        Arguments:
+            kind(str): "award", "redeem", an undo_* reversal or "rescore"
+            amount(float): number of points (signed for a rescore)
+            details: extra information to keep with the record
+        Returns:
+            float: the new total points
+        """
+        #stamp the time now, the record itself may be written by the background worker
+        details.setdefault("ts", time.time())
+        if self.writer is None:
+            self.ledger.append(kind, amount, **details)
+        else:
+            #the counter already has these points, so the record is retried until it is written
+            self.writer.submit(None, self.ledger.append, kind, amount, keep=True, **details)
+        self.record_stats(dict(details, kind=kind, amount=amount))
+
+        #count the points against this device and share the change with the backend
+        self.count_points(self.device_id, RECORD_SIGNS[kind] * amount)
+        self.persist(("counter",), self.sync_counter)
+
+        self.total_points = self.counter.value()
+        self.reward_catalog.update_balance(self.total_points)
+        return self.total_points
+
+    def record_stats(self, record):
+        """
+        Fold a record just appended by this tablet into the running stats.
+        Arguments:
+            record(dict): the record as written to the ledger
+        """
+        self.fold_record(record)
+        if self.stats.sequence % SNAPSHOT_EVERY == 0:
+            self.save_stats()
+
+    def catch_up_stats(self):
+        """
+        Fold every ledger record newer than the stats or the session history into them.
+        Returns:
+            bool: True if any record was folded in
+        """
+        folded = 0
+        for record in self.ledger.history(after=self.folded_sequence(), start=self.ledger_start):
+            self.fold_record(record)
+            folded += 1
+        if folded >= SNAPSHOT_EVERY:
+            self.save_stats()
+        return folded > 0
+
+    def folded_sequence(self):
+        """Return the sequence number both the stats and the session history have folded in"""
+        return min(self.stats.sequence, self.session_history.sequence)
+
+    def fold_record(self, record):
+        """Add a record to the stats, the session history and, once it has been built, the balance index"""
+        #records appended by this tablet have no seq yet and always go to both; on catch-up a
+        #snapshot written before the session history existed covers more of the ledger than it does
+        seq = record.get("seq")
+        if seq is None or seq > self.stats.sequence:
+            self.stats.add(record)
+            if self.balance_index is not None:
+                self.balance_index.add(record)
+        if seq is None or seq > self.session_history.sequence:
+            self.session_history.add(record)
+
+    def points_index(self):
+        """
+        Return the as-of balance index, building it from the ledger the first time.
+        Only records the stats already cover are read, later ones arrive through fold_record.
+        """
+        if self.balance_index is None:
+            self.flush()
+            covered = self.stats.sequence
+            self.balance_index = BalanceIndex(
+                record for record in self.ledger.history() if record["seq"] <= covered
+                )
+        return self.balance_index
+
+    def balance_at(self, when):
+        """
+        Return the balance as it was at a moment, in O(log n).
+        Arguments:
+            when(float): timestamp
+        """
+        return self.points_index().balance_at(when)
+
+    def points_between(self, start, end):
+        """
+        Return the points earned and redeemed between two moments, in O(log n).
+        Arguments:
+            start(float): timestamp the range starts after
+            end(float): timestamp the range ends at
+        Returns:
+            dict: earned, redeemed and net change
+        """
+        return self.points_index().range_totals(start, end)
+
+    def save_stats(self):
+        """Save a snapshot of the stats and the session history, queued behind the ledger records they cover"""
+        self.session_history.archive_old()
+        #the ledger may still be behind the stats here, which only means reading a little more next time
+        self.ledger_start = self.ledger.position()
+        self.persist(None, self.backend.save_many, self.client_id, {
+            STATS_KEY: self.stats.to_dict(),
+            HISTORY_KEY: self.session_history.to_dict(),
+            LEDGER_POSITION_KEY: self.ledger_start,
+            })
+
+    def sessions(self, start=None, end=None):
+        """
+        Return the sessions between two moments, leaving out undone ones.
+        Arguments:
+            start(float): first timestamp included (None for the beginning)
+            end(float): timestamps before this are included (None for no limit)
+        Returns:
+            list: SessionView per session, oldest month first
+        """
+        return [session for session in self.session_history.scan(start, end) if not session.undone]
+
+    def stats_summary(self):
+        """Return the values shown in the Stats panel"""
+        return self.stats.summary(self.tasks)
+
+    def count_points(self, device_id, points):
+        """
+        Add points to (or, if negative, take them from) a device's counter entries.
+        Arguments:
+            device_id(str): device the change is counted under
+            points(float): signed change in the balance
+        """
+        if points >= 0:
+            self.counter.increment(device_id, points)
+        else:
+            self.counter.decrement(device_id, -points)
+
+    def sync_counter(self, backend=None):
+        """
+        Exchange counter changes with a store and merge in the entries it has that we don't.
+        Only entries changed since the last exchange with that store are sent.
+        Arguments:
+            backend(StorageBackend): store to sync with (defaults to this client's backend)
+        Returns:
+            float: the merged balance
+        """
+        backend = backend if backend is not None else self.backend
+        sent, seen = self.counter_sync.get(id(backend), (0, 0))
+        with self.counter.lock:
+            clock = self.counter.clock
+            delta = self.counter.delta_since(sent).to_dict()
+
+        missing, remote_clock = backend.exchange_counter(self.client_id, delta, seen)
+        self.counter.merge(PNCounter.from_dict(missing))
+        self.counter_sync[id(backend)] = (clock, remote_clock)
+        return self.counter.value()
+
+    def close(self):
+        """Write any queued data, then close the points ledger and the storage backend"""
+        self.save_stats()
+        if self.writer is not None:
+            self.writer.close()
+        self.ledger.close()
+        if self.close_backend:
+            self.backend.close()
+
+
+class RemoteDataManager(DataManager):
+    """
+    DataManager for a tablet that shares its data with other tablets through the sync server.
+    Changes pushed by the server are applied on the Tk thread by apply_remote_changes.
+    """
+    def __init__(self, client_id, host, port=DEFAULT_PORT, write_behind=False, on_save_error=None):
+        """
+        Connect to the sync server and load the client's data in one pipelined round trip.
+        Arguments:
+            client_id(str): client whose data is loaded
+            host(str): sync server address
+            port(int): sync server port
+            write_behind(bool): send saves from a background thread
+            on_save_error(callable): called from the writer thread with each save that keeps failing
+        """
+        backend = RemoteBackend(host, port)
+        backend.load_many(client_id, {
+            "tasks": list(DEFAULT_TASKS),
+            "rewards": list(DEFAULT_REWARDS),
+            "reward_costs": list(DEFAULT_REWARD_COSTS),
+            SCHEDULES_KEY: [],
+            RULES_KEY: [],
+            COUNTER_KEY: None,
+            })
+        super().__init__(client_id, backend, write_behind, on_save_error=on_save_error)
+
+    def record_stats(self, record):
+        """Other tablets share the ledger, so stats are only folded in from it in ledger order"""
+
+    def apply_remote_changes(self):
+        """
+        Apply every change pushed by the server since the last call. Call from the Tk thread.
+        Returns:
+            bool: True if the balance or the catalog changed
+        """
+        changed = False
+        while True:
+            try:
+                message = self.backend.client.pushes.get_nowait()
+            except queue.Empty:
+                break
+            if message["client"] != self.client_id:
+                continue
+            if message["push"] == "invalidate":
+                #reload the catalog lists another tablet saved, the cache was already dropped
+                lists = self.catalog_state()
+                for key in message["keys"]:
+                    if key in lists:
+                        lists[key] = self.load_data(key, lists[key])
+                task_schedules = self.fit_schedules(lists[SCHEDULES_KEY], lists["tasks"])
+                #only the tasks whose name or schedule changed are recomputed in the calendar
+                self.update_calendar(lists["tasks"], task_schedules)
+                self.update_search(lists["tasks"], lists["rewards"])
+                self.tasks, self.rewards, self.reward_costs = lists["tasks"], lists["rewards"], lists["reward_costs"]
+                self.task_schedules = task_schedules
+                #the tablet that saved new rules already appended the rescore records
+                if lists[RULES_KEY] != self.scoring_rules:
+                    self.scoring_rules = lists[RULES_KEY]
+                    self.rules = self.compile_rules(self.scoring_rules)
+                self.reward_catalog.load(self.rewards, self.reward_costs)
+                changed = True
+            elif message["push"] == "counter":
+                #merge the counter entries another tablet just changed
+                self.counter.merge(PNCounter.from_dict(message["delta"]))
+
+        #fold in new ledger records from every tablet, including this one
+        if self.ledger.sequence > self.folded_sequence():
+            changed = self.catch_up_stats() or changed
+
+        #entries can also arrive in the writer thread's exchange replies, so compare the value
+        balance = self.counter.value()
+        if balance != self.total_points:
+            self.total_points = balance
+            changed = True
+
+        if changed:
+            self.reward_catalog.update_balance(self.total_points)
+        return changed
 
 
 class WidgetCreator:
@@ -90,38 +718,66 @@ class WidgetCreator:
     It displays tasks, allows users to input grade, view rewards, adn interact with the program.
     """
 
-    def __init__(self, root, data_manager):
+    def __init__(self, root, data_manager, assets=None, profiles=None):
         """
         Initialize the WidgetCreator with references to the root Tkinter window and DataManager
         """
         self.root = root #Main application window 
         self.data_manager = data_manager #DataManager instance for handling persistent data
+        self.profiles = profiles #warm profiles in kiosk mode, closed together on exit
+        self.watchdog = None #stall watchdog, stopped before the shutdown work on exit
+        self.assets = assets if assets is not None else AssetManager(root) #decoded image cache
         
         #Initialize donts for different UI elements
         self.banner_font, self.header_font, self.reward_font = self.create_fonts() 
         
         self.taskList = [] #List to hold checkboxes for tasks
+        self.checkbox_frame = None #Frame holding the pooled checkboxes
+        self.checkbox_pool = None #Checkboxes reused when the day's or the child's tasks change
+        self.task_vars = [] #BooleanVar per checkbox slot
+        self.checklist_tasks = [] #Task each checkbox stands for
+        self.checklist_filter = None #Text of the checklist filter box
+        self.checklist_matches = None #Checkbox slots matching the filter, None when it is blank
+        self.checklist_shown = set() #Checkbox slots currently gridded
+        self.checklist_debouncer = Debouncer(root, self.show_checklist_matches, FILTER_DEBOUNCE_MS)
+        self.portal_window = None #Parent Portal window, if one is open
         self.reward_buttons = None  #Frame to hold reward buttons
         self.total_points = self.data_manager.total_points  #Load persistent total points
-        self.reward_cost_entries = []  #List to store entry widgets for reward costs
-        self.reward_point_entries = []  #List to store manual points input fields
+        self.reward_refresh_pending = False  #True while a reward redraw is queued
+
+        #redraw the rewards only when the balance crosses a reward's cost
+        self.data_manager.reward_catalog.subscribe(self.on_reward_threshold)
+
+        self.star_img = None  #star image, set once it has loaded
+        self.astro_img = None  #astronaut image, set once it has loaded
+        self.star_label = None  #label showing the star image
+        self.astro_label = None  #label showing the astronaut image
 
         self.load_images() #load images for UI elements
     
 
     def load_images(self):
         """
-        Loads images for the GUI using Tkinter's built in PhotoImage.
-        If an image error occurs, it prints and error message
+        Queues the images for the GUI to load after the first paint.
+        Each image is decoded and scaled once by the AssetManager, which prints any load error.
         """
-        #load in image files 
-        try:
-            self.star_img = tk.PhotoImage(file="Star.png").subsample(3,3) #Load and resize image
-            self.astro_img = tk.PhotoImage(file="Astronaut.png").subsample(5,5) #load and resize image
+        #load in image files, already scaled, once the window is up
+        self.assets.load_later("Star.png", 3, self.set_star_image)
+        self.assets.load_later("Astronaut.png", 5, self.set_astro_image)
+
 
-        except Exception as e:
-            #error message if image fails to load
-            print(f" Unable to Load ImagesL {e}")
+    def set_star_image(self, image):
+        """Shows the star image once it has loaded"""
+        self.star_img = image
+        if self.star_label is not None:
+            self.star_label.config(image=image)
+
+
+    def set_astro_image(self, image):
+        """Shows the astronaut image once it has loaded"""
+        self.astro_img = image
+        if self.astro_label is not None:
+            self.astro_label.config(image=image)
         
 
     def create_fonts(self):
@@ -156,14 +812,11 @@ class WidgetCreator:
         astro_frame = tk.Frame(self.root, bg="light blue")
         astro_frame.grid(row=1, column=1,columnspan=1 , sticky="e", padx=5, pady=5)
 
-        # Load and place the astronaut image
-        try:
-            self.astro_img = tk.PhotoImage(file="Astronaut.png").subsample(5, 5)
-            astro_label = tk.Label(astro_frame, image=self.astro_img, bg="light blue")
-            astro_label.pack(anchor="e")  # Align inside the frame
-        except Exception as e:
-            #handle error message if image fails to load
-            print(f"Error loading image: {e}")
+        # Place the astronaut image, the image itself is filled in once loaded
+        self.astro_label = tk.Label(astro_frame, bg="light blue")
+        if self.astro_img is not None:
+            self.astro_label.config(image=self.astro_img)
+        self.astro_label.pack(anchor="e")  # Align inside the frame
 
 
     def create_task_complete(self, items):
@@ -188,6 +841,7 @@ class WidgetCreator:
         """
         Generates a checklist of tasks using Tkinter Checkboxes.
         Each task will have a corresponding BoolVar to track if checked off. 
+        The checkboxes are pooled, so a new day's tasks or another child's tasks reuse them.
 
         Parameters:
             items(list): a list of task descriptions
@@ -195,25 +849,75 @@ class WidgetCreator:
             list: a list of BooleanVar instances corresponding to checkboxes
         """
         taskList = [] #list to store boolean variables for each checkbox
-        checkbox_frame = tk.Frame(self.root, bg="light blue") 
-        checkbox_frame.grid(row=2, column=0, columnspan=6, sticky="w", padx=25, pady=10)
-
-        #Loop through task list and create a checkbox for each task
-        for item in items:
-            var = tk.BooleanVar() #BoolVar to track checkbox state
+        if self.checkbox_frame is None:
+            self.checkbox_frame = tk.Frame(self.root, bg="light blue") 
+            self.checkbox_frame.grid(row=2, column=0, columnspan=6, sticky="w", padx=25, pady=10)
+            self.checkbox_pool = WidgetPool(
+                self.checkbox_frame, lambda parent: tk.Checkbutton(parent, bg="light blue")
+                )
+
+            #filter box beside the checklist, narrowing it to the tasks whose words start with what is typed
+            filter_frame = tk.Frame(self.checkbox_frame, bg="light blue")
+            filter_frame.grid(row=0, column=1, rowspan=2, sticky="nw", padx=20)
+            tk.Label(filter_frame, text="Find task:", bg="light blue").pack(side="left")
+            self.checklist_filter = tk.StringVar()
+            self.checklist_filter.trace_add("write", self.on_checklist_filter)
+            tk.Entry(filter_frame, width=20, textvariable=self.checklist_filter).pack(side="left")
+
+        #Loop through task list and show a checkbox for each task
+        for slot, item in enumerate(items):
+            if slot == len(self.task_vars):
+                self.task_vars.append(tk.BooleanVar()) #BoolVar to track checkbox state
+            var = self.task_vars[slot]
+            var.set(False)
             taskList.append(var) #store reference to variable
 
-            #create checkbox and associate it with the boolean var
-            checkbox = tk.Checkbutton(checkbox_frame, text=item, variable=var, bg="light blue")
-            checkbox.pack(anchor="w", padx=5, pady=2) #align checkbox to the left
+            #reuse the slot's checkbox and associate it with the boolean var
+            checkbox = self.checkbox_pool.show(slot, text=item, variable=var)
+            checkbox.grid(row=slot, column=0, sticky="w", padx=5, pady=2) #align checkbox to the left
+        self.checkbox_pool.hide_from(len(items))
 
         #store the list of the boolean variable as an instance attribute
         self.taskList = taskList
+        self.checklist_tasks = list(items) #task each checkbox stands for
+
+        #every checkbox is shown again, so a filter still typed in is applied to the new tasks at once
+        self.checklist_shown = set(range(len(items)))
+        if self.checklist_filter.get().strip():
+            self.on_checklist_filter()
+            self.checklist_debouncer.run()
         
         #return the list of BooleanVar instances for future use if needed
         return taskList
 
 
+    def on_checklist_filter(self, *args):
+        """
+        Looks up the tasks matching the checklist filter on every keystroke,
+        redrawing the checklist only once typing pauses.
+        """
+        query = self.checklist_filter.get()
+        if query.strip():
+            tasks = self.data_manager.tasks
+            matches = {tasks[position] for position in self.data_manager.search_catalog("tasks", query)}
+            self.checklist_matches = {slot for slot, task in enumerate(self.checklist_tasks) if task in matches}
+        else:
+            self.checklist_matches = None
+        self.checklist_debouncer.trigger()
+
+
+    def show_checklist_matches(self):
+        """Shows the checkboxes matching the filter, regridding only the ones that change"""
+        matches = self.checklist_matches
+        wanted = set(range(len(self.checklist_tasks))) if matches is None else matches
+        #hidden checkboxes keep their state, so a task checked before filtering still counts
+        for slot in wanted - self.checklist_shown:
+            self.checkbox_pool.widgets[slot].grid()
+        for slot in self.checklist_shown - wanted:
+            self.checkbox_pool.widgets[slot].grid_remove()
+        self.checklist_shown = wanted
+
+
     def create_self_grade(self):
         """
         Creates a section where the user can enter self-assigned grade for performance.
@@ -232,14 +936,43 @@ class WidgetCreator:
 
     
     def create_stats(self):
-        """Creates a section displaying the "Sats" header"""
+        """Creates a section displaying the "Sats" header and the running stats under it"""
+        #frame holding the header and one line per stat
+        stats_frame = tk.Frame(self.root, bg="light blue")
+        stats_frame.grid(row=1, column=5, sticky="n", padx=10, pady=10)
+
         #label for the stats section
         statsHeader = tk.Label(
-            self.root, text="Stats", font=self.header_font, fg="gray", bg="light blue"
+            stats_frame, text="Stats", font=self.header_font, fg="gray", bg="light blue"
             )
+        statsHeader.pack()
+
+        #one label per line, each only reconfigured when its text changes
+        self.stats_views = []
+        for _ in range(STATS_LINES):
+            label = tk.Label(stats_frame, fg="gray", bg="light blue", anchor="w")
+            label.pack(anchor="w")
+            self.stats_views.append(BoundLabel(label))
+        self.update_stats()
+
+
+    def update_stats(self):
+        """
+        Redraws the stats lines from the precomputed aggregates, nothing is rescanned.
+        """
+        summary = self.data_manager.stats_summary()
+        grade = summary["average_grade"]
+        lines = [
+            f"Today: {summary['today']} pts   This week: {summary['week']} pts",
+            f"Average grade: {'-' if grade is None else f'{grade:.1f}'}",
+            f"Streak: {summary['streak']} days (best {summary['best_streak']})",
+            f"Rewards redeemed: {summary['redemptions']} ({summary['redemptions_per_week']:.1f} a week)",
+            ]
+        for title, task_rate in (("Most done", summary["most_done"]), ("Least done", summary["least_done"])):
+            lines.append(f"{title}: -" if task_rate is None else f"{title}: {task_rate[0]} ({task_rate[1]:.0%})")
 
-        #position the stats head in the layout
-        statsHeader.grid(row=1, column=5, sticky="n", padx=10, pady=10)
+        for view, line in zip(self.stats_views, lines):
+            view.set(line)
 
 
     def create_rewards(self):
@@ -256,6 +989,18 @@ class WidgetCreator:
         self.reward_buttons = tk.Frame(self.root, bg="light blue")
         self.reward_buttons.grid(row=4, column=5, padx=10, pady=10, sticky="nesw")  # Ensure same row!
 
+        #reusable reward buttons, reconfigured on each redraw instead of re-created; each button
+        #keeps one command that redeems the (reward, cost) its slot currently shows
+        self.reward_pool = WidgetPool(
+            self.reward_buttons, lambda parent: tk.Button(parent, font=self.reward_font, bg="light blue"),
+            command=lambda item: self.redeem_reward(*item)
+            )
+
+        #message shown in place of the buttons when no rewards are available
+        self.no_rewards_label = tk.Label(
+            self.reward_buttons, text="No rewards available", font=self.reward_font, bg="light blue"
+            )
+
 
     def create_bonus(self):
         """
@@ -314,10 +1059,96 @@ class WidgetCreator:
         """Creates exit button to close the program upon selection"""
         self.exit_button = tk.Button(
             self.root, text="Exit", font=("Times New Roman", 15, "bold"),bg="light blue",
-            command=self.root.quit
+            command=self.exit_app
             )
         self.exit_button.grid(row=7, column=5, sticky="e",padx=10, pady=10)
 
+    def create_undo_buttons(self):
+        """Creates Undo and Redo buttons for entries, redemptions and Parent Portal saves"""
+        undo_frame = tk.Frame(self.root, bg="light blue")
+        undo_frame.grid(row=7, column=3, sticky="w", padx=5, pady=10)
+
+        self.undo_button = tk.Button(
+            undo_frame, text="Undo", command=self.undo_last,
+            font=("Times New Roman", 15, "bold"), bg="light blue"
+            )
+        self.undo_button.pack(side="left", padx=2)
+        self.redo_button = tk.Button(
+            undo_frame, text="Redo", command=self.redo_last,
+            font=("Times New Roman", 15, "bold"), bg="light blue"
+            )
+        self.redo_button.pack(side="left", padx=2)
+
+        #keyboard shortcuts for the same actions
+        self.root.bind("<Control-z>", lambda event: self.undo_last())
+        self.root.bind("<Control-y>", lambda event: self.redo_last())
+        self.update_undo_buttons()
+
+    def update_undo_buttons(self):
+        """Enables the Undo and Redo buttons only when there is something to undo or redo"""
+        undo_log = self.data_manager.undo_log
+        self.undo_button.config(state=tk.NORMAL if undo_log.can_undo() else tk.DISABLED)
+        self.redo_button.config(state=tk.NORMAL if undo_log.can_redo() else tk.DISABLED)
+
+    def undo_last(self):
+        """Undoes the last change and redraws what it touched"""
+        if self.data_manager.undo() is not None:
+            self.refresh_after_undo()
+
+    def redo_last(self):
+        """Redoes the last undone change and redraws what it touched"""
+        if self.data_manager.redo() is not None:
+            self.refresh_after_undo()
+
+    def refresh_after_undo(self):
+        """Redraws the total, stats, rewards, checklist and undo buttons after an undo or redo"""
+        self.total_points = self.data_manager.total_points
+        self.update_total_points()
+        self.refresh_checklist()
+        self.update_stats()
+        self.schedule_reward_refresh()
+        self.update_undo_buttons()
+
+    def exit_app(self):
+        """Closes the data files and quits the main loop"""
+        #flushing and packing the data files blocks the loop on purpose, it isn't a stall
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        if self.profiles is not None:
+            self.profiles.close() #every warm child, then the shared backend
+        else:
+            self.data_manager.close()
+        self.root.quit()
+
+    def bind_profile(self, data_manager):
+        """
+        Rebinds the existing widgets to another child's data instead of rebuilding the window.
+        Only the widgets whose text or state differs are reconfigured.
+        Parameters:
+            data_manager(DataManager): the child switched to
+        """
+        #a portal left open would save the last child's lists into this one
+        if self.portal_window is not None and self.portal_window.winfo_exists():
+            self.portal_window.destroy()
+        self.portal_window = None
+
+        self.data_manager.reward_catalog.unsubscribe(self.on_reward_threshold)
+        self.data_manager = data_manager
+        self.data_manager.reward_catalog.subscribe(self.on_reward_threshold)
+        self.total_points = self.data_manager.total_points
+
+        #clear the last child's half-typed entry and filter and show this child's tasks, all unchecked
+        self.selfGradeEntry.delete(0, tk.END)
+        self.bonusPoints.delete(0, tk.END)
+        self.checklist_filter.set("")
+        self.checklist_day = date.today()
+        self.create_task_checklist(self.data_manager.tasks_for(self.checklist_day))
+
+        self.update_total_points()
+        self.update_stats()
+        self.update_undo_buttons()
+        self.display_rewards()
+
     def create_widgets(self):
         """
         Initializes and arranges all of the widgets in the application.
@@ -326,8 +1157,9 @@ class WidgetCreator:
         #create main title banner
         self.create_banner()
 
-        #retrieve list of tasks from DataManage and create task completion checkboxes
-        checkbox_items = self.data_manager.tasks
+        #retrieve today's tasks from DataManage and create task completion checkboxes
+        self.checklist_day = date.today()
+        checkbox_items = self.data_manager.tasks_for(self.checklist_day)
         self.create_task_complete(checkbox_items)
 
         #create input field for self grading
@@ -347,21 +1179,21 @@ class WidgetCreator:
         self.create_refresh_button() #chlears input fields
         self.create_enter_button() #submits user input
         self.create_exit_button() #exits program 
+        self.create_undo_buttons() #undoes and redoes changes
  
-        #label to display the user's total points
-        total_points_label = tk.Label(
-            self.root, text=f"Total Points: {self.total_points}",font=self.header_font,
-             fg="gray", bg="light blue"
+        #label to display the user's total points, only reconfigured when the total changes
+        self.total_points_label = tk.Label(
+            self.root, font=self.header_font, fg="gray", bg="light blue"
          )
-        total_points_label.grid(row=2, column=5, sticky="nw", padx=10, pady=10)
+        self.total_points_view = BoundLabel(self.total_points_label, "Total Points: {}")
+        self.total_points_view.set(self.total_points)
+        self.total_points_label.grid(row=2, column=5, sticky="nw", padx=10, pady=10)
 
         #display a star image as a visual 
-        star_label = tk.Label(self.root, image=self.star_img, bg="light blue")
-        star_label.grid(row=2, column=5, sticky="s", padx=10, pady=2)  # Positioned right below the label
-
-        #create a frame to hold dynamically generated reward buttons
-        self.reward_buttons = tk.Frame(self.root, bg="light blue")
-        self.reward_buttons.grid(row=5, column= 5, padx=10, pady=10, sticky="e") # Ensure same row!
+        self.star_label = tk.Label(self.root, bg="light blue")
+        if self.star_img is not None:
+            self.star_label.config(image=self.star_img)
+        self.star_label.grid(row=2, column=5, sticky="s", padx=10, pady=2)  # Positioned right below the label
 
         #display the current rewards based on earned points
         self.display_rewards()
@@ -375,159 +1207,241 @@ class WidgetCreator:
         #create a new top-level window
         parent_window = tk.Toplevel(self.root) 
         parent_window.title("Parent Portal") #set window title
+        self.portal_window = parent_window
 
         # Create labels for task list, reward list, and reward cost
         tk.Label(parent_window, text="Task List", font=self.header_font).grid(row=0, column=0, padx=10, pady=10)
         tk.Label(parent_window, text="Rewards List", font=self.header_font).grid(row=0, column=1, padx=10, pady=10)
         tk.Label(parent_window, text="Reward Cost (Points)", font=self.header_font).grid(row=0, column=2, padx=10, pady=10)
+        tk.Label(parent_window, text="Task Schedule", font=self.header_font).grid(row=0, column=3, padx=10, pady=10)
+        tk.Label(parent_window, text="Scoring Rules", font=self.header_font).grid(row=0, column=4, padx=10, pady=10)
 
-        #Code for displaying editable task list and rewards
-        task_entries = []
-        for i in range(10):
-            task_entry = tk.Entry(parent_window, width=20)
-            task_entries.append(task_entry)
-            task_entry.grid(row=i+1, column=0, padx=10, pady=5)
-            if i < len(self.data_manager.tasks):
-                task_entry.insert(0, self.data_manager.tasks[i])
-
-        #create editable fields for the rewards list and reward costs
-        self.reward_cost_entries = []
-        self.reward_point_entries = [] 
-        for i in range(10): #allow up to 10 tasks
-            reward_entry = tk.Entry(parent_window, width=20)
-            self.reward_cost_entries.append(reward_entry)
-            reward_entry.grid(row=i+1, column=1, padx=10, pady=5)
-
-            #prepopulate with existing tasks, if available
-            if i < len(self.data_manager.rewards):
-                reward_entry.insert(0, self.data_manager.rewards[i])
-            
-            #entry field for reward costs
-            reward_cost_entry = tk.Entry(parent_window, width=20)
-            self.reward_point_entries.append(reward_cost_entry)
-            reward_cost_entry.grid(row=i+1, column=2, padx=10, pady=5)
-
-            #prepopulate with existing reward costs, if applicable
-            if i < len(self.data_manager.reward_costs):
-                # Display the cost for each reward
-                reward_cost_entry.insert(0, str(self.data_manager.reward_costs[i]))
+        #editable rows of task, reward, cost, task schedule and scoring rule, only the visible rows get Entry widgets
+        rows = build_rows(
+            self.data_manager.tasks, self.data_manager.rewards, self.data_manager.reward_costs,
+            self.data_manager.task_schedules, self.data_manager.scoring_rules
+            )
+        table = VirtualTable(
+            parent_window, rows, column_count=5, visible_rows=PORTAL_VISIBLE_ROWS, filter_delay_ms=FILTER_DEBOUNCE_MS,
+            search_columns=(0, 1) #the filter box finds tasks and rewards as they are being edited
+            )
+
+        #button to add a blank row for a new task or reward
+        add_button = tk.Button(
+            parent_window, text="Add Row", command=table.add_row,
+            font=("Times New Roman", 10, "bold")
+            )
+        add_button.grid(row=PORTAL_VISIBLE_ROWS + 1, column=0, columnspan=5, pady=(10, 0))
+
+        #filter box narrowing the rows to the tasks and rewards whose words start with what is typed
+        filter_frame = tk.Frame(parent_window)
+        filter_frame.grid(row=PORTAL_VISIBLE_ROWS + 1, column=3, columnspan=2, sticky="e", padx=10, pady=(10, 0))
+        tk.Label(filter_frame, text="Find:").pack(side="left")
+        filter_var = tk.StringVar()
+        filter_var.trace_add("write", lambda *args: self.filter_portal(filter_var.get(), table))
+        tk.Entry(filter_frame, width=20, textvariable=filter_var).pack(side="left")
 
         save_button = tk.Button(
             parent_window, text="Save", command=lambda: self.save_entries(
-                task_entries, parent_window
+                rows, parent_window
                 ),
             font=("Times New Roman", 10, "bold")
             )
-        save_button.grid(row=16, column=0, columnspan=3, pady=20)
+        save_button.grid(row=PORTAL_VISIBLE_ROWS + 2, column=0, columnspan=5, pady=20)
+
+        #schedule format shown under the table, e.g. "mon wed fri; until 2025-06-30"
+        tk.Label(
+            parent_window, text="Schedules: blank for daily, weekdays, weekends, mon wed fri, every 2 days, "
+            "from YYYY-MM-DD, until YYYY-MM-DD (join with ;)"
+            ).grid(row=PORTAL_VISIBLE_ROWS + 5, column=0, columnspan=5, padx=10, pady=(0, 10))
+
+        #scoring rule format, one rule per row
+        tk.Label(
+            parent_window, text="Rules: task NAME = 2, streak 5 x1.5, time 07:00-09:00 +2, cap session 25, cap day 40"
+            ).grid(row=PORTAL_VISIBLE_ROWS + 6, column=0, columnspan=5, padx=10, pady=(0, 10))
+
+        #look up the balance at any past moment, e.g. before a reward was redeemed
+        tk.Label(parent_window, text="Balance at (YYYY-MM-DD HH:MM):").grid(
+            row=PORTAL_VISIBLE_ROWS + 3, column=0, padx=10, pady=(0, 20), sticky="e"
+            )
+        when_entry = tk.Entry(parent_window, width=20)
+        when_entry.insert(0, datetime.now().strftime("%Y-%m-%d %H:%M"))
+        when_entry.grid(row=PORTAL_VISIBLE_ROWS + 3, column=1, padx=10, pady=(0, 20))
+        balance_label = tk.Label(parent_window, text="")
+        balance_label.grid(row=PORTAL_VISIBLE_ROWS + 4, column=0, columnspan=3, pady=(0, 20))
+        tk.Button(
+            parent_window, text="Check", command=lambda: self.show_balance_at(when_entry.get(), balance_label),
+            font=("Times New Roman", 10, "bold")
+            ).grid(row=PORTAL_VISIBLE_ROWS + 3, column=2, padx=10, pady=(0, 20), sticky="w")
+
+
+    def filter_portal(self, query, table):
+        """
+        Narrows the Parent Portal to the rows whose task or reward matches a query,
+        including edits that haven't been saved yet.
+        The lookup runs on every keystroke, the table redraws once typing pauses.
+        Parameters:
+            query(str): text typed in the filter box
+            table(VirtualTable): the portal's editor
+        """
+        table.set_filter(table.search(query))
 
 
-    def save_entries(self, task_entries, parent_window):
+    def show_balance_at(self, when_text, balance_label):
+        """
+        Shows the balance at the moment typed into the Parent Portal, with that day's points.
+        Parameters:
+            when_text(str): date and optional time, e.g. "2025-03-07 15:30"
+            balance_label(Label): label the answer is shown in
+        """
+        try:
+            when = datetime.fromisoformat(when_text.strip())
+        except ValueError:
+            messagebox.showerror("Invalid Input", "Enter a date as YYYY-MM-DD, optionally followed by HH:MM")
+            return
+
+        #a date without a time means the end of that day
+        if len(when_text.strip()) <= 10:
+            when = when.replace(hour=23, minute=59, second=59)
+        day_start = when.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+        balance = self.data_manager.balance_at(when.timestamp())
+        day = self.data_manager.points_between(day_start, when.timestamp())
+        balance_label.config(
+            text=f"Balance: {balance:g}   (that day: +{day['earned']:g} earned, -{day['redeemed']:g} redeemed)"
+            )
+
+
+    @timed("portal_save", "Time to validate and save the Parent Portal")
+    def save_entries(self, rows, parent_window):
         """
         Saves user input from the Parent Portal task and rewards lists. 
-        Updates the stored task and reward data and saves it to the approp. files.
+        Updates the stored task and reward data, writing only the records that changed.
 
         Parameters: 
-            task_entries(list): list of task entry widgets
+            rows(list): task, reward, cost, schedule and rule text for every row in the editor
             parent_window(TopLevel): parent portal window instance
         """
         #extract non-empty task entries for input fields
-        self.data_manager.tasks = [entry.get() for entry in task_entries
-         if entry.get().strip() != ""
-         ]
+        tasks = column_values(rows, 0)
+
+        #the schedule of each non-empty task, checked before anything is saved
+        task_schedules = [row[3].strip() for row in rows if row[0].strip() != ""]
+        try:
+            for schedule in task_schedules:
+                parse_schedule(schedule)
+        except ScheduleError as e:
+            messagebox.showerror("Invalid Input", str(e))
+            return
+
+        #the scoring rules are compiled here once, a rule that can't be read stops the save
+        scoring_rules = [rule.strip() for rule in column_values(rows, 4)]
+        try:
+            parse_rules(scoring_rules)
+        except RuleError as e:
+            messagebox.showerror("Invalid Input", str(e))
+            return
 
          #extract non-empty reward names for input fields
-        self.data_manager.rewards = [entry.get() for entry in self.reward_cost_entries
-         if entry.get().strip() != ""
-         ]
+        rewards = column_values(rows, 1)
 
         # Extract non-empty reward costs, ensuring valid integer conversion
         try:
-            self.data_manager.reward_costs = [
-                int(entry.get()) for entry in self.reward_point_entries if entry.get().strip() != ""
-            ]
+            reward_costs = [int(cost) for cost in column_values(rows, 2)]
         except ValueError:
             # Show an error message if any reward cost is not a valid number
             messagebox.showerror("Invalid Input", "Reward cost must be numerical ")
             return  # Exit the method to prevent saving the invalid data
 
-        #save updated data to corresponding files using pickle
-        self.data_manager.save_data("tasks.pkl", self.data_manager.tasks)
-        self.data_manager.save_data("rewards.pkl", self.data_manager.rewards)
-        self.data_manager.save_data("reward_costs.pkl", self.data_manager.reward_costs)
+        #save only the changed tasks, rewards, costs, schedules and rules together in one batch,
+        #a rule change also rescores the days of history it affects
+        self.data_manager.update_catalog(tasks, rewards, reward_costs, task_schedules, scoring_rules)
+        self.total_points = self.data_manager.total_points
+        self.refresh_checklist()
+        self.update_total_points()
+        self.update_stats()
+        self.schedule_reward_refresh()
+        self.update_undo_buttons()
 
         #close Parent Portal window after saving
         parent_window.destroy()
 
 
+    @timed("display_rewards", "Time to redraw the reward buttons")
     def display_rewards(self):
         """
          Displays a redeemable reward if the user has enough points.
          If multiple rewards are available, one is chosen randomly. 
          If no rewards are available at specified points, a message is displayed insted. 
         """
-        # Clear previous reward button (if any)
-        for widget in self.reward_buttons.winfo_children():
-            widget.destroy()  # Fully remove old widgets to prevent overlapping
-
-        # Get the list of redeemable rewards based on available points
-        redeemable_rewards = [
-            (reward, cost) for reward, cost in zip(self.data_manager.rewards,
-             self.data_manager.reward_costs) if cost <= self.total_points
-            ]
+        #randomly selects one of the redeemable rewards using the sorted cost index
+        redeemable_reward = self.data_manager.reward_catalog.choose(self.total_points)
 
-        if redeemable_rewards:
-            #randomly selects one of the redeemable rewards from reward list
-            reward, cost = random.choice(redeemable_rewards)
+        if redeemable_reward:
+            reward, cost = redeemable_reward
 
-            # create and display the reward button under the "Earned Rewards" header
-            button = tk.Button(self.reward_buttons, text=f"{reward} - {cost} pts", #format reward name and cost
-                                # Assign function to redeem reward
-                                command=lambda r=reward, c=cost: self.redeem_reward(r, c), 
-                                font=self.reward_font, bg="light blue")
+            # reuse the pooled reward button under the "Earned Rewards" header
+            self.no_rewards_label.grid_remove()
+            button = self.reward_pool.show(0, item=(reward, cost), #the button redeems this reward
+                                text=f"{reward} - {cost} pts") #format reward name and cost
             button.grid(row=0, column=0, padx=10, pady=5)  # Align to the right
         else:
-            #if no rewards are available, display a message 
-            label = tk.Label(self.reward_buttons, text="No rewards available", 
-                               font=self.reward_font, bg="light blue")
-            label.grid(row=0, column=0, sticky="e", padx=10, pady=5)  # Align to the right
+            #if no rewards are available, hide the button and display a message 
+            self.reward_pool.hide_from(0)
+            self.no_rewards_label.grid(row=0, column=0, sticky="e", padx=10, pady=5)  # Align to the right
 
 
+    def on_reward_threshold(self, unlocked, locked):
+        """
+        Called by the reward catalog when the balance crosses one or more reward costs.
+        Arguments:
+            unlocked(list): (reward, cost) tuples that just became affordable
+            locked(list): (reward, cost) tuples that are no longer affordable
+        """
+        self.total_points = self.data_manager.total_points
+        self.schedule_reward_refresh()
+
+
+    def schedule_reward_refresh(self):
+        """
+        Queues one reward redraw for when Tk is idle, so several changes in a row only redraw once.
+        """
+        if self.reward_buttons is None or self.reward_refresh_pending:
+            return
+        self.reward_refresh_pending = True
+
+        def refresh():
+            self.reward_refresh_pending = False
+            self.display_rewards()
+        self.root.after_idle(refresh)
+
+
+    @timed("redeem_reward", "Time to redeem a reward and redraw the total")
     def redeem_reward(self, reward, cost):
         """
         Handles the redemption of a selected award.
         """
         if self.total_points >= cost:
 
-            #deduct the reward cost from the total available points
-            self.total_points -= cost
+            #record the redemption in the ledger and deduct the cost from the total
+            self.total_points = self.data_manager.redeem_points(reward, cost)
             print(f"Redeemed {reward} for {cost} points!")
+            count("rewards_redeemed")
             self.update_total_points() #update the total points after redemption
-            self.data_manager.save_data("total_points.pkl", self.total_points)
-            self.display_rewards()  # Refresh the displayed rewards after redeeming
+            self.update_stats()
+            self.update_undo_buttons()
+            self.schedule_reward_refresh()  # Refresh the displayed rewards after redeeming
         else:
             #display mesage if not enought points available
             print("Not enough points to redeem this reward.")
+            count("redemptions_refused")
 
 
     def update_total_points(self):
         """
         Updates the total points based of the user's activities/entries. 
         """
-        # Check if the total_points_label already exists
-        if hasattr(self, 'total_points_label'):
-            # If the label exists, update its text
-            self.total_points_label.config(text=f"Total Points: {self.total_points}")
-        else:
-            # If the label does not exist, create a new one
-            self.total_points_label = tk.Label(
-                self.root, text=f"Total Points: {self.total_points}",
-            font=self.header_font, fg="gray", bg="light blue"
-        )
-        self.total_points_label.grid(row=2, column=5, sticky="nw", padx=10, pady=10)
-
-        # Create a frame for the image to prevent layout shifting
-        star_frame = tk.Frame(self.root, bg="light blue")
-        star_frame.grid(row=3, column=5, columnspan=1, padx=5, pady=5)
+        #the label created in create_widgets is only reconfigured if the total changed
+        self.total_points_view.set(self.total_points)
 
 
     def refresh_data(self):
@@ -541,70 +1455,60 @@ class WidgetCreator:
         #clear bonus points entry field by removing text input
         self.bonusPoints.delete(0, tk.END)
 
-        #reset all checkboxes in task list to unchecked (False)
+        #reset all checkboxes in task list to unchecked (False), showing a new day's tasks after midnight
         for var in self.taskList:
             var.set(False)
+        self.checklist_filter.set("")
+        self.refresh_checklist()
 
         # Refresh the reward display to reflect cleared data
         self.display_rewards()
 
-        self.total_points = self.data_manager.load_data("total_points.pkl",0)
+        self.total_points = self.data_manager.total_points
+
 
+    def refresh_checklist(self):
+        """Rebuild the task checklist if the day or the day's tasks have changed"""
+        self.checklist_day = date.today()
+        items = self.data_manager.tasks_for(self.checklist_day)
+        if list(items) != self.checklist_tasks:
+            self.create_task_checklist(items)
 
+
+    @timed("enter_data", "Time to score and record an entry")
     def enter_data(self):
         """
         Handles user input for the self-grade, bonus points, and completed tasks. 
         """
-        try:
-            # Retrieve the self-grade input and strip any leading/trailing spaces
-            self_grade_input = self.selfGradeEntry.get().strip()
-
-            # Check if self-grade input is empty
-            if self_grade_input == "":
-                messagebox.showerror("Invalid Input", "Self-grade cannot be empty.")
-                return  # Stop further processing if self-grade is empty
-        
-            # Try converting the self-grade to a float
-            self_grade = float(self_grade_input)
-
-            # Ensure that self-grade is within a valid range (0-10)
-            if self_grade < 0 or self_grade > 10:
-                messagebox.showerror("Invalid Input", "Self-grade must be between 0 and 10.")
-                return  # Stop further processing if out of valid range
-
-        except ValueError:
-            # If the conversion fails (non-numeric input), show an error
-            messagebox.showerror("Invalid Input", "Self-grade must be a number.")
-            return  # Stop further processing if input is not a valid number
+        #read the checkbox states so the scoring engine never touches Tk widgets
+        task_states = [var.get() for var in self.taskList]
 
-        # Handle bonus points input in a similar manner
         try:
-            # Retrieve bonus points input and strip any leading/trailing spaces
-            bonus_points_input = self.bonusPoints.get().strip()
-        
-            # If bonus points input is non-empty, attempt to convert it to a float
-            if bonus_points_input:
-                bonus_points = float(bonus_points_input)
-            else:
-                bonus_points = 0  # Default to 0 if no bonus points entered
-
-        except ValueError:
-            messagebox.showerror("Invalid Input", "Bonus points must be a number.")
-            return  # Stop further processing if bonus points input is invalid
-            #count the number of tasks that have been checked off
-        checked_tasks = sum(1 for var in self.taskList if var.get())
-
-        #calculate the total points from self-grade, bonus points, and completed tasks
-        total_points = self_grade + bonus_points + checked_tasks
-
-        #add the calculated points to the overall total points
-        self.total_points += total_points
+            #validate the self-grade (0-10) and bonus points
+            _, self_grade, bonus_points, _ = score_entry(
+                self.selfGradeEntry.get(), self.bonusPoints.get(), task_states
+                )
+        except ScoringError as e:
+            #show the validation message and stop further processing
+            messagebox.showerror("Invalid Input", str(e))
+            count("entries_rejected")
+            return
+        count("entries_recorded")
+
+        #score the entry with the compiled rules, stamped once so the rules and the ledger agree on its time
+        tasks = [task for task, state in zip(self.checklist_tasks, task_states) if state]
+        ts = time.time()
+        total_points = self.data_manager.score_session(self_grade, bonus_points, tasks, ts)
+
+        #append the entry to the ledger and add the points to the overall total
+        self.total_points = self.data_manager.award_points(
+            total_points, self_grade=self_grade, bonus=bonus_points, tasks=tasks, ts=ts
+            )
 
-        #update the UI display to reflect the new total points
+        #update the UI display to reflect the new total points and stats
         self.update_total_points()
-
-        #save the updated total points to a file fo persistance
-        self.data_manager.save_data("total_points.pkl", self.total_points)
+        self.update_stats()
+        self.update_undo_buttons()
 
 
 class StarPointsApp:
@@ -613,21 +1517,191 @@ class StarPointsApp:
     """
 
     #placed under DataManager and WidgetCreator classes because it references them
-    def __init__(self, root):
+    def __init__(self, root, client_id=DEFAULT_CLIENT, backend=None, timer=None, show_timing=False,
+                 show_gauge=False, server=None, metrics_file=None, watchdog_ms=None, warm_profiles=None):
         """
         Initialized the application window and its components.
+        Arguments:
+            root(Tk): main application window
+            client_id(str): client whose data is shown
+            backend(StorageBackend): storage to use (defaults to the state file)
+            timer(StartupTimer): clock started at launch (a new one is started if omitted)
+            show_timing(bool): print the startup timing report once all images are loaded
+            show_gauge(bool): show a live widget count and memory gauge, logged to resource_gauge.csv
+            server(tuple): (host, port) of a sync server to share data through instead of backend
+            metrics_file(str): file the metrics export is rewritten to every METRICS_EXPORT_MS
+            watchdog_ms(int): log event loop stalls longer than this many milliseconds to stall_log.txt
+            warm_profiles(int): kiosk mode, keep this many children loaded and show a child picker
         """
         self.root = root
         self.root.geometry("1200x950")
         self.root.title("Star Points")
         self.root.configure(bg="light blue")
+        self.timer = timer if timer is not None else StartupTimer()
+        self.show_timing = show_timing
+        self.metrics_file = metrics_file
+
+        #saves the background writers gave up on, shown from the Tk thread
+        self.save_errors = queue.SimpleQueue()
+        on_save_error = self.save_errors.put
 
         #create instances of other classes 
-        self.data_manager = DataManager()
-        self.widget_creator = WidgetCreator(self.root, self.data_manager)
+        with self.timer.phase("load data"):
+            self.profiles = None
+            if warm_profiles:
+                #kiosk mode: every child shares the backend and the last few stay loaded
+                if server is not None:
+                    factory = lambda client: RemoteDataManager(client, *server, write_behind=True,
+                                                               on_save_error=on_save_error)
+                else:
+                    backend = backend if backend is not None else StateFileBackend()
+                    factory = lambda client: DataManager(client, backend, write_behind=True, close_backend=False,
+                                                         on_save_error=on_save_error)
+                self.profiles = ProfileCache(factory, warm_profiles, None if server is not None else backend)
+                self.data_manager = self.profiles.get(client_id)
+            elif server is not None:
+                self.data_manager = RemoteDataManager(client_id, *server, write_behind=True,
+                                                      on_save_error=on_save_error)
+            else:
+                self.data_manager = DataManager(client_id, backend, write_behind=True, on_save_error=on_save_error)
+        self.assets = AssetManager(self.root, timer=self.timer)
+        self.widget_creator = WidgetCreator(self.root, self.data_manager, self.assets, self.profiles)
 
         #generate and display all widgets in the application
-        self.widget_creator.create_widgets()
+        with self.timer.phase("create widgets"):
+            self.widget_creator.create_widgets()
+
+        #closing the window flushes queued saves the same way the Exit button does
+        self.root.protocol("WM_DELETE_WINDOW", self.widget_creator.exit_app)
+
+        #apply balance and catalog changes pushed by other tablets
+        if server is not None:
+            self.root.after(REMOTE_CHECK_MS, self.check_remote_changes)
+        self.root.after(SAVE_ERROR_CHECK_MS, self.check_save_errors)
+
+        #optional gauge to confirm widget count and memory stay flat over a long session
+        if show_gauge:
+            self.gauge = ResourceGauge(
+                self.root, log_path="resource_gauge.csv", extra=self.data_manager_stats
+                )
+            self.gauge.label.grid(row=8, column=0, columnspan=6, sticky="w", padx=10, pady=5)
+            self.gauge.update()
+
+        #child picker for shared rooms, switching rebinds the widgets instead of restarting
+        if self.profiles is not None:
+            self.create_profile_switcher(client_id)
+
+        #draw the first frame, then load the images in the background of the event loop
+        with self.timer.phase("first paint"):
+            self.root.update_idletasks()
+        self.root.after_idle(self.assets.load_pending, self.startup_finished)
+
+        #optional watchdog logging the Tk thread's stack whenever the event loop stalls
+        self.watchdog = None
+        if watchdog_ms:
+            self.watchdog = StallWatchdog(self.root, watchdog_ms)
+            self.watchdog.start()
+            self.widget_creator.watchdog = self.watchdog
+
+
+    def create_profile_switcher(self, client_id):
+        """
+        Creates the child picker shown in kiosk mode. Picking a child, or typing a new name
+        and pressing Enter, switches to that child.
+        Arguments:
+            client_id(str): child shown at launch
+        """
+        switcher_frame = tk.Frame(self.root, bg="light blue")
+        switcher_frame.grid(row=9, column=5, sticky="e", padx=10, pady=10)
+        tk.Label(switcher_frame, text="Child:", bg="light blue").pack(side="left")
+
+        try:
+            clients = self.data_manager.backend.clients()
+        except (NotImplementedError, OSError, ConnectionError):
+            clients = []
+        self.profile_picker = ttk.Combobox(
+            switcher_frame, values=sorted(set(clients) | {client_id}), width=20
+            )
+        self.profile_picker.set(client_id)
+        self.profile_picker.pack(side="left")
+        self.profile_picker.bind("<<ComboboxSelected>>", lambda event: self.switch_profile(self.profile_picker.get()))
+        self.profile_picker.bind("<Return>", lambda event: self.switch_profile(self.profile_picker.get()))
+
+
+    @timed("switch_profile", "Time to switch to another child and rebind the window")
+    def switch_profile(self, client_id):
+        """
+        Switches the window to another child, loading them only if they aren't warm.
+        Arguments:
+            client_id(str): child to switch to
+        """
+        client_id = client_id.strip()
+        if not client_id or client_id == self.data_manager.client_id:
+            return
+        try:
+            check_client_id(client_id)
+        except ValueError as e:
+            messagebox.showerror("Invalid Name", str(e))
+            return
+        self.data_manager = self.profiles.get(client_id)
+        self.widget_creator.bind_profile(self.data_manager)
+
+        #newly typed children join the list
+        values = list(self.profile_picker["values"])
+        if client_id not in values:
+            self.profile_picker["values"] = sorted(values + [client_id])
+        self.root.title(f"Star Points - {client_id}")
+
+
+    def check_remote_changes(self):
+        """Applies changes pushed by the sync server on the Tk thread and redraws the total"""
+        if self.data_manager.apply_remote_changes():
+            self.widget_creator.total_points = self.data_manager.total_points
+            self.widget_creator.update_total_points()
+            self.widget_creator.update_stats()
+            self.widget_creator.refresh_checklist()
+        self.root.after(REMOTE_CHECK_MS, self.check_remote_changes)
+
+
+    def check_save_errors(self):
+        """Tells the user about saves the background writer gave up on, then schedules the next check"""
+        errors = []
+        while True:
+            try:
+                errors.append(self.save_errors.get_nowait())
+            except queue.Empty:
+                break
+        if errors:
+            messagebox.showerror("Unable to Save", f"{len(errors)} change(s) could not be saved: {errors[-1]}")
+        self.root.after(SAVE_ERROR_CHECK_MS, self.check_save_errors)
+
+
+    def data_manager_stats(self):
+        """Return the write-behind queue depth and flush latency for the gauge"""
+        writer = self.data_manager.writer
+        if writer is None:
+            return {}
+        stats = writer.stats()
+        return {"queue": stats["depth"], "flush_ms": round(stats["last_flush_ms"], 1)}
+
+
+    def startup_finished(self):
+        """Called once the lazy images are loaded, prints the timing report if requested"""
+        self.timer.mark("images loaded")
+        if self.show_timing:
+            print(self.timer.report())
+        record_startup(self.timer)
+        if self.metrics_file is not None:
+            self.export_metrics()
+
+
+    def export_metrics(self):
+        """Rewrites the metrics file, then schedules the next rewrite"""
+        try:
+            write_metrics(self.metrics_file)
+        except OSError as e:
+            print(f"Unable to write metrics to {self.metrics_file}: {e}")
+        self.root.after(METRICS_EXPORT_MS, self.export_metrics)
 
 
 if __name__ == "__main__":
@@ -636,6 +1710,41 @@ if __name__ == "__main__":
     when executed directly. Not when imported as a module for another
     script. 
     """
+    timer = StartupTimer() #start the launch clock before anything else runs
+
+    #optional command line arguments to pick a client from a shared database
+    parser = argparse.ArgumentParser(description="Star Points Token Economy")
+    parser.add_argument("--client", default=DEFAULT_CLIENT, help="client id to load")
+    parser.add_argument("--database", help="SQLite database holding all clients (default: the state file)")
+    parser.add_argument("--timing", action="store_true", help="print a startup timing report")
+    parser.add_argument("--gauge", action="store_true", help="show a live widget count and memory gauge")
+    parser.add_argument("--server", help="host[:port] of a sync server shared by several tablets")
+    parser.add_argument("--metrics-file", help="file to write Prometheus metrics to (enables metrics)")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on localhost:PORT/metrics (enables metrics)")
+    parser.add_argument("--watchdog-ms", type=int, help="log event loop stalls longer than this to stall_log.txt")
+    parser.add_argument("--kiosk", action="store_true", help="show a child picker and keep recent children loaded")
+    parser.add_argument("--warm-profiles", type=int, default=DEFAULT_WARM_PROFILES,
+                        help="children kept loaded in kiosk mode")
+    args = parser.parse_args()
+
+    #metrics are off unless asked for, so the timed hot paths cost one flag check
+    if args.metrics_file or args.metrics_port:
+        REGISTRY.enable(device=load_device_id(), client=args.client)
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+    backend = SQLiteBackend(args.database) if args.database else StateFileBackend()
+    server = None
+    if args.server:
+        host, _, port = args.server.partition(":")
+        server = (host, int(port) if port else DEFAULT_PORT)
+
     root = tk.Tk() #create the main Tkinter window
-    app = StarPointsApp(root) #instantiate the StarPointsApp class
+    app = StarPointsApp(
+        root, args.client, backend, timer, args.timing, args.gauge, server, args.metrics_file, args.watchdog_ms,
+        args.warm_profiles if args.kiosk else None
+        ) #instantiate the StarPointsApp class
     root.mainloop() #start the tkinter event loop to keep the GUI running
+    if app.watchdog is not None:
+        app.watchdog.stop() #no more heartbeats once the loop has returned
+    if args.metrics_file:
+        write_metrics(args.metrics_file) #final export with the whole session
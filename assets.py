@@ -0,0 +1,134 @@
+"""
+Image asset manager for the Star Points Token Economy.
+
+Every image is decoded once per run and kept in memory by (file, scale).
+The scaled copy is also written to a disk cache keyed by the source file's
+hash and the scale factor, so the next launch decodes the small cached PNG
+instead of the full size original. Decorative images can be queued and
+loaded one at a time after the first paint.
+"""
+import hashlib #Import hashlib to key the disk cache by file contents
+import os #Import os for cache paths
+import tkinter as tk #Import Tkinter for PhotoImage
+from metrics import count #Import count to tally image errors for the metrics export
+
+#folder the pre-scaled copies are written to
+DEFAULT_CACHE_DIR = ".asset_cache"
+
+
+class AssetManager:
+    """
+    AssetManager decodes, scales and caches PhotoImages.
+    """
+
+    def __init__(self, root, cache_dir=DEFAULT_CACHE_DIR, timer=None):
+        """
+        Arguments:
+            root(Tk): window that owns the images
+            cache_dir(str): folder for the pre-scaled disk cache
+            timer(StartupTimer): optional timer to record each image load
+        """
+        self.root = root
+        self.cache_dir = cache_dir
+        self.timer = timer
+        self.images = {} #decoded images by (path, factor)
+        self.pending = [] #(path, factor, callback) waiting for lazy loading
+
+
+    def cache_path(self, path, factor):
+        """
+        Return the disk cache file for an image at a scale factor.
+        Arguments:
+            path(str): source image file
+            factor(int): subsample factor
+        """
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}_{factor}.png")
+
+
+    def get(self, path, factor=1):
+        """
+        Return an image shrunk by factor, decoding it at most once per run.
+        Arguments:
+            path(str): source image file
+            factor(int): subsample factor (3 keeps every third pixel)
+        Returns:
+            PhotoImage or None if the image could not be loaded
+        """
+        key = (path, factor)
+        if key in self.images:
+            return self.images[key]
+
+        try:
+            if self.timer is not None:
+                with self.timer.phase(f"image {os.path.basename(path)}"):
+                    image = self._load(path, factor)
+            else:
+                image = self._load(path, factor)
+        except (OSError, tk.TclError) as e:
+            #error message if image fails to load
+            print(f"Unable to load image {path}: {e}")
+            count("image_load_errors")
+            return None
+
+        self.images[key] = image
+        return image
+
+
+    def _load(self, path, factor):
+        """Load a scaled image from the disk cache, building the cache entry if needed"""
+        cached = self.cache_path(path, factor) if factor != 1 else None
+        if cached is not None and os.path.exists(cached):
+            try:
+                return tk.PhotoImage(master=self.root, file=cached)
+            except tk.TclError:
+                pass #a damaged cache file is rebuilt below
+
+        image = tk.PhotoImage(master=self.root, file=path)
+        if factor == 1:
+            return image
+        image = image.subsample(factor, factor)
+
+        #keep the small copy so the next launch skips the full size decode
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = cached + ".tmp"
+            image.write(temp_path, format="png")
+            os.replace(temp_path, cached)
+        except (OSError, tk.TclError) as e:
+            print(f"Unable to cache image {path}: {e}")
+            count("image_cache_errors")
+        return image
+
+
+    def load_later(self, path, factor, callback):
+        """
+        Queue an image to be loaded by load_pending, usually after the first paint.
+        Arguments:
+            path(str): source image file
+            factor(int): subsample factor
+            callback(callable): called with the PhotoImage once it is loaded
+        """
+        if (path, factor) in self.images:
+            callback(self.images[(path, factor)])
+        else:
+            self.pending.append((path, factor, callback))
+
+
+    def load_pending(self, on_done=None):
+        """
+        Load queued images one per idle callback so the window stays responsive.
+        Arguments:
+            on_done(callable): called once the queue is empty
+        """
+        if not self.pending:
+            if on_done is not None:
+                on_done()
+            return
+
+        path, factor, callback = self.pending.pop(0)
+        image = self.get(path, factor)
+        if image is not None:
+            callback(image)
+        self.root.after_idle(self.load_pending, on_done)
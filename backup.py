@@ -0,0 +1,460 @@
+"""
+Incremental, deduplicated backups for the Star Points Token Economy.
+
+A backup snapshots every client store in a data folder (the state file,
+the points ledgers and their snapshots, legacy .pkl files, a SQLite
+database and the device id) into a backup folder. Files are cut into
+chunks named by the SHA-256 of their content, and a chunk already held by
+an earlier backup is never stored again:
+
+    state file     one chunk per section, large sections in CHUNK_SIZE pieces,
+                   so a rewrite that moves sections around still matches them
+    ledgers        CHUNK_SIZE pieces, so an append only adds the last piece
+    SQLite         CHUNK_SIZE pieces, a whole number of database pages
+
+A file whose size and modification time haven't changed since the last
+backup isn't read at all. Each backup is one archive, written as a single
+stream: the new chunks, each compressed with zlib, then the manifest
+listing every file with the chunks it is made of and the archive holding
+each chunk, then a fixed-size trailer pointing at the manifest. Restoring
+any backup needs only its own manifest; every chunk is checked against its
+name and every file against its SHA-256 before it replaces anything.
+
+Run this file directly:
+    python backup.py backup --data . --repo backups
+    python backup.py list --repo backups
+    python backup.py verify --repo backups
+    python backup.py restore --repo backups --target restored
+"""
+import argparse #Import argparse for the backup command line
+import hashlib #Import hashlib to name chunks by their content
+import json #Import json to encode the manifests
+import os #Import os to walk the data folder and replace files atomically
+import sqlite3 #Import sqlite3 to read a consistent copy of a database in use
+import struct #Import struct to pack the archive header, chunk records and trailer
+import time #Import time to name and date the backups
+import zlib #Import zlib to compress the chunks
+from contextlib import closing #Import closing to close the read-only database connection
+
+from crdt import DEVICE_ID_FILE #Import the device id file name to back it up with the data
+from statefile import HEADER, MAGIC, SECTION #Import the state file layout to cut it at its sections
+
+#bytes per chunk for files without sections, and for large sections
+CHUNK_SIZE = 64 * 1024
+
+#file name endings of the client stores backed up
+DATA_SUFFIXES = (".state", ".journal", ".ledger", ".ledger.snapshot", ".pkl", ".db")
+
+#file name ending of the backup archives
+ARCHIVE_SUFFIX = ".spbak"
+
+#archive header: magic and format version
+ARCHIVE_MAGIC = b"SPBACKUP"
+ARCHIVE_HEADER = struct.Struct("<8sH")
+ARCHIVE_VERSION = 1
+
+#chunk record: SHA-256 digest, compressed length, then the compressed bytes
+CHUNK_RECORD = struct.Struct("<32sI")
+
+#trailer: manifest offset, manifest length, end marker
+TRAILER = struct.Struct("<QQ8s")
+TRAILER_MAGIC = b"SPBKEND\0"
+
+
+class BackupError(ValueError):
+    """Raised when a backup is damaged, incomplete or can't be restored"""
+
+
+def data_files(data_dir):
+    """
+    Return the client store files in a data folder, relative to it.
+    The default client's files sit in the folder itself, other clients' under clients/.
+    """
+    paths = []
+    for name in sorted(os.listdir(data_dir)):
+        if name.endswith(DATA_SUFFIXES) or name == DEVICE_ID_FILE:
+            if os.path.isfile(os.path.join(data_dir, name)):
+                paths.append(name)
+    clients_dir = os.path.join(data_dir, "clients")
+    for folder, dirs, files in os.walk(clients_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(DATA_SUFFIXES):
+                paths.append(os.path.relpath(os.path.join(folder, name), data_dir).replace(os.sep, "/"))
+    return paths
+
+
+def file_stamp(path):
+    """Return (size, modification time) of a file, and of a SQLite database's write-ahead log"""
+    stamp = []
+    for candidate in (path, path + "-wal"):
+        if os.path.exists(candidate):
+            info = os.stat(candidate)
+            #reading a database leaves an empty log behind, which is no change
+            if candidate == path or info.st_size:
+                stamp += [info.st_size, info.st_mtime_ns]
+    return stamp
+
+
+def fixed_pieces(start, end):
+    """Return (start, end) ranges of at most CHUNK_SIZE bytes covering start to end"""
+    return [(offset, min(offset + CHUNK_SIZE, end)) for offset in range(start, end, CHUNK_SIZE)]
+
+
+def state_file_pieces(f, size):
+    """
+    Return the chunk ranges of a state file: the header, each section with its padding
+    (in CHUNK_SIZE pieces if it is large) and the section table.
+    Falls back to fixed pieces if the file isn't a readable state file.
+    """
+    f.seek(0)
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return fixed_pieces(0, size)
+    magic, _, _, count, table_offset, _, _ = HEADER.unpack(header)
+    if magic != MAGIC or table_offset + count * SECTION.size > size:
+        return fixed_pieces(0, size)
+
+    f.seek(table_offset)
+    offsets = sorted(offset for _, _, _, _, offset, _, _ in SECTION.iter_unpack(f.read(count * SECTION.size)))
+    bounds = [0, HEADER.size] + [offset for offset in offsets if HEADER.size < offset < table_offset]
+    bounds = sorted(set(bounds)) + [table_offset]
+    pieces = []
+    for start, end in zip(bounds, bounds[1:]):
+        pieces += fixed_pieces(start, end)
+    return pieces + [(table_offset, size)] if table_offset < size else pieces
+
+
+def file_chunks(path):
+    """
+    Generator over a file's chunks, read from one open handle so a file replaced or
+    appended to while it is read is backed up as it was when opened.
+    A SQLite database is read through SQLite to get a consistent copy of a database in use.
+    """
+    if path.endswith(".db"):
+        try:
+            with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as connection:
+                data = connection.serialize()
+        except (sqlite3.Error, AttributeError):
+            data = None #not a database SQLite can read (or Python before 3.11), copy the bytes
+        if data is not None:
+            for start, end in fixed_pieces(0, len(data)):
+                yield data[start:end]
+            return
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        pieces = state_file_pieces(f, size) if path.endswith(".state") else fixed_pieces(0, size)
+        for start, end in pieces:
+            f.seek(start)
+            yield f.read(end - start)
+
+
+def archive_names(repo):
+    """Return the archive names in a backup folder, oldest first"""
+    if not os.path.isdir(repo):
+        return []
+    names = [name for name in os.listdir(repo) if name.endswith(ARCHIVE_SUFFIX)]
+    #a second backup in the same second is named "<time>-2", which must sort after "<time>"
+    return sorted(names, key=lambda name: name[:-len(ARCHIVE_SUFFIX)])
+
+
+def read_manifest(repo, name):
+    """
+    Read the manifest at the end of an archive.
+    Arguments:
+        repo(str): backup folder
+        name(str): archive name
+    Returns:
+        dict: the manifest
+    Raises:
+        BackupError: if the archive is incomplete or damaged
+    """
+    path = os.path.join(repo, name)
+    with open(path, "rb") as f:
+        magic, version = ARCHIVE_HEADER.unpack(f.read(ARCHIVE_HEADER.size).ljust(ARCHIVE_HEADER.size, b"\0"))
+        if magic != ARCHIVE_MAGIC or version > ARCHIVE_VERSION:
+            raise BackupError(f"{path} is not a backup archive this version can read")
+        f.seek(0, os.SEEK_END)
+        if f.tell() < ARCHIVE_HEADER.size + TRAILER.size:
+            raise BackupError(f"{path} is incomplete")
+        f.seek(-TRAILER.size, os.SEEK_END)
+        offset, length, end_magic = TRAILER.unpack(f.read(TRAILER.size))
+        if end_magic != TRAILER_MAGIC:
+            raise BackupError(f"{path} is incomplete")
+        f.seek(offset)
+        try:
+            return json.loads(zlib.decompress(f.read(length)).decode("utf-8"))
+        except (zlib.error, ValueError):
+            raise BackupError(f"The manifest of {path} is damaged") from None
+
+
+def resolve_snapshot(repo, snapshot=None):
+    """Return the archive name of a backup ("latest" or None for the newest)"""
+    names = archive_names(repo)
+    if not names:
+        raise BackupError(f"No backups in {repo}")
+    if snapshot in (None, "latest"):
+        return names[-1]
+    name = snapshot if snapshot.endswith(ARCHIVE_SUFFIX) else snapshot + ARCHIVE_SUFFIX
+    if name not in names:
+        raise BackupError(f"No backup named {snapshot} in {repo}")
+    return name
+
+
+def backup(data_dir, repo):
+    """
+    Back up every client store in a data folder, storing only the chunks no earlier backup has.
+    Arguments:
+        data_dir(str): folder the app keeps its data in
+        repo(str): backup folder (created if missing)
+    Returns:
+        dict: archive name and counts of files, files read, chunks and bytes stored
+    """
+    started = time.perf_counter()
+    os.makedirs(repo, exist_ok=True)
+    previous = read_manifest(repo, archive_names(repo)[-1]) if archive_names(repo) else None
+    known = dict(previous["chunks"]) if previous else {} #digest -> [archive, offset, stored, size]
+    old_files = {entry["path"]: entry for entry in previous["files"]} if previous else {}
+
+    name = time.strftime("%Y%m%d-%H%M%S") + ARCHIVE_SUFFIX
+    suffix = 1
+    while os.path.exists(os.path.join(repo, name)):
+        suffix += 1
+        name = time.strftime("%Y%m%d-%H%M%S") + f"-{suffix}{ARCHIVE_SUFFIX}"
+    path = os.path.join(repo, name)
+
+    files, chunks = [], {}
+    summary = {"archive": name, "files": 0, "files_read": 0, "new_chunks": 0, "stored_bytes": 0, "data_bytes": 0}
+    try:
+        f = open(path + ".tmp", "wb")
+    except OSError as e:
+        raise BackupError(f"Unable to write to {repo}: {e}") from None
+    try:
+        f.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION))
+        for relative in data_files(data_dir):
+            full_path = os.path.join(data_dir, relative)
+            stamp = file_stamp(full_path)
+            old = old_files.get(relative)
+
+            #an unchanged file keeps the chunks it had, without being read
+            if old is not None and old["stamp"] == stamp and all(digest in known for digest in old["chunks"]):
+                entry = old
+            else:
+                whole = hashlib.sha256()
+                digests, size = [], 0
+                for data in file_chunks(full_path):
+                    digest = hashlib.sha256(data).hexdigest()
+                    whole.update(data)
+                    size += len(data)
+                    digests.append(digest)
+                    if digest not in known and digest not in chunks:
+                        compressed = zlib.compress(data, 6)
+                        chunks[digest] = [name, f.tell(), len(compressed), len(data)]
+                        f.write(CHUNK_RECORD.pack(bytes.fromhex(digest), len(compressed)))
+                        f.write(compressed)
+                        summary["new_chunks"] += 1
+                        summary["stored_bytes"] += len(compressed)
+                entry = {"path": relative, "size": size, "sha256": whole.hexdigest(), "stamp": stamp, "chunks": digests}
+                summary["files_read"] += 1
+
+            files.append(entry)
+            summary["files"] += 1
+            summary["data_bytes"] += entry["size"]
+            for digest in entry["chunks"]:
+                if digest not in chunks:
+                    chunks[digest] = known[digest]
+
+        #the manifest lists only the chunks this backup uses, wherever they are stored
+        manifest = {
+            "version": ARCHIVE_VERSION, "created": time.time(), "data_dir": os.path.abspath(data_dir),
+            "parent": previous and previous.get("name"), "name": name, "files": files, "chunks": chunks,
+            }
+        manifest_bytes = zlib.compress(json.dumps(manifest).encode("utf-8"), 6)
+        offset = f.tell()
+        f.write(manifest_bytes)
+        f.write(TRAILER.pack(offset, len(manifest_bytes), TRAILER_MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+    except BaseException:
+        #a failed backup leaves no partial archive behind
+        f.close()
+        os.remove(path + ".tmp")
+        raise
+    os.replace(path + ".tmp", path)
+
+    summary["stored_bytes"] += len(manifest_bytes)
+    summary["seconds"] = time.perf_counter() - started
+    return summary
+
+
+class ChunkReader:
+    """
+    ChunkReader reads chunks out of the archives of a backup folder, checking each against its digest.
+    """
+
+    def __init__(self, repo, chunks):
+        """
+        Arguments:
+            repo(str): backup folder
+            chunks(dict): digest -> [archive, offset, stored length, size] from a manifest
+        """
+        self.repo = repo
+        self.chunks = chunks
+        self.handles = {} #archive name -> open file
+
+
+    def read(self, digest):
+        """
+        Return a chunk's bytes.
+        Raises:
+            BackupError: if the chunk is missing or doesn't match its digest
+        """
+        if digest not in self.chunks:
+            raise BackupError(f"Chunk {digest[:12]} is not listed in the manifest")
+        archive, offset, stored, size = self.chunks[digest]
+        if archive not in self.handles:
+            try:
+                self.handles[archive] = open(os.path.join(self.repo, archive), "rb")
+            except OSError:
+                raise BackupError(f"Archive {archive} holding chunk {digest[:12]} is missing") from None
+        f = self.handles[archive]
+        f.seek(offset)
+        record_digest, length = CHUNK_RECORD.unpack(f.read(CHUNK_RECORD.size).ljust(CHUNK_RECORD.size, b"\0"))
+        try:
+            data = zlib.decompress(f.read(length)) if record_digest.hex() == digest and length == stored else None
+        except zlib.error:
+            data = None
+        if data is None or len(data) != size or hashlib.sha256(data).hexdigest() != digest:
+            raise BackupError(f"Chunk {digest[:12]} in {archive} is damaged")
+        return data
+
+
+    def close(self):
+        for f in self.handles.values():
+            f.close()
+        self.handles.clear()
+
+
+def verify(repo, snapshot=None):
+    """
+    Read every chunk of a backup and check every file it holds against its SHA-256.
+    Arguments:
+        repo(str): backup folder
+        snapshot(str): archive to check (defaults to the newest)
+    Returns:
+        list: one message per damaged file (empty if the backup is sound)
+    """
+    manifest = read_manifest(repo, resolve_snapshot(repo, snapshot))
+    reader = ChunkReader(repo, manifest["chunks"])
+    problems = []
+    try:
+        for entry in manifest["files"]:
+            whole = hashlib.sha256()
+            try:
+                for digest in entry["chunks"]:
+                    whole.update(reader.read(digest))
+            except BackupError as e:
+                problems.append(f"{entry['path']}: {e}")
+                continue
+            if whole.hexdigest() != entry["sha256"]:
+                problems.append(f"{entry['path']}: content doesn't match its checksum")
+    finally:
+        reader.close()
+    return problems
+
+
+def restore(repo, target, snapshot=None, overwrite=False):
+    """
+    Restore every file of a backup into a folder.
+    Each file is rebuilt next to its destination and only moved into place once its
+    chunks and its SHA-256 check out, so a damaged backup never replaces good data.
+    Arguments:
+        repo(str): backup folder
+        target(str): folder to restore into
+        snapshot(str): archive to restore (defaults to the newest)
+        overwrite(bool): replace files that already exist in target
+    Returns:
+        int: number of files restored
+    Raises:
+        BackupError: if a file exists and overwrite is off, or the backup is damaged
+    """
+    manifest = read_manifest(repo, resolve_snapshot(repo, snapshot))
+    if not overwrite:
+        existing = [entry["path"] for entry in manifest["files"] if os.path.exists(os.path.join(target, entry["path"]))]
+        if existing:
+            raise BackupError(f"{len(existing)} files already exist in {target}, e.g. {existing[0]} (use --overwrite)")
+
+    reader = ChunkReader(repo, manifest["chunks"])
+    try:
+        for entry in manifest["files"]:
+            destination = os.path.join(target, *entry["path"].split("/"))
+            os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+            whole = hashlib.sha256()
+            try:
+                with open(destination + ".restore", "wb") as f:
+                    for digest in entry["chunks"]:
+                        data = reader.read(digest)
+                        whole.update(data)
+                        f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                if whole.hexdigest() != entry["sha256"]:
+                    raise BackupError(f"{entry['path']} doesn't match its checksum")
+            except BackupError:
+                os.remove(destination + ".restore")
+                raise
+            os.replace(destination + ".restore", destination)
+    finally:
+        reader.close()
+    return len(manifest["files"])
+
+
+def main():
+    """Command line entry point for backing up, listing, verifying and restoring"""
+    parser = argparse.ArgumentParser(description="Incremental, deduplicated backups of Star Points data.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backup_parser = commands.add_parser("backup", help="back up every client store in a data folder")
+    backup_parser.add_argument("--data", default=".", help="folder the app keeps its data in")
+    backup_parser.add_argument("--repo", default="backups", help="backup folder")
+    list_parser = commands.add_parser("list", help="list the backups")
+    list_parser.add_argument("--repo", default="backups", help="backup folder")
+    verify_parser = commands.add_parser("verify", help="check a backup against its checksums")
+    verify_parser.add_argument("--repo", default="backups", help="backup folder")
+    verify_parser.add_argument("--snapshot", help="backup to check (default: the newest)")
+    restore_parser = commands.add_parser("restore", help="restore a backup into a folder")
+    restore_parser.add_argument("--repo", default="backups", help="backup folder")
+    restore_parser.add_argument("--snapshot", help="backup to restore (default: the newest)")
+    restore_parser.add_argument("--target", required=True, help="folder to restore into")
+    restore_parser.add_argument("--overwrite", action="store_true", help="replace files that already exist")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "backup":
+            summary = backup(args.data, args.repo)
+            print(f"Backed up {summary['files']} files ({summary['data_bytes'] / 1024:.0f} kB) into {summary['archive']}: "
+                  f"{summary['files_read']} changed, {summary['new_chunks']} new chunks, "
+                  f"{summary['stored_bytes'] / 1024:.0f} kB stored in {summary['seconds']:.2f} s")
+        elif args.command == "list":
+            for name in archive_names(args.repo):
+                manifest = read_manifest(args.repo, name)
+                size = os.path.getsize(os.path.join(args.repo, name))
+                print(f"{name}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(manifest['created']))}  "
+                      f"{len(manifest['files'])} files  {size / 1024:.0f} kB")
+        elif args.command == "verify":
+            problems = verify(args.repo, args.snapshot)
+            for problem in problems:
+                print(problem)
+            print("Backup is sound" if not problems else f"{len(problems)} damaged files")
+            raise SystemExit(1 if problems else 0)
+        else:
+            restored = restore(args.repo, args.target, args.snapshot, args.overwrite)
+            print(f"Restored and verified {restored} files into {args.target}")
+    except BackupError as e:
+        print(e)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Point-in-time balance queries for the Star Points Token Economy.
+
+BalanceIndex keeps the points history in timestamp order with two Fenwick
+(binary indexed) trees over it, one for points earned and one for points
+redeemed. The balance at any moment is a bisect to find how many records
+came before it plus two prefix sums, and the points earned or redeemed in
+any range is the difference of two such lookups, all O(log n).
+
+Records are nearly always added in time order, which appends to the trees
+in O(log n). A record stamped earlier than the newest one (a redo, or a
+late record from another tablet) is inserted in place and the trees are
+rebuilt in O(n), which is rare.
+"""
+from bisect import bisect_right #Import bisect to find records by time
+
+#ledger record kinds counted as points earned and redeemed, with the sign of each
+EARNED_SIGNS = {"opening": 1, "award": 1, "undo_award": -1, "rescore": 1}
+REDEEMED_SIGNS = {"redeem": 1, "undo_redeem": -1}
+
+
+class FenwickTree:
+    """
+    FenwickTree keeps prefix sums of a growing list of numbers.
+    """
+
+    def __init__(self, values=()):
+        """
+        Build the tree in O(n).
+        Arguments:
+            values(iterable): initial values
+        """
+        self.tree = [0] + list(values) #1-based, tree[i] covers (i - lowbit(i), i]
+        for index in range(1, len(self.tree)):
+            parent = index + (index & -index)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[index]
+
+
+    def __len__(self):
+        return len(self.tree) - 1
+
+
+    def append(self, value):
+        """Add a value at the end in O(log n)"""
+        index = len(self.tree)
+        #the new node covers (index - lowbit(index), index], the part before it is a range sum
+        lowest = index - (index & -index)
+        self.tree.append(value + self.prefix(index - 1) - self.prefix(lowest))
+
+
+    def prefix(self, count):
+        """Return the sum of the first count values in O(log n)"""
+        total = 0
+        while count > 0:
+            total += self.tree[count]
+            count -= count & -count
+        return total
+
+
+class BalanceIndex:
+    """
+    BalanceIndex answers balance-at-time and range-sum queries over the points history.
+    """
+
+    def __init__(self, records=()):
+        """
+        Arguments:
+            records(iterable): ledger records (kind, amount and ts) in any order
+        """
+        entries = sorted((record["ts"], self.split(record)) for record in records)
+        self.times = [time for time, _ in entries]
+        self.entries = [amounts for _, amounts in entries] #(earned, redeemed) per record, in time order
+        self.rebuild()
+
+
+    @staticmethod
+    def split(record):
+        """Return a record's (earned, redeemed) contribution"""
+        amount = record["amount"]
+        return EARNED_SIGNS.get(record["kind"], 0) * amount, REDEEMED_SIGNS.get(record["kind"], 0) * amount
+
+
+    def rebuild(self):
+        """Rebuild both trees from the entries in O(n)"""
+        self.earned = FenwickTree(earned for earned, _ in self.entries)
+        self.redeemed = FenwickTree(redeemed for _, redeemed in self.entries)
+
+
+    def add(self, record):
+        """
+        Add one record, O(log n) when it is the newest.
+        Arguments:
+            record(dict): ledger record with kind, amount and ts
+        """
+        amounts = self.split(record)
+        if not self.times or record["ts"] >= self.times[-1]:
+            self.times.append(record["ts"])
+            self.entries.append(amounts)
+            self.earned.append(amounts[0])
+            self.redeemed.append(amounts[1])
+            return
+
+        #an older record goes in its place and the trees are rebuilt
+        position = bisect_right(self.times, record["ts"])
+        self.times.insert(position, record["ts"])
+        self.entries.insert(position, amounts)
+        self.rebuild()
+
+
+    def totals_at(self, when):
+        """
+        Return the points earned and redeemed up to and including a moment.
+        Arguments:
+            when(float): timestamp
+        Returns:
+            tuple: (earned, redeemed)
+        """
+        count = bisect_right(self.times, when)
+        return self.earned.prefix(count), self.redeemed.prefix(count)
+
+
+    def balance_at(self, when):
+        """
+        Return the balance just after every record stamped at or before a moment.
+        Arguments:
+            when(float): timestamp
+        """
+        earned, redeemed = self.totals_at(when)
+        return earned - redeemed
+
+
+    def range_totals(self, start, end):
+        """
+        Return the points earned and redeemed after start, up to and including end.
+        Arguments:
+            start(float): timestamp the range starts after
+            end(float): timestamp the range ends at
+        Returns:
+            dict: earned, redeemed and net change
+        """
+        earned_end, redeemed_end = self.totals_at(end)
+        earned_start, redeemed_start = self.totals_at(start)
+        earned, redeemed = earned_end - earned_start, redeemed_end - redeemed_start
+        return {"earned": earned, "redeemed": redeemed, "net": earned - redeemed}
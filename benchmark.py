@@ -0,0 +1,395 @@
+"""
+Benchmarks for the non-GUI code of the Star Points Token Economy.
+
+A deterministic generator builds a caseload of N clients x M days of
+sessions, tasks and reward catalogs from a seed, and the suite measures:
+
+- storage: open, save and load latency and ledger append throughput for
+  every backend (state file, SQLite, legacy pickle files)
+- scoring: entries scored per second, one at a time and in batches
+- rewards: reward eligibility lookups per second
+- startup: time to import the app module, build a DataManager from a
+  populated store, and import a session file
+
+Results are written as JSON with sorted keys, so a saved baseline can be
+diffed, or compared directly to flag regressions. Everything runs headless
+in a temporary folder.
+
+Usage:
+    python benchmark.py --clients 20 --days 365 --output baseline.json
+    python benchmark.py --clients 20 --days 365 --baseline baseline.json
+"""
+import argparse #Import argparse for the command line
+import csv #Import csv to write the session file for the import benchmark
+import json #Import json to write and compare results
+import os #Import os for file paths
+import platform #Import platform to record the machine the results came from
+import random #Import random for the seeded caseload generator
+import subprocess #Import subprocess to time a cold import of the app
+import sys #Import sys to find the Python interpreter
+import tempfile #Import tempfile for a scratch folder
+import time #Import time for the timers
+from datetime import datetime, timedelta, timezone #Import datetime to place sessions on days
+
+from reward_catalog import RewardCatalog #Import the reward cost index
+from scoring import score_batch, score_entry #Import the scoring rules
+from session_io import import_sessions #Import the session file importer
+from statefile import StateFileBackend #Import the state file backend
+from storage import PickleBackend, SQLiteBackend #Import the other storage backends
+
+#first day of every generated caseload, fixed so runs are comparable
+START_DATE = datetime(2025, 1, 6, 15, 0, tzinfo=timezone.utc)
+
+#results more than this fraction worse than the baseline are reported as regressions
+DEFAULT_TOLERANCE = 0.25
+
+#benchmark groups that can be picked with --only
+GROUPS = ["storage", "scoring", "rewards", "startup"]
+
+
+def generate_caseload(clients=10, days=90, seed=1):
+    """
+    Build a deterministic synthetic caseload.
+    Arguments:
+        clients(int): number of clients
+        days(int): days of sessions per client
+        seed(int): random seed, the same seed always gives the same caseload
+    Returns:
+        list: one dict per client with client, tasks, rewards, reward_costs and sessions;
+            each session has ts, self_grade and bonus (as typed) and task_states
+    """
+    rng = random.Random(seed)
+    caseload = []
+    for number in range(clients):
+        tasks = [f"Task {index + 1}" for index in range(rng.randint(4, 10))]
+        rewards = [f"Reward {index + 1}" for index in range(rng.randint(3, 12))]
+        reward_costs = sorted(rng.randint(5, 200) for _ in rewards)
+
+        sessions = []
+        for day in range(days):
+            #most days have one session, some none, a few two
+            for _ in range(rng.choice((0, 1, 1, 1, 2))):
+                moment = START_DATE + timedelta(days=day, minutes=rng.randint(0, 240))
+                sessions.append({
+                    "ts": moment.timestamp(),
+                    "self_grade": str(rng.randint(0, 10)),
+                    "bonus": rng.choice(("", "", "1", "2.5")),
+                    "task_states": [rng.random() < 0.6 for _ in tasks],
+                    })
+
+        caseload.append({
+            "client": f"client{number:03d}",
+            "tasks": tasks,
+            "rewards": rewards,
+            "reward_costs": reward_costs,
+            "sessions": sessions,
+            })
+    return caseload
+
+
+def session_records(client):
+    """Return a client's sessions as ledger award records"""
+    records = []
+    for session in client["sessions"]:
+        points, grade, bonus, _ = score_entry(session["self_grade"], session["bonus"], session["task_states"])
+        tasks = [task for task, state in zip(client["tasks"], session["task_states"]) if state]
+        records.append({"kind": "award", "amount": points, "ts": session["ts"],
+                        "self_grade": grade, "bonus": bonus, "tasks": tasks})
+    return records
+
+
+def percentile(samples, fraction):
+    """Return a percentile of a list of samples (nearest rank)"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def best_of(function, repeat):
+    """
+    Run a function several times.
+    Returns:
+        float: the fastest run in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def bench_storage(caseload, workdir, repeat=3):
+    """
+    Measure open, save and load latency and ledger append throughput for every backend.
+    Returns:
+        dict: "storage.<backend>" -> metrics
+    """
+    backends = {
+        "state": lambda path: StateFileBackend(path),
+        "sqlite": lambda path: SQLiteBackend(os.path.join(path, "star_points.db")),
+        "pickle": lambda path: PickleBackend(path),
+        }
+    results = {}
+    for name, factory in backends.items():
+        path = os.path.join(workdir, f"storage_{name}")
+        os.makedirs(path)
+
+        #save every client's catalog, one batch per client
+        backend = factory(path)
+        save_times = []
+        for client in caseload:
+            started = time.perf_counter()
+            with backend.transaction():
+                backend.save_many(client["client"], {
+                    key: client[key] for key in ("tasks", "rewards", "reward_costs")
+                    })
+            save_times.append(time.perf_counter() - started)
+
+        #append every client's history to its ledger
+        appended = 0
+        started = time.perf_counter()
+        for client in caseload:
+            ledger = backend.open_ledger(client["client"])
+            ledger.sync = False
+            records = session_records(client)
+            if hasattr(ledger, "append_many"):
+                ledger.append_many(records)
+            else:
+                for record in records:
+                    ledger.append(record.pop("kind"), record.pop("amount"), **record)
+            ledger.close()
+            appended += len(records)
+        append_seconds = time.perf_counter() - started
+        backend.close()
+
+        #open cold and load every client's catalog
+        open_seconds = best_of(lambda: factory(path).close(), repeat)
+        backend = factory(path)
+        load_times = []
+        for client in caseload:
+            started = time.perf_counter()
+            for key in ("tasks", "rewards", "reward_costs"):
+                backend.load(client["client"], key, None)
+            load_times.append(time.perf_counter() - started)
+        backend.close()
+
+        results[f"storage.{name}"] = {
+            "open_ms": open_seconds * 1000,
+            "save_p50_ms": percentile(save_times, 0.5) * 1000,
+            "save_p95_ms": percentile(save_times, 0.95) * 1000,
+            "load_p50_ms": percentile(load_times, 0.5) * 1000,
+            "load_p95_ms": percentile(load_times, 0.95) * 1000,
+            "append_per_s": appended / append_seconds if append_seconds else 0,
+            }
+    return results
+
+
+def bench_scoring(caseload, repeat=3):
+    """
+    Measure scoring throughput for single entries and for batches.
+    Returns:
+        dict: "scoring" -> metrics
+    """
+    sessions = [session for client in caseload for session in client["sessions"]]
+
+    def score_each():
+        for session in sessions:
+            score_entry(session["self_grade"], session["bonus"], session["task_states"])
+
+    grades = [float(session["self_grade"]) for session in sessions]
+    bonuses = [float(session["bonus"] or 0) for session in sessions]
+    checked = [sum(session["task_states"]) for session in sessions]
+
+    entry_seconds = best_of(score_each, repeat)
+    batch_seconds = best_of(lambda: score_batch(grades, bonuses, checked), repeat)
+    return {"scoring": {
+        "sessions": len(sessions),
+        "entries_per_s": len(sessions) / entry_seconds if entry_seconds else 0,
+        "batch_per_s": len(sessions) / batch_seconds if batch_seconds else 0,
+        }}
+
+
+def bench_rewards(caseload, lookups=100000, seed=1, repeat=3):
+    """
+    Measure reward eligibility lookups (affordable count and random pick) per second.
+    Returns:
+        dict: "rewards" -> metrics
+    """
+    rng = random.Random(seed)
+    catalogs = [RewardCatalog(client["rewards"], client["reward_costs"]) for client in caseload]
+    queries = [(rng.choice(catalogs), rng.uniform(0, 250)) for _ in range(lookups)]
+    pick_rng = random.Random(seed)
+
+    def lookup():
+        for catalog, balance in queries:
+            catalog.affordable_count(balance)
+            catalog.choose(balance, pick_rng)
+
+    def update():
+        for catalog, balance in queries:
+            catalog.update_balance(balance)
+
+    lookup_seconds = best_of(lookup, repeat)
+    update_seconds = best_of(update, repeat)
+    return {"rewards": {
+        "lookups_per_s": lookups / lookup_seconds if lookup_seconds else 0,
+        "balance_updates_per_s": lookups / update_seconds if update_seconds else 0,
+        }}
+
+
+def bench_startup(caseload, workdir, repeat=3):
+    """
+    Measure a cold import of the app module, building a DataManager from a populated
+    state file, and importing the caseload from a session file.
+    Returns:
+        dict: "startup" -> metrics
+    """
+    results = {}
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, "-c", "import StarPointsTokenEconomyGUI"]
+    try:
+        results["import_ms"] = best_of(
+            lambda: subprocess.run(command, cwd=app_dir, check=True, capture_output=True), repeat
+            ) * 1000
+    except subprocess.CalledProcessError as e:
+        #Tkinter is missing on some headless machines, the other numbers still count
+        print(f"Skipping the app import benchmark: {e.stderr.decode().strip().splitlines()[-1]}")
+
+    #write the caseload as a session file, then time the streaming import
+    session_path = os.path.join(workdir, "sessions.csv")
+    rows = 0
+    with open(session_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["client", "ts", "self_grade", "bonus", "tasks"])
+        for client in caseload:
+            for record in session_records(client):
+                writer.writerow([client["client"], record["ts"], record["self_grade"],
+                                 record["bonus"], ";".join(record["tasks"])])
+                rows += 1
+
+    database = os.path.join(workdir, "import.db")
+    backend = SQLiteBackend(database)
+    started = time.perf_counter()
+    import_sessions(session_path, backend)
+    import_seconds = time.perf_counter() - started
+    backend.close()
+    results["import_rows_per_s"] = rows / import_seconds if import_seconds else 0
+
+    #open the busiest client the way the app does at launch
+    try:
+        from StarPointsTokenEconomyGUI import DataManager #Import lazily, it needs Tkinter
+    except ImportError as e:
+        print(f"Skipping the DataManager benchmark: {e}")
+        return {"startup": results}
+
+    client = max(caseload, key=lambda client: len(client["sessions"]))
+    state_dir = os.path.join(workdir, "startup_state")
+    os.makedirs(state_dir)
+    backend = StateFileBackend(state_dir)
+    backend.save_many(client["client"], {key: client[key] for key in ("tasks", "rewards", "reward_costs")})
+    ledger = backend.open_ledger(client["client"])
+    ledger.sync = False
+    for record in session_records(client):
+        ledger.append(record.pop("kind"), record.pop("amount"), **record)
+    ledger.close()
+    backend.close()
+
+    def open_client():
+        DataManager(client["client"], StateFileBackend(state_dir), device_id="benchmark").close()
+    open_client() #the first open writes the stats snapshot, time the launches after it
+    results["data_manager_ms"] = best_of(open_client, repeat) * 1000
+    return {"startup": results}
+
+
+def run(clients, days, seed=1, repeat=3, groups=GROUPS):
+    """
+    Generate a caseload and run the chosen benchmark groups on it.
+    Returns:
+        dict: meta (machine and caseload) and results (benchmark -> metrics)
+    """
+    caseload = generate_caseload(clients, days, seed)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="star_points_bench_") as workdir:
+        if "storage" in groups:
+            results.update(bench_storage(caseload, workdir, repeat))
+        if "scoring" in groups:
+            results.update(bench_scoring(caseload, repeat))
+        if "rewards" in groups:
+            results.update(bench_rewards(caseload, seed=seed, repeat=repeat))
+        if "startup" in groups:
+            results.update(bench_startup(caseload, workdir, repeat))
+
+    return {
+        "meta": {
+            "clients": clients,
+            "days": days,
+            "seed": seed,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            },
+        "results": {name: {metric: round(value, 3) for metric, value in metrics.items()}
+                    for name, metrics in results.items()},
+        }
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare results with a baseline. Metrics ending in _per_s should go up, _ms should go down.
+    Arguments:
+        baseline(dict): earlier run output
+        current(dict): this run's output
+        tolerance(float): fraction a metric may get worse before it counts as a regression
+    Returns:
+        tuple: (list of report lines, number of regressions)
+    """
+    lines = []
+    regressions = 0
+    for name, metrics in sorted(current["results"].items()):
+        for metric, value in sorted(metrics.items()):
+            old = baseline.get("results", {}).get(name, {}).get(metric)
+            if not old or not (metric.endswith("_ms") or metric.endswith("_per_s")):
+                continue
+            change = (value - old) / old
+            worse = change > tolerance if metric.endswith("_ms") else change < -tolerance
+            regressions += worse
+            flag = "  REGRESSION" if worse else ""
+            lines.append(f"{name}.{metric}: {old:g} -> {value:g} ({change:+.1%}){flag}")
+    return lines, regressions
+
+
+def main():
+    """Command line entry point for running the benchmarks"""
+    parser = argparse.ArgumentParser(description="Benchmark the Star Points non-GUI code.")
+    parser.add_argument("--clients", type=int, default=10, help="number of generated clients")
+    parser.add_argument("--days", type=int, default=90, help="days of sessions per client")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the generated caseload")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per timing, the best is kept")
+    parser.add_argument("--only", help=f"comma separated groups to run ({', '.join(GROUPS)})")
+    parser.add_argument("--output", help="file to write the results to (default: print them)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="fraction a metric may get worse before it is a regression")
+    args = parser.parse_args()
+
+    groups = args.only.split(",") if args.only else GROUPS
+    results = run(args.clients, args.days, args.seed, args.repeat, groups)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("clients") != args.clients or baseline.get("meta", {}).get("days") != args.days:
+            print("Warning: the baseline was run on a different caseload size")
+        lines, regressions = compare(baseline, results, args.tolerance)
+        print("\n".join(lines))
+        print(f"{regressions} regression(s) beyond {args.tolerance:.0%}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Conflict-free point balances for the Star Points Token Economy.
+
+A child's balance is kept as a PN-counter: every device has its own running
+total of points awarded (P) and points redeemed (N), and only ever raises
+its own entries. The balance is sum(P) - sum(N). Two copies merge by taking
+the larger value of each entry, so merging is idempotent and commutative,
+costs O(devices), and never loses an award made while a tablet was offline.
+
+Each entry also remembers the counter's logical clock when it last changed,
+so devices exchange only the entries changed since they last synced
+(delta-state sync) instead of the whole counter.
+
+Run this file directly to reconcile an offline tablet's files with the
+shared database once it is back in the classroom:
+    python crdt.py --client alice --data-dir . --database star_points.db
+"""
+import argparse #Import argparse for the reconcile command line
+import os #Import os to check for the device id file
+import threading #Import threading to guard the counter across threads
+import uuid #Import uuid to generate device ids
+
+from ledger import RECORD_SIGNS #Import the sign each record kind adds to the balance
+
+#storage key the counter is kept under for each client
+COUNTER_KEY = "balance_counter"
+
+#file holding this device's id, created on first run
+DEVICE_ID_FILE = ".device_id"
+
+#prefix of the counter entries for records appended straight to a ledger, e.g. by session_io imports
+IMPORT_DEVICE = "import"
+
+
+def load_device_id(path=DEVICE_ID_FILE):
+    """
+    Return this device's id, creating and saving a new one on first run.
+    Arguments:
+        path(str): file the id is kept in
+    """
+    if os.path.exists(path):
+        with open(path) as f:
+            device_id = f.read().strip()
+        if device_id:
+            return device_id
+    device_id = uuid.uuid4().hex[:12]
+    with open(path, "w") as f:
+        f.write(device_id)
+    return device_id
+
+
+def new_device_id(prefix):
+    """
+    Return a fresh counter entry id for a one-off writer such as an import run.
+    Entries merge by max, so a shared fixed id would lose points when two stores
+    or two runs both counted under it.
+    Arguments:
+        prefix(str): what is writing, e.g. IMPORT_DEVICE
+    """
+    return f"{prefix}-{uuid.uuid4().hex[:12]}"
+
+
+class PNCounter:
+    """
+    PNCounter is a per-device positive/negative counter with delta tracking.
+    """
+
+    def __init__(self):
+        self.p = {} #device id -> total points awarded on that device
+        self.n = {} #device id -> total points redeemed on that device
+        self.changed = {} #("p" or "n", device id) -> clock when the entry last changed
+        self.clock = 0 #logical clock, raised on every change
+        self.lock = threading.RLock()
+
+
+    def value(self):
+        """Return the balance: everything awarded minus everything redeemed"""
+        with self.lock:
+            return sum(self.p.values()) - sum(self.n.values())
+
+
+    def _raise(self, component, device_id, total):
+        """Set an entry to a larger total and stamp it with a new clock"""
+        entries = self.p if component == "p" else self.n
+        if total > entries.get(device_id, 0):
+            entries[device_id] = total
+            self.clock += 1
+            self.changed[(component, device_id)] = self.clock
+            return True
+        return False
+
+
+    def increment(self, device_id, amount):
+        """
+        Record points awarded on a device.
+        Arguments:
+            device_id(str): device making the change
+            amount(float): points awarded (not negative)
+        """
+        if amount < 0:
+            raise ValueError("PN-counter increments cannot be negative")
+        with self.lock:
+            self._raise("p", device_id, self.p.get(device_id, 0) + amount)
+
+
+    def decrement(self, device_id, amount):
+        """
+        Record points redeemed on a device.
+        Arguments:
+            device_id(str): device making the change
+            amount(float): points redeemed (not negative)
+        """
+        if amount < 0:
+            raise ValueError("PN-counter decrements cannot be negative")
+        with self.lock:
+            self._raise("n", device_id, self.n.get(device_id, 0) + amount)
+
+
+    def merge(self, other):
+        """
+        Merge another counter (or delta) into this one, entry by entry.
+        Arguments:
+            other(PNCounter): counter to merge
+        Returns:
+            bool: True if any entry changed
+        """
+        changed = False
+        with self.lock:
+            for device_id, total in other.p.items():
+                changed = self._raise("p", device_id, total) or changed
+            for device_id, total in other.n.items():
+                changed = self._raise("n", device_id, total) or changed
+        return changed
+
+
+    def delta_since(self, clock):
+        """
+        Return a counter holding only the entries changed after a clock value.
+        Arguments:
+            clock(int): clock value of the last sync
+        """
+        delta = PNCounter()
+        with self.lock:
+            for (component, device_id), changed_at in self.changed.items():
+                if changed_at > clock:
+                    entries = self.p if component == "p" else self.n
+                    (delta.p if component == "p" else delta.n)[device_id] = entries[device_id]
+        return delta
+
+
+    def to_dict(self):
+        """Return the counter as plain data for storage or the wire"""
+        with self.lock:
+            return {
+                "p": dict(self.p),
+                "n": dict(self.n),
+                "clock": self.clock,
+                "changed": [[component, device_id, changed_at]
+                            for (component, device_id), changed_at in self.changed.items()],
+            }
+
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a counter from to_dict output (a delta without clocks is fine too).
+        Arguments:
+            data(dict): stored counter
+        """
+        counter = cls()
+        data = data or {}
+        counter.p = dict(data.get("p", {}))
+        counter.n = dict(data.get("n", {}))
+        counter.clock = data.get("clock", 0)
+        counter.changed = {(component, device_id): changed_at
+                           for component, device_id, changed_at in data.get("changed", [])}
+        return counter
+
+
+def exchange_counter(backend, client_id, delta, since):
+    """
+    Merge a delta into the counter stored in a backend and return what the caller is missing.
+    Arguments:
+        backend(StorageBackend): store holding the shared counter
+        client_id(str): client the counter belongs to
+        delta(dict): entries the caller changed since its last sync
+        since(int): stored counter's clock at the caller's last sync
+    Returns:
+        tuple: (dict of entries changed after since, the stored counter's clock)
+    """
+    with backend.transaction():
+        counter = PNCounter.from_dict(backend.load(client_id, COUNTER_KEY, None))
+        if counter.merge(PNCounter.from_dict(delta)):
+            backend.save(client_id, COUNTER_KEY, counter.to_dict())
+    return counter.delta_since(since).to_dict(), counter.clock
+
+
+def count_records(backend, client_id, records, device_id=None):
+    """
+    Count ledger records appended outside DataManager in the stored counter,
+    so the balance shown on the next open includes them.
+    Arguments:
+        backend(StorageBackend): store holding the counter and the ledger
+        client_id(str): client the records were appended for
+        records(list): the appended records
+        device_id(str): counter entry to count them under (a new import entry by default)
+    Returns:
+        bool: True if the stored counter changed
+    """
+    if device_id is None:
+        device_id = new_device_id(IMPORT_DEVICE)
+    with backend.transaction():
+        stored = backend.load(client_id, COUNTER_KEY, None)
+        if stored is None:
+            #DataManager seeds a missing counter from the whole ledger when it opens
+            return False
+        counter = PNCounter.from_dict(stored)
+        clock = counter.clock
+        earned = sum(record["amount"] for record in records if RECORD_SIGNS[record["kind"]] > 0)
+        spent = sum(record["amount"] for record in records if RECORD_SIGNS[record["kind"]] < 0)
+        if earned:
+            counter.increment(device_id, earned)
+        if spent:
+            counter.decrement(device_id, spent)
+        if counter.clock == clock:
+            return False
+        backend.exchange_counter(client_id, counter.delta_since(clock).to_dict(), 0)
+    return True
+
+
+def reconcile_stores(client_id, local, shared):
+    """
+    Two-way merge of the counters held by two backends, e.g. after a field trip.
+    Arguments:
+        client_id(str): client to reconcile
+        local(StorageBackend): the tablet's own store
+        shared(StorageBackend): the classroom store
+    Returns:
+        float: the reconciled balance
+    """
+    counter = PNCounter.from_dict(local.load(client_id, COUNTER_KEY, None))
+    missing, _ = shared.exchange_counter(client_id, counter.to_dict(), 0)
+    counter.merge(PNCounter.from_dict(missing))
+    local.save(client_id, COUNTER_KEY, counter.to_dict())
+    return counter.value()
+
+
+def main():
+    """Command line entry point for reconciling a tablet's files with the shared database"""
+    from statefile import StateFileBackend #Import here, storage imports this module
+    from storage import SQLiteBackend #Import here for the same reason
+
+    parser = argparse.ArgumentParser(description="Reconcile offline Star Points balances.")
+    parser.add_argument("--client", required=True, help="client id to reconcile")
+    parser.add_argument("--data-dir", default=".", help="folder holding the tablet's state file")
+    parser.add_argument("--database", required=True, help="shared SQLite database")
+    args = parser.parse_args()
+
+    local, shared = StateFileBackend(args.data_dir), SQLiteBackend(args.database)
+    try:
+        balance = reconcile_stores(args.client, local, shared)
+    finally:
+        local.close()
+        shared.close()
+    print(f"Reconciled balance for {args.client}: {balance}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+Append-only points ledger for the Star Points Token Economy.
+
+Every award or redemption is appended to the end of a log file as a
+length-prefixed, CRC32-checksummed record, so recording points never
+rewrites earlier history. The balance is rebuilt at startup from the
+latest snapshot plus a replay of the short tail of records written
+after it. Snapshots are written in a background thread once the tail
+grows past a set length.
+"""
+import itertools #Import itertools to put back the record read to check a start position
+import json #Import json to encode record payloads
+import os #Import os for fsync and atomic file replacement
+import struct #Import struct to pack record headers
+import threading #Import threading for background compaction
+import time #Import time to timestamp each record
+import zlib #Import zlib for the crc32 checksum
+
+#header written before every record: payload length and crc32 of the payload
+RECORD_HEADER = struct.Struct("<II")
+
+#record kinds and the sign they apply to the balance (undo_* records reverse an earlier one)
+RECORD_SIGNS = {"opening": 1, "award": 1, "redeem": -1, "undo_award": -1, "undo_redeem": 1, "rescore": 1}
+
+
+def scan_records(path, offset=0):
+    """
+    Generator yielding each intact record in a ledger file from a byte offset.
+    Stops at the first truncated or corrupt record and never writes to the file,
+    so it is safe on a ledger another process is appending to.
+    Arguments:
+        path(str): ledger file
+        offset(int): byte offset to start reading from
+    Yields:
+        tuple: (record dict, byte offset just past the record)
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        f.seek(offset)
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            length, checksum = RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                return
+            offset += RECORD_HEADER.size + length
+            yield json.loads(payload.decode("utf-8")), offset
+
+
+def records_after(path, after=0, start=None):
+    """
+    Generator yielding the records in a ledger file with a higher sequence number than after.
+    Reading starts at a saved position when it lies at or before after, and falls back to
+    the beginning of the file when the record found there doesn't follow on from it.
+    Arguments:
+        path(str): ledger file
+        after(int): only yield records with a higher sequence number
+        start(tuple): (sequence, byte offset just past that record), e.g. from PointsLedger.position
+    Yields:
+        tuple: (record dict, byte offset just past the record)
+    """
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return
+    sequence, offset = 0, 0
+    if start and start[0] <= after and start[1] <= size:
+        sequence, offset = start
+
+    records = scan_records(path, offset)
+    if 0 < offset < size:
+        first = next(records, None)
+        if first is None or first[0]["seq"] != sequence + 1:
+            #the position belongs to another copy of the file (e.g. one restored from a backup)
+            records = scan_records(path, 0)
+        else:
+            records = itertools.chain([first], records)
+    for record, end in records:
+        if record["seq"] > after:
+            yield record, end
+
+
+class PointsLedger:
+    """
+    PointsLedger stores point awards and redemptions as an append-only log.
+    Keeps the running balance in memory and compacts it into a snapshot file.
+    """
+
+    def __init__(self, path, snapshot_path=None, compact_every=256, sync=True):
+        """
+        Open (or create) the ledger and rebuild the current balance.
+        Arguments:
+            path(str): file the log records are appended to
+            snapshot_path(str): file holding the latest snapshot (defaults to path + ".snapshot")
+            compact_every(int): number of tail records that triggers a new snapshot
+            sync(bool): fsync after every append so a power loss never loses a record
+        """
+        self.path = path
+        self.snapshot_path = snapshot_path or path + ".snapshot"
+        self.compact_every = compact_every
+        self.sync = sync
+
+        self.balance = 0 #current balance after every record
+        self.sequence = 0 #number of records ever appended
+        self.tail_length = 0 #records appended since the last snapshot
+
+        self._lock = threading.Lock() #guards the log file and counters
+        self._compactor = None #background snapshot thread, if one is running
+        self._snapshot_position = (0, 0) #(sequence, offset) covered by the latest snapshot
+
+        self._recover()
+        self._log = open(self.path, "ab")
+
+
+    def _recover(self):
+        """
+        Rebuild the balance from the snapshot and replay the tail of the log.
+        A torn record at the end of the log (from a crash mid-write) is cut off.
+        """
+        snapshot = self._read_snapshot()
+        self.balance = snapshot["balance"]
+        self.sequence = snapshot["sequence"]
+        offset = snapshot["offset"]
+        self._snapshot_position = (self.sequence, offset)
+
+        #only the records after the snapshot need to be replayed
+        valid_end = offset
+        for record, end in self._scan(offset):
+            self._apply(record)
+            self.tail_length += 1
+            valid_end = end
+
+        #drop any partial record left behind by an interrupted write
+        if os.path.exists(self.path) and os.path.getsize(self.path) > valid_end:
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_end)
+
+
+    def _read_snapshot(self):
+        """
+        Read the latest snapshot. Falls back to an empty ledger if missing or damaged.
+        Returns:
+            dict: balance, sequence, and log offset covered by the snapshot
+        """
+        empty = {"balance": 0, "sequence": 0, "offset": 0}
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                snapshot = self._decode(f.read())
+        except FileNotFoundError:
+            return empty
+
+        #a damaged snapshot only costs a full replay, never lost points
+        if snapshot is None or snapshot.get("offset", 0) > self._log_size():
+            return empty
+        return snapshot
+
+
+    def _log_size(self):
+        """Return the size of the log file in bytes (0 if it doesn't exist yet)"""
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+
+    def _scan(self, offset=0):
+        """
+        Generator yielding each intact record in the log from a byte offset.
+        Stops at the first truncated or corrupt record.
+        Arguments:
+            offset(int): byte offset to start reading from
+        Yields:
+            tuple: (record dict, byte offset just past the record)
+        """
+        return scan_records(self.path, offset)
+
+
+    def _encode(self, record):
+        """
+        Frame a record as header + payload bytes.
+        Arguments:
+            record(dict): record to serialize
+        Returns:
+            bytes: the framed record
+        """
+        payload = json.dumps(record, separators=(",", ":")).encode("utf-8")
+        return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+    def _decode(self, data):
+        """
+        Decode a single framed record, returning None if it fails its checksum.
+        Arguments:
+            data(bytes): framed record bytes
+        """
+        if len(data) < RECORD_HEADER.size:
+            return None
+        length, checksum = RECORD_HEADER.unpack_from(data)
+        payload = data[RECORD_HEADER.size:RECORD_HEADER.size + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            return None
+        return json.loads(payload.decode("utf-8"))
+
+
+    def _apply(self, record):
+        """Apply one record to the in-memory balance"""
+        self.balance += RECORD_SIGNS[record["kind"]] * record["amount"]
+        self.sequence = record["seq"]
+
+
+    def append(self, kind, amount, **details):
+        """
+        Append one award, redemption or opening balance to the ledger.
+        Arguments:
+            kind(str): "award", "redeem", "opening", an undo_* reversal or a "rescore" correction
+            amount(float): number of points (always positive, except for a rescore)
+            details: extra fields to keep with the record (self grade, reward name, ts...)
+        Returns:
+            float: the balance after this record
+        """
+        if kind not in RECORD_SIGNS:
+            raise ValueError(f"Unknown ledger record kind: {kind}")
+
+        with self._lock:
+            record = dict(details, seq=self.sequence + 1, kind=kind, amount=amount)
+            record.setdefault("ts", time.time())
+
+            #a single write of the framed record keeps the append O(1)
+            self._log.write(self._encode(record))
+            self._log.flush()
+            if self.sync:
+                os.fsync(self._log.fileno())
+
+            self._apply(record)
+            self.tail_length += 1
+            balance = self.balance
+
+        if self.tail_length >= self.compact_every:
+            self.compact(background=True)
+        return balance
+
+
+    def append_many(self, records):
+        """
+        Append several records with a single write and fsync.
+        Arguments:
+            records(iterable): dicts with kind, amount and optional ts and details
+        Returns:
+            float: the balance after the last record
+        """
+        with self._lock:
+            framed = []
+            for record in records:
+                if record["kind"] not in RECORD_SIGNS:
+                    raise ValueError(f"Unknown ledger record kind: {record['kind']}")
+                record = dict(record, seq=self.sequence + len(framed) + 1)
+                record.setdefault("ts", time.time())
+                framed.append((record, self._encode(record)))
+
+            self._log.write(b"".join(data for _, data in framed))
+            self._log.flush()
+            if self.sync:
+                os.fsync(self._log.fileno())
+
+            for record, _ in framed:
+                self._apply(record)
+            self.tail_length += len(framed)
+            balance = self.balance
+
+        if self.tail_length >= self.compact_every:
+            self.compact(background=True)
+        return balance
+
+
+    def flush(self):
+        """Force every appended record to disk, used when appends are made with sync off"""
+        with self._lock:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+
+
+    def position(self):
+        """
+        Return where the log ends now, so a later history read can start there.
+        Returns:
+            tuple: (sequence number of the last record, byte offset just past it)
+        """
+        with self._lock:
+            self._log.flush()
+            return self.sequence, self._log.tell()
+
+
+    def history(self, after=0, start=None):
+        """
+        Generator over every record in the ledger, oldest first.
+        Reading starts at the latest known position at or before after (the snapshot's
+        or the caller's), so only the records after it are decoded.
+        Arguments:
+            after(int): only yield records with a higher sequence number
+            start(tuple): (sequence, offset) from an earlier position() call
+        Yields:
+            dict: each ledger record
+        """
+        with self._lock:
+            self._log.flush()
+            snapshot = self._snapshot_position
+
+        #the later of the two positions that lie at or before after
+        if not start or start[0] > after or (snapshot[0] <= after and snapshot[0] > start[0]):
+            start = snapshot
+        return (record for record, _ in records_after(self.path, after, start))
+
+
+    def compact(self, background=False):
+        """
+        Write a snapshot of the current balance so startup only replays newer records.
+        Arguments:
+            background(bool): run in a daemon thread instead of blocking the caller
+        """
+        if background:
+            #only one compaction at a time, the next append will trigger another
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(target=self._write_snapshot, daemon=True)
+            self._compactor.start()
+        else:
+            self._write_snapshot()
+
+
+    def _write_snapshot(self):
+        """Atomically replace the snapshot file with the current balance"""
+        with self._lock:
+            self._log.flush()
+            snapshot = {
+                "balance": self.balance,
+                "sequence": self.sequence,
+                "offset": self._log.tell(),
+            }
+            self.tail_length = 0
+            self._snapshot_position = (snapshot["sequence"], snapshot["offset"])
+
+        #write to a temporary file first so a crash never leaves a half snapshot
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(self._encode(snapshot))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+
+
+    def close(self):
+        """Wait for any running compaction and close the log file"""
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            self._log.close()
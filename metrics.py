@@ -0,0 +1,230 @@
+"""
+Hot-path instrumentation for the Star Points Token Economy.
+
+Functions decorated with timed() record their latency into a histogram,
+and count() bumps a counter, both in one process-wide registry. Metrics
+are off unless the app is launched with --metrics-file or --metrics-port;
+while off, a timed call costs one flag check and count() returns at once.
+
+The registry is exported in the Prometheus text format, either written to
+a file (for node_exporter's textfile collector or to copy off a kiosk) or
+served from http://127.0.0.1:<port>/metrics. Every sample carries the
+device id, so kiosks in the field can be compared on one dashboard.
+"""
+import os #Import os to replace the metrics file atomically
+import threading #Import threading to guard the registry and serve the endpoint
+import time #Import time for the high resolution clock
+from bisect import bisect_left #Import bisect_left to find a sample's histogram bucket
+from functools import wraps #Import wraps to keep the names of timed functions
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer #Import the endpoint server
+
+#prefix of every exported metric name
+PREFIX = "star_points_"
+
+#histogram bucket upper bounds in seconds, from half a millisecond up to a stalled UI
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+#help text of the counters the app bumps
+COUNTER_HELP = {
+    "entries_recorded": "Entries scored and added to the ledger",
+    "entries_rejected": "Entries refused by validation",
+    "rewards_redeemed": "Rewards redeemed",
+    "redemptions_refused": "Redemptions refused for lack of points",
+    "image_load_errors": "Images that failed to load",
+    "image_cache_errors": "Scaled images that could not be cached",
+    "ui_stalls": "Event loop stalls over the watchdog threshold",
+    }
+
+
+class Histogram:
+    """
+    Histogram counts samples into fixed buckets and keeps their sum.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) #the last slot is past every bound (+Inf)
+        self.total = 0.0
+
+    def observe(self, value):
+        """Add one sample"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+
+class Registry:
+    """
+    Registry holds every counter, gauge and histogram with its help text.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.labels = {} #labels added to every sample, e.g. the device id
+        self.help = {} #metric name -> help text
+        self.counters = {} #(name, labels) -> value
+        self.gauges = {} #(name, labels) -> value
+        self.histograms = {} #name -> Histogram
+        self.lock = threading.Lock() #saves also run on the write-behind thread
+
+
+    def enable(self, **labels):
+        """
+        Start recording.
+        Arguments:
+            labels: labels added to every exported sample (e.g. device="kiosk-3")
+        """
+        self.labels = {name: str(value) for name, value in labels.items()}
+        self.enabled = True
+
+
+    def observe(self, name, seconds):
+        """Add a latency sample to a histogram"""
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(seconds)
+
+
+    def count(self, name, amount=1, **labels):
+        """Add to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+
+    def set_gauge(self, name, value, **labels):
+        """Set a gauge to a value"""
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+
+    def format_labels(self, extra=()):
+        """Return the label set of a sample as {name="value",...} (empty if there are none)"""
+        pairs = list(self.labels.items()) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+    def export(self):
+        """
+        Render every metric in the Prometheus text exposition format.
+        Returns:
+            str: the exposition text
+        """
+        lines = []
+        with self.lock:
+            for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+                suffix = "_total" if kind == "counter" else ""
+                for name in sorted({name for name, _ in values}):
+                    lines.append(f"# HELP {PREFIX}{name}{suffix} {self.help.get(name, name)}")
+                    lines.append(f"# TYPE {PREFIX}{name}{suffix} {kind}")
+                    for (key_name, labels), value in sorted(values.items()):
+                        if key_name == name:
+                            lines.append(f"{PREFIX}{name}{suffix}{self.format_labels(labels)} {value:g}")
+
+            for name, histogram in sorted(self.histograms.items()):
+                full_name = f"{PREFIX}{name}_seconds"
+                lines.append(f"# HELP {full_name} {self.help.get(name, name)}")
+                lines.append(f"# TYPE {full_name} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{full_name}_bucket{self.format_labels([('le', bound)])} {cumulative}")
+                lines.append(f"{full_name}_sum{self.format_labels()} {histogram.total:.6f}")
+                lines.append(f"{full_name}_count{self.format_labels()} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+#registry shared by the whole process
+REGISTRY = Registry()
+REGISTRY.help.update(COUNTER_HELP)
+
+
+def timed(name, description=None):
+    """
+    Decorator recording how long every call of a function takes.
+    Arguments:
+        name(str): histogram name, exported as star_points_<name>_seconds
+        description(str): help text for the export
+    """
+    REGISTRY.help[name] = description or name
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not REGISTRY.enabled:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                REGISTRY.observe(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+def count(name, amount=1, **labels):
+    """Add to a counter (exported as star_points_<name>_total) if metrics are enabled"""
+    if REGISTRY.enabled:
+        REGISTRY.count(name, amount, **labels)
+
+
+def record_startup(timer):
+    """
+    Copy the launch phases of a StartupTimer into gauges.
+    Arguments:
+        timer(StartupTimer): timer with the finished phases
+    """
+    if not REGISTRY.enabled:
+        return
+    REGISTRY.help["startup_phase_seconds"] = "Duration of each launch phase"
+    REGISTRY.help["startup_total_seconds"] = "Seconds from launch to the end of the last phase"
+    for name, _, duration in timer.phases:
+        REGISTRY.set_gauge("startup_phase_seconds", duration, phase=name)
+    REGISTRY.set_gauge("startup_total_seconds", timer.total())
+
+
+def write_metrics(path):
+    """
+    Write the export to a file, replacing it atomically so a scraper never reads half of it.
+    Arguments:
+        path(str): file to write
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.export())
+    os.replace(temp_path, path)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the export at /metrics"""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.export().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass #scrapes every few seconds would flood the console
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    """
+    Serve the export from a daemon thread.
+    Arguments:
+        port(int): port to listen on (0 picks a free one)
+        host(str): address to listen on, localhost unless a scraper runs elsewhere
+    Returns:
+        ThreadingHTTPServer: the running server (server_address holds the port)
+    """
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
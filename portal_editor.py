@@ -0,0 +1,220 @@
+"""
+Virtualized Parent Portal editor for the Star Points Token Economy.
+
+The editor keeps every task, reward and cost in plain Python lists and only
+creates Entry widgets for the rows that fit on screen. Scrolling rebinds
+those same widgets to a different slice of the lists, so catalogs with
+thousands of items open as fast as one with ten.
+
+A filter narrows the table to a list of row indices without copying the
+rows, so edits made while it is on still land in the full lists. Filters
+set while typing are applied once the typing pauses. The searched columns
+are indexed from the table's own rows and re-indexed cell by cell as they
+are edited, so a search finds what is on screen, not what was last saved.
+"""
+import tkinter as tk #Import Tkinter for the editor window
+
+from search_index import SearchIndex #Import the word prefix index for the searched columns
+from view_pool import Debouncer #Import Debouncer to redraw once per pause in typing
+
+
+class VirtualTable:
+    """
+    VirtualTable shows a window of rows from a list of lists using a fixed pool of Entry widgets.
+    Typing into a row past the end of the data adds new rows.
+    """
+
+    def __init__(self, parent, rows, column_count, visible_rows=12, first_grid_row=1, width=20, filter_delay_ms=120,
+                 search_columns=()):
+        """
+        Arguments:
+            parent(Widget): window the entries are placed in
+            rows(list): list of row lists (one string per column), edited in place
+            column_count(int): number of columns
+            visible_rows(int): number of Entry rows to create
+            first_grid_row(int): grid row of the first entry row
+            width(int): entry width in characters
+            filter_delay_ms(int): quiet time after the last set_filter before the table redraws
+            search_columns(tuple): columns search() looks in
+        """
+        self.rows = rows
+        self.column_count = column_count
+        self.visible_rows = visible_rows
+        self.first = 0 #index of the data row shown in the top entry row
+        self._loading = False #True while redraw is filling the entries
+        self.view = None #indices of the data rows shown when filtered, None shows every row
+        self.pending_view = None #filter waiting for the typing to pause
+        self.filter_debouncer = Debouncer(parent, self.apply_filter, filter_delay_ms)
+        self.search_indexes = {column: SearchIndex([row[column] for row in rows]) for column in search_columns}
+
+        #one StringVar per visible cell, traced so edits go straight to the data
+        self.vars = []
+        for slot in range(visible_rows):
+            row_vars = []
+            for column in range(column_count):
+                var = tk.StringVar()
+                var.trace_add("write", lambda *args, s=slot, c=column: self.on_edit(s, c))
+                entry = tk.Entry(parent, width=width, textvariable=var)
+                entry.grid(row=first_grid_row + slot, column=column, padx=10, pady=5)
+                entry.bind("<MouseWheel>", self.on_mouse_wheel)
+                entry.bind("<Button-4>", lambda event: self.scroll_to(self.first - 1))
+                entry.bind("<Button-5>", lambda event: self.scroll_to(self.first + 1))
+                row_vars.append(var)
+            self.vars.append(row_vars)
+
+        #scrollbar standing in for the rows that have no widgets
+        self.scrollbar = tk.Scrollbar(parent, orient="vertical", command=self.on_scroll)
+        self.scrollbar.grid(row=first_grid_row, column=column_count, rowspan=visible_rows, sticky="ns")
+        self.redraw()
+
+
+    def total_rows(self):
+        """Return the number of scrollable rows (the data plus one blank row to type into)"""
+        shown = len(self.rows) if self.view is None else len(self.view)
+        return max(shown + 1, self.visible_rows)
+
+
+    def row_index(self, slot):
+        """
+        Return the data row shown in an entry row.
+        Past the end of a filter, rows map to new rows after the data, as they do unfiltered.
+        """
+        position = self.first + slot
+        if self.view is None:
+            return position
+        if position < len(self.view):
+            return self.view[position]
+        return len(self.rows) + position - len(self.view)
+
+
+    def search(self, query):
+        """
+        Return the data rows with a searched cell matching a query, as edited so far.
+        Arguments:
+            query(str): text typed in a filter box
+        Returns:
+            list: matching row indices in order, or None for a blank query
+        """
+        if not query.strip():
+            return None
+        rows = set()
+        for index in self.search_indexes.values():
+            rows.update(index.search(query))
+        return sorted(rows)
+
+
+    def set_filter(self, view):
+        """
+        Show only some data rows, once set_filter hasn't been called for filter_delay_ms.
+        Arguments:
+            view(list): data row indices to show in order, or None to show every row
+        """
+        self.pending_view = None if view is None else list(view)
+        self.filter_debouncer.trigger()
+
+
+    def apply_filter(self):
+        """Show the rows of the latest filter, scrolled to the top"""
+        self.view = self.pending_view
+        self.first = 0
+        self.redraw()
+
+
+    def redraw(self):
+        """Fill the pooled entries from the data rows currently in view"""
+        self._loading = True
+        try:
+            for slot, row_vars in enumerate(self.vars):
+                index = self.row_index(slot)
+                row = self.rows[index] if index < len(self.rows) else None
+                for column, var in enumerate(row_vars):
+                    value = row[column] if row is not None else ""
+                    #only touch cells whose text actually differs
+                    if var.get() != value:
+                        var.set(value)
+        finally:
+            self._loading = False
+
+        total = self.total_rows()
+        self.scrollbar.set(self.first / total, (self.first + self.visible_rows) / total)
+
+
+    def on_edit(self, slot, column):
+        """Copy an edited cell back into the data, adding rows if typing past the end"""
+        if self._loading:
+            return
+        index = self.row_index(slot)
+        while index >= len(self.rows):
+            #rows typed while filtered stay in view until the filter changes
+            self.new_row()
+        self.rows[index][column] = self.vars[slot][column].get()
+        if column in self.search_indexes:
+            self.search_indexes[column].set(index, self.rows[index][column])
+
+
+    def new_row(self):
+        """Add a blank row at the end of the data, kept in view and in the search indexes"""
+        #rows typed while filtered stay in view until the filter changes
+        if self.view is not None:
+            self.view.append(len(self.rows))
+        self.rows.append([""] * self.column_count)
+        for index in self.search_indexes.values():
+            index.set(len(self.rows) - 1, "")
+
+
+    def scroll_to(self, first):
+        """
+        Show the rows starting at a given index.
+        Arguments:
+            first(int): data row to show at the top
+        """
+        first = max(0, min(first, self.total_rows() - self.visible_rows))
+        if first != self.first:
+            self.first = first
+            self.redraw()
+
+
+    def on_scroll(self, action, amount, unit=None):
+        """Handle scrollbar drags ("moveto") and clicks ("scroll")"""
+        if action == "moveto":
+            self.scroll_to(round(float(amount) * self.total_rows()))
+        elif unit == "pages":
+            self.scroll_to(self.first + int(amount) * self.visible_rows)
+        else:
+            self.scroll_to(self.first + int(amount))
+
+
+    def on_mouse_wheel(self, event):
+        """Scroll three rows per mouse wheel notch"""
+        self.scroll_to(self.first - 3 * (1 if event.delta > 0 else -1))
+
+
+    def add_row(self):
+        """Add a blank row at the end and scroll it into view"""
+        self.new_row()
+        self.scroll_to(len(self.rows) if self.view is None else len(self.view))
+
+
+def build_rows(*columns):
+    """
+    Turn parallel column lists into a list of row lists of strings.
+    Arguments:
+        columns(list): one list per column (tasks, rewards, costs)
+    Returns:
+        list: row lists, as long as the longest column
+    """
+    length = max((len(column) for column in columns), default=0)
+    return [
+        [str(column[index]) if index < len(column) else "" for column in columns]
+        for index in range(length)
+        ]
+
+
+def column_values(rows, column):
+    """
+    Return the non-empty values of one column, as the original portal saved them.
+    Arguments:
+        rows(list): row lists from the editor
+        column(int): column index
+    """
+    return [row[column] for row in rows if row[column].strip() != ""]
@@ -0,0 +1,77 @@
+"""
+Warm profile cache for switching children in kiosk mode.
+
+ProfileCache keeps the DataManagers of the most recently used children
+open in least-recently-used order. Switching to a warm child is a
+dictionary lookup, with its catalog, ledger, stats and undo log already
+loaded; only a cold child is loaded from the backend. Once more than
+capacity children are open, the least recently used one is evicted and
+closed, which writes its queued saves and stats snapshot.
+
+All profiles share one storage backend, which the cache closes last.
+"""
+from collections import OrderedDict #Import OrderedDict to keep the profiles in use order
+
+#children kept loaded at once
+DEFAULT_WARM_PROFILES = 4
+
+
+class ProfileCache:
+    """
+    ProfileCache is an LRU cache of open DataManagers keyed by client id.
+    """
+
+    def __init__(self, factory, capacity=DEFAULT_WARM_PROFILES, backend=None):
+        """
+        Arguments:
+            factory(callable): opens a DataManager for a client id
+            capacity(int): number of profiles kept open
+            backend(StorageBackend): backend shared by the profiles, closed by close()
+        """
+        self.factory = factory
+        self.capacity = max(1, capacity)
+        self.backend = backend
+        self.profiles = OrderedDict() #client id -> DataManager, least recently used first
+        self.hits = 0 #switches to a warm profile
+        self.misses = 0 #switches that had to load a profile
+
+
+    def __contains__(self, client_id):
+        return client_id in self.profiles
+
+
+    def get(self, client_id):
+        """
+        Return a client's profile, loading it if it isn't warm, and mark it most recently used.
+        Arguments:
+            client_id(str): client to switch to
+        Returns:
+            DataManager: the client's open profile
+        """
+        if client_id in self.profiles:
+            self.profiles.move_to_end(client_id)
+            self.hits += 1
+            return self.profiles[client_id]
+
+        profile = self.factory(client_id)
+        self.misses += 1
+        self.profiles[client_id] = profile
+        while len(self.profiles) > self.capacity:
+            #the evicted profile has been idle since it was switched away from, so its queue is short
+            _, evicted = self.profiles.popitem(last=False)
+            evicted.close()
+        return profile
+
+
+    def client_ids(self):
+        """Return the warm client ids, most recently used first"""
+        return list(reversed(self.profiles))
+
+
+    def close(self):
+        """Close every profile, then the shared backend"""
+        while self.profiles:
+            _, profile = self.profiles.popitem(last=False)
+            profile.close()
+        if self.backend is not None:
+            self.backend.close()
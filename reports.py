@@ -0,0 +1,288 @@
+"""
+Batch weekly progress reports for the Star Points Token Economy.
+
+Writes one HTML progress sheet per client for a week: a summary of the
+balance, points, self-grades, streaks, task completion and redemptions,
+with SVG bar charts of points per day and per week. Clients are split
+into chunks and the chunks fanned out across a process pool; every
+worker opens the store itself, streams each child's history through a
+StatsEngine (so memory per worker stays bounded by one child's daily
+totals), and is replaced after a few chunks to give its memory back.
+
+Sheets are written atomically under <output>/<week ending>/, so a run
+that is interrupted can simply be started again and skips the sheets
+already written. An index.html linking every sheet is written last.
+
+Usage:
+    python reports.py --database star_points.db --output reports
+    python reports.py --data-dir . --week-ending 2025-03-07 --workers 8
+"""
+import argparse #Import argparse for the report command line
+import datetime #Import datetime to pick the week being reported
+import html #Import html to escape names in the sheets
+import os #Import os for output paths and the CPU count
+import time #Import time to show run progress
+from multiprocessing import Pool #Import Pool to render clients in parallel
+
+from crdt import COUNTER_KEY, PNCounter #Import the balance counter
+from ledger import RECORD_SIGNS #Import the sign each ledger record applies to the balance
+from stats import StatsEngine, day_key, week_key #Import the running statistics
+from statefile import StateFileBackend #Import the state file backend
+from storage import SQLiteBackend #Import the SQLite backend
+
+#clients rendered by one worker task
+DEFAULT_CHUNK_SIZE = 25
+
+#chunks a worker process renders before it is replaced, bounding its memory
+CHUNKS_PER_WORKER = 4
+
+#weeks shown in the weekly points chart
+CHART_WEEKS = 8
+
+
+def open_backend(spec):
+    """
+    Open a backend in a worker from a picklable description.
+    Arguments:
+        spec(tuple): ("sqlite", database path) or ("state", data folder)
+    """
+    kind, path = spec
+    if kind == "sqlite":
+        return SQLiteBackend(path)
+    #report workers only read, they must never rewrite the shared state file
+    return StateFileBackend(path, pack_on_close=False)
+
+
+def bar_chart(title, labels, values, width=480, height=200):
+    """
+    Draw a bar chart as inline SVG.
+    Arguments:
+        title(str): caption above the chart
+        labels(list): label under each bar
+        values(list): height of each bar
+    Returns:
+        str: the svg element
+    """
+    top = max(max(values, default=0), 1)
+    slot = width / max(len(values), 1)
+    chart_height = height - 40
+    parts = [f'<svg width="{width}" height="{height}" role="img" aria-label="{html.escape(title)}">',
+             f'<text x="0" y="14" font-weight="bold">{html.escape(title)}</text>']
+    for index, (label, value) in enumerate(zip(labels, values)):
+        bar = max(value, 0) / top * (chart_height - 20)
+        x = index * slot + slot * 0.15
+        y = 20 + chart_height - bar
+        parts.append(f'<rect x="{x:.1f}" y="{y:.1f}" width="{slot * 0.7:.1f}" height="{bar:.1f}" fill="#4a7bd0"/>')
+        parts.append(f'<text x="{x + slot * 0.35:.1f}" y="{y - 3:.1f}" font-size="11" '
+                     f'text-anchor="middle">{value:g}</text>')
+        parts.append(f'<text x="{x + slot * 0.35:.1f}" y="{height - 4}" font-size="11" '
+                     f'text-anchor="middle">{html.escape(label)}</text>')
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+def client_report(backend, client_id, week_ending):
+    """
+    Fold a client's history up to the end of a week into a StatsEngine.
+    Arguments:
+        backend(StorageBackend): store to read from
+        client_id(str): client to report on
+        week_ending(date): last day of the week
+    Returns:
+        dict: client, tasks, stats (StatsEngine), balance and week_ending
+    """
+    tasks = backend.load(client_id, "tasks", [])
+    cutoff = datetime.datetime.combine(week_ending + datetime.timedelta(days=1), datetime.time()).timestamp()
+
+    stats = StatsEngine()
+    balance = 0
+    #history is streamed through a reader that never writes to the ledger, and only the
+    #daily and weekly totals are kept
+    for record in backend.read_history(client_id):
+        if record["ts"] >= cutoff:
+            continue
+        stats.add(record)
+        balance += RECORD_SIGNS[record["kind"]] * record["amount"]
+
+    #the current balance comes from the merged counter when there is one
+    counter = backend.load(client_id, COUNTER_KEY, None)
+    current_balance = PNCounter.from_dict(counter).value() if counter else balance
+    return {"client": client_id, "tasks": tasks, "stats": stats, "balance": balance,
+            "current_balance": current_balance, "week_ending": week_ending}
+
+
+def render_report(report):
+    """
+    Render one client's progress sheet.
+    Arguments:
+        report(dict): client_report output
+    Returns:
+        str: the HTML page
+    """
+    stats, week_ending = report["stats"], report["week_ending"]
+    summary = stats.summary(report["tasks"], today=week_ending)
+    days = [week_ending - datetime.timedelta(days=offset) for offset in range(6, -1, -1)]
+    weeks = [week_ending - datetime.timedelta(weeks=offset) for offset in range(CHART_WEEKS - 1, -1, -1)]
+
+    daily = [stats.daily_points.get(day_key(day), 0) for day in days]
+    grade = summary["average_grade"]
+    rows = [
+        ("Balance at week end", f"{report['balance']:g}"),
+        ("Balance now", f"{report['current_balance']:g}"),
+        ("Points this week", f"{sum(daily):g}"),
+        ("Average self-grade", "-" if grade is None else f"{grade:.1f}"),
+        ("Streak", f"{summary['streak']} days (best {summary['best_streak']})"),
+        ("Rewards redeemed", f"{summary['redemptions']} ({summary['redemptions_per_week']:.1f} a week)"),
+        ]
+    task_rows = "\n".join(
+        f"<tr><td>{html.escape(task)}</td><td>{rate:.0%}</td></tr>"
+        for task, rate in stats.task_rates(report["tasks"]).items()
+        )
+    summary_rows = "\n".join(f"<tr><th>{name}</th><td>{html.escape(value)}</td></tr>" for name, value in rows)
+    client = html.escape(report["client"])
+    return f"""<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>Star Points - {client} - week ending {week_ending}</title>
+<style>body {{ font-family: sans-serif; }} td, th {{ padding: 2px 12px; text-align: left; }}</style></head>
+<body>
+<h1>Star Points progress: {client}</h1>
+<p>Week ending {week_ending.isoformat()}</p>
+<table>
+{summary_rows}
+</table>
+{bar_chart("Points per day", [day.strftime("%a") for day in days], daily)}
+{bar_chart("Points per week", [week_key(week)[-3:] for week in weeks],
+           [stats.weekly_points.get(week_key(week), 0) for week in weeks])}
+<h2>Task completion</h2>
+<table>
+<tr><th>Task</th><th>Completed</th></tr>
+{task_rows}
+</table>
+</body>
+</html>
+"""
+
+
+def report_path(output_dir, week_ending, client_id):
+    """Return the file a client's sheet is written to"""
+    return os.path.join(output_dir, week_ending.isoformat(), f"{client_id}.html")
+
+
+def render_chunk(job):
+    """
+    Worker task: render every client in a chunk that doesn't have a sheet yet.
+    Arguments:
+        job(tuple): (backend spec, client ids, output folder, week ending, force)
+    Returns:
+        list: (client id, "written", "skipped" or an error message) per client
+    """
+    spec, client_ids, output_dir, week_ending, force = job
+    results = []
+    backend = open_backend(spec)
+    try:
+        for client_id in client_ids:
+            path = report_path(output_dir, week_ending, client_id)
+            if os.path.exists(path) and not force:
+                results.append((client_id, "skipped"))
+                continue
+            try:
+                page = render_report(client_report(backend, client_id, week_ending))
+            except Exception as e:
+                #one damaged client shouldn't stop the run, it is retried next time
+                results.append((client_id, f"failed: {e}"))
+                continue
+
+            #write next to the final name and rename, so a sheet is never half written
+            temp_path = path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(page)
+            os.replace(temp_path, path)
+            results.append((client_id, "written"))
+    finally:
+        backend.close()
+    return results
+
+
+def write_index(output_dir, week_ending, client_ids):
+    """Write index.html linking every client's sheet for the week"""
+    links = "\n".join(
+        f'<li><a href="{html.escape(client_id)}.html">{html.escape(client_id)}</a></li>'
+        for client_id in client_ids
+        if os.path.exists(report_path(output_dir, week_ending, client_id))
+        )
+    with open(os.path.join(output_dir, week_ending.isoformat(), "index.html"), "w", encoding="utf-8") as f:
+        f.write(f"<!DOCTYPE html>\n<html>\n<head><meta charset=\"utf-8\"><title>Star Points reports - "
+                f"week ending {week_ending}</title></head>\n<body>\n<h1>Week ending {week_ending}</h1>\n"
+                f"<ul>\n{links}\n</ul>\n</body>\n</html>\n")
+
+
+def generate_reports(spec, output_dir, week_ending, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                     clients=None, force=False, progress=print):
+    """
+    Render every client's sheet for a week across a pool of worker processes.
+    Arguments:
+        spec(tuple): backend description for open_backend
+        output_dir(str): folder the sheets are written under
+        week_ending(date): last day of the week reported
+        workers(int): worker processes (defaults to the CPU count)
+        chunk_size(int): clients per worker task
+        clients(list): clients to report on (defaults to every client in the store)
+        force(bool): render sheets that already exist again
+        progress(callable): called with a progress line after each chunk (None for silence)
+    Returns:
+        dict: number of clients per outcome ("written", "skipped", "failed")
+    """
+    if clients is None:
+        backend = open_backend(spec)
+        try:
+            clients = backend.clients()
+        finally:
+            backend.close()
+    os.makedirs(os.path.join(output_dir, week_ending.isoformat()), exist_ok=True)
+
+    jobs = [(spec, clients[start:start + chunk_size], output_dir, week_ending, force)
+            for start in range(0, len(clients), chunk_size)]
+    counts = {"written": 0, "skipped": 0, "failed": 0}
+    done = 0
+    started = time.perf_counter()
+    with Pool(workers or os.cpu_count(), maxtasksperchild=CHUNKS_PER_WORKER) as pool:
+        #chunks finish in any order, progress is reported as each one comes back
+        for results in pool.imap_unordered(render_chunk, jobs):
+            for client_id, status in results:
+                if status.startswith("failed"):
+                    counts["failed"] += 1
+                    if progress is not None:
+                        progress(f"{client_id}: {status}")
+                else:
+                    counts[status] += 1
+            done += len(results)
+            if progress is not None:
+                progress(f"[{done}/{len(clients)}] clients done in {time.perf_counter() - started:.1f}s")
+
+    write_index(output_dir, week_ending, clients)
+    return counts
+
+
+def main():
+    """Command line entry point for the weekly report run"""
+    parser = argparse.ArgumentParser(description="Write weekly Star Points progress sheets.")
+    parser.add_argument("--database", help="SQLite database to report on (default: the state file in --data-dir)")
+    parser.add_argument("--data-dir", default=".", help="folder holding the state file")
+    parser.add_argument("--output", default="reports", help="folder to write the sheets under")
+    parser.add_argument("--week-ending", help="last day of the week, YYYY-MM-DD (default: today)")
+    parser.add_argument("--client", action="append", help="client to report on (default: every client)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="clients per worker task")
+    parser.add_argument("--force", action="store_true", help="rewrite sheets that already exist")
+    args = parser.parse_args()
+
+    spec = ("sqlite", args.database) if args.database else ("state", args.data_dir)
+    week_ending = (datetime.date.fromisoformat(args.week_ending) if args.week_ending
+                   else datetime.date.today())
+    counts = generate_reports(spec, args.output, week_ending, args.workers, args.chunk_size,
+                              args.client, args.force)
+    print(f"Written {counts['written']}, skipped {counts['skipped']}, failed {counts['failed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Reward catalog for the Star Points Token Economy.
+
+Keeps rewards sorted by cost so "what can be afforded with N points" is a
+bisect instead of a scan over every reward. Affordable rewards always form
+a prefix of the sorted list, so weighted random selection uses a running
+total of weights over that prefix, and threshold events fire only when the
+balance moves past a reward's cost.
+"""
+import random #Import random for weighted reward selection
+from bisect import bisect_left, bisect_right #Import bisect for the sorted cost index
+
+
+class RewardCatalog:
+    """
+    RewardCatalog stores rewards sorted by cost with cumulative selection weights.
+    Listeners are told which rewards became affordable or unaffordable as the balance changes.
+    """
+
+    def __init__(self, rewards=(), costs=(), weights=None):
+        """
+        Build the catalog from the parallel reward and cost lists kept by DataManager.
+        Arguments:
+            rewards(list): reward names
+            costs(list): cost of each reward in points
+            weights(list): selection weight of each reward (defaults to 1 each)
+        """
+        self.listeners = [] #callbacks for threshold events
+        self.balance = None #last balance passed to update_balance
+        self.load(rewards, costs, weights)
+
+
+    def load(self, rewards, costs, weights=None):
+        """
+        Replace the catalog contents, keeping listeners and the current balance.
+        Arguments:
+            rewards(list): reward names
+            costs(list): cost of each reward in points
+            weights(list): selection weight of each reward (defaults to 1 each)
+        """
+        if weights is None:
+            weights = [1] * min(len(rewards), len(costs))
+
+        #sort once by cost, the order random picks and thresholds rely on
+        entries = sorted(zip(costs, rewards, weights), key=lambda entry: entry[0])
+        self.costs = [cost for cost, _, _ in entries]
+        self.names = [name for _, name, _ in entries]
+        self.weights = [weight for _, _, weight in entries]
+
+        #cumulative weights so any affordable prefix can be sampled with a bisect
+        self.cumulative = []
+        running_total = 0
+        for weight in self.weights:
+            running_total += weight
+            self.cumulative.append(running_total)
+
+
+    def __len__(self):
+        return len(self.costs)
+
+
+    def add(self, reward, cost, weight=1):
+        """
+        Insert one reward in cost order.
+        Arguments:
+            reward(str): reward name
+            cost(float): cost in points
+            weight(float): selection weight
+        """
+        index = bisect_right(self.costs, cost)
+        self.costs.insert(index, cost)
+        self.names.insert(index, reward)
+        self.weights.insert(index, weight)
+
+        #only the running totals from the insert point onward change
+        previous = self.cumulative[index - 1] if index else 0
+        self.cumulative.insert(index, previous)
+        for i in range(index, len(self.cumulative)):
+            self.cumulative[i] += weight
+
+
+    def remove(self, reward, cost):
+        """
+        Remove one reward with the given name and cost.
+        Arguments:
+            reward(str): reward name
+            cost(float): cost in points
+        Raises:
+            KeyError: if the reward isn't in the catalog
+        """
+        index = bisect_left(self.costs, cost)
+        while index < len(self.costs) and self.costs[index] == cost:
+            if self.names[index] == reward:
+                weight = self.weights[index]
+                for i in range(index + 1, len(self.cumulative)):
+                    self.cumulative[i] -= weight
+                del self.costs[index], self.names[index], self.weights[index], self.cumulative[index]
+                return
+            index += 1
+        raise KeyError(reward)
+
+
+    def affordable_count(self, points):
+        """
+        Return how many rewards cost at most the given points.
+        Arguments:
+            points(float): available points
+        """
+        return bisect_right(self.costs, points)
+
+
+    def affordable(self, points):
+        """
+        Return the rewards that can be bought with the given points, cheapest first.
+        Arguments:
+            points(float): available points
+        Returns:
+            list: (reward, cost) tuples
+        """
+        count = self.affordable_count(points)
+        return list(zip(self.names[:count], self.costs[:count]))
+
+
+    def choose(self, points, rng=random):
+        """
+        Pick one affordable reward at random, weighted by each reward's weight.
+        Arguments:
+            points(float): available points
+            rng(Random): random number source
+        Returns:
+            tuple or None: (reward, cost), or None if nothing is affordable
+        """
+        count = self.affordable_count(points)
+        if count == 0 or self.cumulative[count - 1] <= 0:
+            return None
+
+        #pick a point along the prefix's total weight and find whose slice it lands in
+        target = rng.random() * self.cumulative[count - 1]
+        index = min(bisect_right(self.cumulative, target, 0, count), count - 1)
+        return self.names[index], self.costs[index]
+
+
+    def subscribe(self, callback):
+        """
+        Register a threshold listener.
+        Arguments:
+            callback(callable): called as callback(unlocked, locked) with lists of
+                (reward, cost) tuples that crossed a threshold
+        """
+        self.listeners.append(callback)
+
+
+    def unsubscribe(self, callback):
+        """Remove a threshold listener registered with subscribe"""
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+
+    def update_balance(self, points):
+        """
+        Record a new balance and notify listeners if it crossed any reward cost.
+        Arguments:
+            points(float): the new balance
+        Returns:
+            bool: True if the set of affordable rewards changed
+        """
+        if self.balance is None:
+            #the first balance only sets the starting point, nothing has crossed yet
+            self.balance = points
+            return False
+
+        old_count = self.affordable_count(self.balance)
+        new_count = self.affordable_count(points)
+        self.balance = points
+        if old_count == new_count:
+            return False
+
+        #only the rewards between the old and new positions crossed a threshold
+        start, end = sorted((old_count, new_count))
+        crossed = list(zip(self.names[start:end], self.costs[start:end]))
+        unlocked, locked = (crossed, []) if new_count > old_count else ([], crossed)
+        for callback in self.listeners:
+            callback(unlocked, locked)
+        return True
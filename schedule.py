@@ -0,0 +1,206 @@
+"""
+Recurring task schedules for the Star Points Token Economy.
+
+Each task can have a schedule, written in the Parent Portal as clauses
+separated by semicolons (an empty schedule means every day):
+
+    weekdays | weekends | mon wed fri      days of the week
+    every 2 days                           every Nth day, counted from the "from" date
+    from 2025-03-01                        first day the task applies
+    until 2025-06-30                       last day the task applies
+
+e.g. "mon wed fri; until 2025-06-30" or "every 2 days; from 2025-03-03".
+
+CalendarIndex precomputes, for every day in a window, a bitmask of the
+tasks that apply that day, so "which tasks apply on date D" is one list
+lookup instead of evaluating every rule. Editing one task's schedule only
+recomputes that task's bit across the window.
+"""
+import datetime #Import datetime for dates and weekdays
+
+#storage key the schedules are kept under, one per task in the same order as the tasks
+SCHEDULES_KEY = "task_schedules"
+
+#days precomputed past the last day asked for
+HORIZON_DAYS = 366
+
+#day names accepted in schedules, Monday first like date.weekday()
+DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+#anchor for "every N days" when no "from" date is given
+DEFAULT_ANCHOR = datetime.date(2000, 1, 3)
+
+
+class ScheduleError(ValueError):
+    """
+    Raised when a schedule can't be read.
+    The message is the text shown to the user.
+    """
+
+
+class Schedule:
+    """
+    Schedule decides whether a task applies on a given day.
+    """
+
+    def __init__(self, weekdays=None, every=1, start=None, end=None):
+        """
+        Arguments:
+            weekdays(set): weekday numbers (Monday is 0) the task applies on, None for all
+            every(int): the task applies every Nth day counted from start
+            start(date): first day, or None
+            end(date): last day, or None
+        """
+        self.weekdays = weekdays
+        self.every = every
+        self.start = start
+        self.end = end
+
+
+    def applies(self, day):
+        """Return True if the task applies on a day"""
+        if self.start is not None and day < self.start:
+            return False
+        if self.end is not None and day > self.end:
+            return False
+        if self.weekdays is not None and day.weekday() not in self.weekdays:
+            return False
+        anchor = self.start or DEFAULT_ANCHOR
+        return (day - anchor).days % self.every == 0
+
+
+def parse_schedule(text):
+    """
+    Read a schedule written in the Parent Portal.
+    Arguments:
+        text(str): schedule clauses separated by semicolons ("" for every day)
+    Returns:
+        Schedule: the parsed schedule
+    Raises:
+        ScheduleError: if a clause isn't understood
+    """
+    schedule = Schedule()
+    for clause in str(text or "").lower().split(";"):
+        words = clause.replace(",", " ").split()
+        if not words or words == ["daily"]:
+            continue
+        try:
+            if words == ["weekdays"]:
+                schedule.weekdays = {0, 1, 2, 3, 4}
+            elif words == ["weekends"]:
+                schedule.weekdays = {5, 6}
+            elif all(word[:3] in DAY_NAMES for word in words):
+                schedule.weekdays = {DAY_NAMES.index(word[:3]) for word in words}
+            elif words[0] == "every" and len(words) == 3 and words[2] in ("day", "days"):
+                schedule.every = int(words[1])
+                if schedule.every < 1:
+                    raise ValueError
+            elif words[0] == "from" and len(words) == 2:
+                schedule.start = datetime.date.fromisoformat(words[1])
+            elif words[0] == "until" and len(words) == 2:
+                schedule.end = datetime.date.fromisoformat(words[1])
+            else:
+                raise ValueError
+        except ValueError:
+            raise ScheduleError(f"Can't read the schedule clause \"{clause.strip()}\".") from None
+    return schedule
+
+
+class CalendarIndex:
+    """
+    CalendarIndex keeps a bitmask of the tasks that apply on each day of a window.
+    """
+
+    def __init__(self, tasks, schedules, first_day=None, days=HORIZON_DAYS):
+        """
+        Arguments:
+            tasks(list): task names
+            schedules(list): schedule text per task (missing entries mean every day)
+            first_day(date): first day of the window (defaults to a week ago)
+            days(int): number of days to precompute
+        """
+        self.tasks = list(tasks)
+        self.schedules = [parse_schedule(self.schedule_text(schedules, position)) for position in range(len(tasks))]
+        self.first = (first_day or datetime.date.today() - datetime.timedelta(days=7)).toordinal()
+        self.masks = [] #bitmask of applicable task positions per day, from self.first
+        self.names = {} #bitmask -> tuple of task names, shared by days with the same tasks
+        self.extend(self.first + days)
+
+
+    @staticmethod
+    def schedule_text(schedules, position):
+        """Return the schedule text for a task position ("" if there is none)"""
+        return schedules[position] if position < len(schedules) and schedules[position] else ""
+
+
+    def extend(self, last):
+        """Precompute the days up to (not including) an ordinal"""
+        for ordinal in range(self.first + len(self.masks), last):
+            day = datetime.date.fromordinal(ordinal)
+            mask = 0
+            for position, schedule in enumerate(self.schedules):
+                if schedule.applies(day):
+                    mask |= 1 << position
+            self.masks.append(mask)
+
+
+    def tasks_on(self, day):
+        """
+        Return the tasks that apply on a day, O(1) for days in the window.
+        Arguments:
+            day(date): day to look up
+        Returns:
+            tuple: task names in their list order
+        """
+        offset = day.toordinal() - self.first
+        if offset < 0:
+            #days before the window are rare (old reports), evaluate them directly
+            return tuple(task for task, schedule in zip(self.tasks, self.schedules) if schedule.applies(day))
+        if offset >= len(self.masks):
+            self.extend(day.toordinal() + HORIZON_DAYS)
+
+        mask = self.masks[offset]
+        if mask not in self.names:
+            self.names[mask] = tuple(task for position, task in enumerate(self.tasks) if mask >> position & 1)
+        return self.names[mask]
+
+
+    def update(self, position, task, schedule_text):
+        """
+        Change one task (name or schedule), recomputing only its bit across the window.
+        Arguments:
+            position(int): task position
+            task(str): task name
+            schedule_text(str): schedule text
+        Raises:
+            ScheduleError: if the schedule can't be read
+        """
+        schedule = parse_schedule(schedule_text)
+        while len(self.tasks) <= position:
+            self.tasks.append("")
+            self.schedules.append(Schedule(end=datetime.date.min))
+        self.tasks[position] = task
+        self.schedules[position] = schedule
+        self.names.clear()
+
+        bit = 1 << position
+        for offset in range(len(self.masks)):
+            if schedule.applies(datetime.date.fromordinal(self.first + offset)):
+                self.masks[offset] |= bit
+            else:
+                self.masks[offset] &= ~bit
+
+
+    def resize(self, count):
+        """
+        Drop tasks from a position onward, clearing their bits.
+        Arguments:
+            count(int): number of tasks to keep
+        """
+        if count >= len(self.tasks):
+            return
+        del self.tasks[count:]
+        del self.schedules[count:]
+        keep = (1 << count) - 1
+        self.masks = [mask & keep for mask in self.masks]
+        self.names.clear()
@@ -0,0 +1,177 @@
+"""
+Headless scoring engine for the Star Points Token Economy.
+
+Holds the validation and scoring rules used by WidgetCreator.enter_data so
+points can be scored without a GUI:
+
+    points = self_grade + bonus_points + checked_tasks
+
+score_batch applies the same rule to whole arrays of sessions at once using
+NumPy when it is installed, and falls back to plain Python otherwise.
+"""
+import math #Import math to reject nan and infinite values
+
+try:
+    import numpy as np #Import numpy for vectorized batch scoring
+except ImportError:
+    np = None #batch scoring falls back to plain Python without numpy
+
+#valid range for the self-grade
+MIN_GRADE = 0
+MAX_GRADE = 10
+
+
+class ScoringError(ValueError):
+    """
+    Raised when an entry fails validation.
+    The message is the text shown to the user.
+    """
+
+
+def parse_self_grade(self_grade_input):
+    """
+    Validate and convert the self-grade text typed by the user.
+    Arguments:
+        self_grade_input(str): raw text from the self-grade field
+    Returns:
+        float: the self-grade
+    Raises:
+        ScoringError: if the grade is empty, not a finite number, or outside 0-10
+    """
+    self_grade_input = str(self_grade_input).strip()
+    if self_grade_input == "":
+        raise ScoringError("Self-grade cannot be empty.")
+
+    try:
+        self_grade = float(self_grade_input)
+    except ValueError:
+        raise ScoringError("Self-grade must be a number.") from None
+
+    #nan fails every comparison, so it has to be ruled out on its own
+    if not math.isfinite(self_grade) or self_grade < MIN_GRADE or self_grade > MAX_GRADE:
+        raise ScoringError("Self-grade must be between 0 and 10.")
+    return self_grade
+
+
+def parse_bonus(bonus_points_input):
+    """
+    Validate and convert the bonus points text. An empty field counts as 0.
+    Arguments:
+        bonus_points_input(str): raw text from the bonus points field
+    Returns:
+        float: the bonus points
+    Raises:
+        ScoringError: if the bonus is not a finite number
+    """
+    bonus_points_input = str(bonus_points_input).strip()
+    if not bonus_points_input:
+        return 0
+
+    try:
+        bonus_points = float(bonus_points_input)
+    except ValueError:
+        raise ScoringError("Bonus points must be a number.") from None
+
+    if not math.isfinite(bonus_points):
+        raise ScoringError("Bonus points must be a finite number.")
+    return bonus_points
+
+
+def parse_checked_tasks(checked_tasks_input, task_count):
+    """
+    Validate a number of checked tasks given as a count instead of checkbox states,
+    e.g. by a session import. A session can't check off more tasks than it lists.
+    Arguments:
+        checked_tasks_input(str): raw count
+        task_count(int): number of tasks the session lists
+    Returns:
+        int: the number of checked tasks
+    Raises:
+        ScoringError: if the count is not a whole number or outside 0 to task_count
+    """
+    try:
+        checked_tasks = float(str(checked_tasks_input).strip())
+    except ValueError:
+        raise ScoringError("Checked tasks must be a number.") from None
+
+    if not checked_tasks.is_integer():
+        raise ScoringError("Checked tasks must be a whole number.")
+    if checked_tasks < 0 or checked_tasks > task_count:
+        raise ScoringError(f"Checked tasks must be between 0 and {task_count}.")
+    return int(checked_tasks)
+
+
+def score_session(self_grade, bonus_points, checked_tasks):
+    """
+    Score one session.
+    Arguments:
+        self_grade(float): validated self-grade
+        bonus_points(float): validated bonus points
+        checked_tasks(int): number of tasks checked off
+    Returns:
+        float: points earned for the session
+    """
+    return self_grade + bonus_points + checked_tasks
+
+
+def score_entry(self_grade_input, bonus_points_input, task_states):
+    """
+    Validate raw entry values and score them, as enter_data does.
+    Arguments:
+        self_grade_input(str): raw self-grade text
+        bonus_points_input(str): raw bonus points text
+        task_states(iterable): one truthy value per checked task
+    Returns:
+        tuple: (points, self_grade, bonus_points, checked_tasks)
+    Raises:
+        ScoringError: if any value fails validation
+    """
+    self_grade = parse_self_grade(self_grade_input)
+    bonus_points = parse_bonus(bonus_points_input)
+    checked_tasks = sum(1 for state in task_states if state)
+    return score_session(self_grade, bonus_points, checked_tasks), self_grade, bonus_points, checked_tasks
+
+
+def score_batch(self_grades, bonus_points, checked_tasks):
+    """
+    Score many sessions at once.
+    Arguments:
+        self_grades(sequence): self-grade per session
+        bonus_points(sequence): bonus points per session
+        checked_tasks(sequence): number of checked tasks per session, or a
+            2D sessions x tasks array of checkbox states
+    Returns:
+        array (or list without numpy): points per session
+    Raises:
+        ScoringError: if any self-grade is outside 0-10
+    """
+    if np is None:
+        return _score_batch_python(self_grades, bonus_points, checked_tasks)
+
+    grades = np.asarray(self_grades, dtype=np.float64)
+    bonuses = np.asarray(bonus_points, dtype=np.float64)
+    tasks = np.asarray(checked_tasks)
+
+    #a 2D array of checkbox states is reduced to a count per session
+    if tasks.ndim == 2:
+        tasks = np.count_nonzero(tasks, axis=1)
+
+    invalid = np.flatnonzero((grades < MIN_GRADE) | (grades > MAX_GRADE))
+    if invalid.size:
+        raise ScoringError(f"Self-grade must be between 0 and 10 (session {invalid[0]}).")
+
+    return grades + bonuses + tasks
+
+
+def _score_batch_python(self_grades, bonus_points, checked_tasks):
+    """Plain Python version of score_batch used when numpy isn't installed"""
+    scores = []
+    for index, (grade, bonus, tasks) in enumerate(zip(self_grades, bonus_points, checked_tasks)):
+        if grade < MIN_GRADE or grade > MAX_GRADE:
+            raise ScoringError(f"Self-grade must be between 0 and 10 (session {index}).")
+
+        #a row of checkbox states is reduced to a count
+        if not isinstance(tasks, (int, float)):
+            tasks = sum(1 for state in tasks if state)
+        scores.append(score_session(grade, bonus, tasks))
+    return scores
@@ -0,0 +1,274 @@
+"""
+Scoring rules for the Star Points Token Economy.
+
+The Parent Portal keeps a list of scoring rules, one per line:
+
+    task Reading = 2              a checked task is worth 2 points instead of 1
+    streak 5 x1.5                 points are multiplied by 1.5 from the 5th day in a row
+    time 07:00-09:00 +2           2 extra points for an entry made in that window
+    cap session 25                no entry is worth more than 25 points
+    cap day 40                    no more than 40 points are earned in one day
+
+With no rules an entry scores self_grade + bonus + one point per checked
+task, as before. The rules are validated and compiled once into a chain of
+closures holding only the rules that are set, so scoring an entry never
+re-reads the rule text.
+
+When the rules change, rescore() works out which days the change can
+affect (the days with a reweighted task, a session in a changed time
+window, a streak long enough for a changed multiplier, or a total that
+reaches a changed cap) and recomputes only the sessions of those days,
+reading only the months of session history they fall in. Each difference
+becomes a "rescore" ledger record, so the balance moves by exactly the
+change and the ledger stays append-only.
+"""
+import datetime #Import datetime for days and times of day
+import math #Import math to reject nan and infinite numbers in rules
+
+from stats import day_key #Import day_key to read the points earned per day
+
+#storage key the rule lines are kept under for each client
+RULES_KEY = "scoring_rules"
+
+
+class RuleError(ValueError):
+    """
+    Raised when a rule can't be read.
+    The message is the text shown to the user.
+    """
+
+
+def parse_clock(text):
+    """Return the minute of the day for "HH:MM" """
+    hours, _, minutes = text.partition(":")
+    minute = int(hours) * 60 + int(minutes or 0)
+    if not 0 <= minute <= 24 * 60:
+        raise ValueError
+    return minute
+
+
+def minute_of_day(ts):
+    """Return the local minute of the day a timestamp falls in"""
+    moment = datetime.datetime.fromtimestamp(ts)
+    return moment.hour * 60 + moment.minute
+
+
+def streak_on(daily_points, day):
+    """
+    Return how many days in a row end on a day, counting the day itself.
+    Arguments:
+        daily_points(dict): day key -> points, one key per day with an entry
+        day(date): day being scored
+    """
+    streak = 1
+    while day_key(day - datetime.timedelta(days=streak)) in daily_points:
+        streak += 1
+    return streak
+
+
+class RuleSet:
+    """
+    RuleSet holds validated rules and the scoring function compiled from them.
+    """
+
+    def __init__(self, weights=None, streaks=(), windows=(), session_cap=None, day_cap=None):
+        """
+        Arguments:
+            weights(dict): task name -> points for checking it (1 if missing)
+            streaks(iterable): (days, multiplier) tiers
+            windows(iterable): (start minute, end minute, bonus) time-of-day bonuses
+            session_cap(float): most points one entry can earn, or None
+            day_cap(float): most points one day can earn, or None
+        """
+        self.weights = dict(weights or {})
+        self.streaks = sorted(set(streaks), reverse=True)
+        self.windows = sorted(set(windows))
+        self.session_cap = session_cap
+        self.day_cap = day_cap
+        self.score = self.compile()
+
+
+    def compile(self):
+        """
+        Build the scoring function from the rules that are set.
+        Returns:
+            callable: score(self_grade, bonus, tasks, minute, streak, day_total) -> points
+        """
+        weights = self.weights
+        if weights:
+            task_points = lambda tasks: sum(weights.get(task, 1) for task in tasks)
+        else:
+            task_points = len
+
+        steps = [] #each takes (points, minute, streak, day_total) and returns the new points
+        windows = self.windows
+        if windows:
+            steps.append(lambda points, minute, streak, day_total: points + sum(
+                bonus for start, end, bonus in windows if start <= minute < end))
+        tiers = self.streaks
+        if tiers:
+            def multiply(points, minute, streak, day_total):
+                for days, multiplier in tiers:
+                    if streak >= days:
+                        return points * multiplier
+                return points
+            steps.append(multiply)
+        if self.session_cap is not None:
+            session_cap = self.session_cap
+            steps.append(lambda points, minute, streak, day_total: min(points, session_cap))
+        if self.day_cap is not None:
+            day_cap = self.day_cap
+            steps.append(lambda points, minute, streak, day_total: max(0, min(points, day_cap - day_total)))
+
+        def score(self_grade, bonus, tasks, minute=0, streak=1, day_total=0):
+            points = self_grade + bonus + task_points(tasks)
+            for step in steps:
+                points = step(points, minute, streak, day_total)
+            return points
+        return score
+
+
+    def affected(self, other):
+        """
+        Describe what could score differently under these rules than under other.
+        Returns:
+            dict: tasks (reweighted names), windows ((start, end) ranges of changed bonuses),
+                streak (shortest streak whose multiplier changed, or None) and
+                cap (lowest day total a changed cap can bite at, or None)
+        """
+        tasks = {task for task in set(self.weights) | set(other.weights)
+                 if self.weights.get(task, 1) != other.weights.get(task, 1)}
+        windows = [(start, end) for start, end, _ in set(self.windows) ^ set(other.windows)]
+        streak_tiers = set(self.streaks) ^ set(other.streaks)
+        caps = [cap for mine, theirs in ((self.session_cap, other.session_cap), (self.day_cap, other.day_cap))
+                if mine != theirs for cap in (mine, theirs) if cap is not None]
+        return {
+            "tasks": tasks,
+            "windows": windows,
+            "streak": min((days for days, _ in streak_tiers), default=None),
+            "cap": min(caps, default=None),
+        }
+
+
+def parse_number(text):
+    """Read a number from a rule line, refusing nan and infinity (which float() accepts)"""
+    number = float(text)
+    if not math.isfinite(number):
+        raise ValueError(text)
+    return number
+
+
+def parse_rules(lines):
+    """
+    Read the rule lines from the Parent Portal.
+    Arguments:
+        lines(list): one rule per line, blank lines are skipped
+    Returns:
+        RuleSet: the compiled rules
+    Raises:
+        RuleError: if a line isn't understood
+    """
+    weights, streaks, windows = {}, [], []
+    caps = {"session": None, "day": None}
+    for line in lines or ():
+        words = str(line).split()
+        if not words:
+            continue
+        keyword = words[0].lower()
+        try:
+            if keyword == "task" and "=" in words:
+                split = words.index("=")
+                name = " ".join(words[1:split])
+                if not name or len(words) != split + 2:
+                    raise ValueError
+                weights[name] = parse_number(words[split + 1])
+            elif keyword == "streak" and len(words) == 3 and words[2].lower().startswith("x"):
+                days, multiplier = int(words[1]), parse_number(words[2][1:])
+                if days < 1 or multiplier < 0:
+                    raise ValueError
+                streaks.append((days, multiplier))
+            elif keyword == "time" and len(words) == 3 and words[2].startswith("+"):
+                start, _, end = words[1].partition("-")
+                start, end = parse_clock(start), parse_clock(end)
+                if start >= end:
+                    raise ValueError
+                windows.append((start, end, parse_number(words[2][1:])))
+            elif keyword == "cap" and len(words) == 3 and words[1].lower() in caps:
+                caps[words[1].lower()] = parse_number(words[2])
+            else:
+                raise ValueError
+        except ValueError:
+            raise RuleError(f"Can't read the scoring rule \"{str(line).strip()}\".") from None
+    return RuleSet(weights, streaks, windows, caps["session"], caps["day"])
+
+
+def day_bounds(day):
+    """Return the first timestamp of a day and of the day after it"""
+    start = datetime.datetime.combine(day, datetime.time())
+    return start.timestamp(), (start + datetime.timedelta(days=1)).timestamp()
+
+
+def affected_days(history, daily_points, change):
+    """
+    Return the days a rule change can score differently, reading as little history as possible.
+    Arguments:
+        history(SessionHistory): the client's sessions
+        daily_points(dict): day key -> points earned that day (from the stats)
+        change(dict): RuleSet.affected output
+    Returns:
+        set: dates to rescore
+    """
+    days = set()
+
+    #caps and streaks are decided from the per-day totals alone
+    if change["cap"] is not None or change["streak"] is not None:
+        for key, total in daily_points.items():
+            day = datetime.date.fromisoformat(key)
+            if change["cap"] is not None and total >= change["cap"]:
+                days.add(day)
+            elif change["streak"] is not None and streak_on(daily_points, day) >= change["streak"]:
+                days.add(day)
+
+    #task and time-of-day changes skip every month whose summary rules them out
+    task_bits = sum(1 << history.task_bits[task] for task in change["tasks"] if task in history.task_bits)
+    hour_bits = 0
+    for start, end in change["windows"]:
+        for hour in range(start // 60, min((end + 59) // 60, 24)):
+            hour_bits |= 1 << hour
+    if task_bits or hour_bits:
+        for month in history.months_matching(task_bits, hour_bits):
+            for session in history.month_sessions(month):
+                minute = minute_of_day(session.ts)
+                if (session.task_mask & task_bits
+                        or any(start <= minute < end for start, end in change["windows"])):
+                    days.add(datetime.date.fromtimestamp(session.ts))
+    return days
+
+
+def rescore(history, daily_points, old_rules, new_rules):
+    """
+    Recompute the sessions a rule change affects.
+    Arguments:
+        history(SessionHistory): the client's sessions, with their current points
+        daily_points(dict): day key -> points earned that day
+        old_rules(RuleSet): rules the history was scored with
+        new_rules(RuleSet): rules to score it with now
+    Returns:
+        list: (session timestamp, change in points) for every session whose points change
+    """
+    days = affected_days(history, daily_points, new_rules.affected(old_rules))
+    adjustments = []
+    for day in sorted(days):
+        start, end = day_bounds(day)
+        sessions = sorted((session for session in history.scan(start, end) if not session.undone),
+                          key=lambda session: session.ts)
+        streak = streak_on(daily_points, day)
+        day_total = 0
+        for session in sessions:
+            #self-grades are kept as 32-bit floats, rounding gives back the grade that was typed
+            points = new_rules.score(round(session.self_grade, 4), session.bonus, session.tasks,
+                                     minute_of_day(session.ts), streak, day_total)
+            day_total += points
+            if abs(points - session.points) > 1e-9:
+                adjustments.append((session.ts, points - session.points))
+    return adjustments
@@ -0,0 +1,155 @@
+"""
+Search-as-you-type index for the Star Points Token Economy.
+
+SearchIndex keeps the words of every task or reward name in a sorted list
+with the positions of the names each word appears in. A query matches a
+name when every word typed is the start of one of the name's words, so
+"rea bo" finds "Read a book". Each query word is looked up with a binary
+search for its prefix range instead of a scan of the catalog.
+
+Typing usually adds one letter at a time, so a query that extends the last
+one only looks up the words that changed and keeps the last results that
+have them, and each keystroke narrows the results instead of searching the
+whole catalog again. When the Parent Portal saves, update() re-indexes
+only the positions whose name changed, and set() re-indexes a single
+position, e.g. a portal cell as it is edited.
+"""
+import re #Import re to split names into words
+from bisect import bisect_left, insort #Import bisect to find the words starting with a prefix
+
+#characters that separate words in a name
+WORD_SPLIT = re.compile(r"[^\w]+")
+
+
+def tokenize(text):
+    """Return the distinct lowercase words of a name or query, in order"""
+    return list(dict.fromkeys(word for word in WORD_SPLIT.split(str(text).lower()) if word))
+
+
+class SearchIndex:
+    """
+    SearchIndex is a word prefix index over one catalog list (tasks or rewards).
+    """
+
+    def __init__(self, names=()):
+        """
+        Arguments:
+            names(list): the catalog list, indexed by position
+        """
+        self.names = [] #position -> name as indexed
+        self.words = [] #position -> the name's words
+        self.postings = {} #word -> set of positions whose name has it
+        self.sorted_words = [] #every word in postings, sorted for prefix lookups
+        self.last_query = None #words of the last query answered
+        self.last_results = [] #positions that matched it
+        self.update(names)
+
+
+    def __len__(self):
+        return len(self.names)
+
+
+    def add_word(self, word, position):
+        """Record that the name at a position has a word"""
+        positions = self.postings.get(word)
+        if positions is None:
+            positions = self.postings[word] = set()
+            insort(self.sorted_words, word)
+        positions.add(position)
+
+
+    def remove_word(self, word, position):
+        """Forget that the name at a position has a word"""
+        positions = self.postings[word]
+        positions.discard(position)
+        if not positions:
+            del self.postings[word]
+            del self.sorted_words[bisect_left(self.sorted_words, word)]
+
+
+    def set(self, position, name):
+        """
+        Re-index one position if its name changed.
+        Arguments:
+            position(int): position to index, at most one past the last one
+            name(str): the name now at that position
+        Returns:
+            bool: True if the position was re-indexed
+        """
+        if position < len(self.names):
+            if self.names[position] == name:
+                return False
+            for word in self.words[position]:
+                self.remove_word(word, position)
+        words = tokenize(name)
+        for word in words:
+            self.add_word(word, position)
+        if position < len(self.names):
+            self.names[position], self.words[position] = name, words
+        else:
+            self.names.append(name)
+            self.words.append(words)
+        self.last_query = None #cached results may point at old names
+        return True
+
+
+    def update(self, names):
+        """
+        Re-index the positions whose name differs from the indexed one.
+        Arguments:
+            names(list): the catalog list as it is now
+        Returns:
+            int: number of positions re-indexed
+        """
+        changed = sum(self.set(position, name) for position, name in enumerate(names))
+        for position in range(len(names), len(self.names)):
+            for word in self.words[position]:
+                self.remove_word(word, position)
+            changed += 1
+        del self.names[len(names):], self.words[len(names):]
+
+        if changed:
+            self.last_query = None
+        return changed
+
+
+    def prefix_matches(self, prefix):
+        """Return the positions of every name with a word starting with prefix"""
+        start = bisect_left(self.sorted_words, prefix)
+        matches = set()
+        for word in self.sorted_words[start:]:
+            if not word.startswith(prefix):
+                break
+            matches |= self.postings[word]
+        return matches
+
+
+    def search(self, query):
+        """
+        Return the positions of the names matching a query, in catalog order.
+        Arguments:
+            query(str): text typed in a filter box (blank matches everything)
+        Returns:
+            list: matching positions
+        """
+        words = tokenize(query)
+        if not words:
+            return list(range(len(self.names)))
+
+        last = self.last_query
+        if last is not None and len(words) >= len(last) and all(
+                word.startswith(previous) for word, previous in zip(words, last)):
+            #the query only grew, so only the last results can still match, checked for the changed words
+            results = self.last_results
+            for index, word in enumerate(words):
+                if index >= len(last) or word != last[index]:
+                    matches = self.prefix_matches(word)
+                    results = [position for position in results if position in matches]
+        else:
+            #start from the rarest word's positions and narrow with the others
+            candidates = sorted((self.prefix_matches(word) for word in words), key=len)
+            matches = set.intersection(*candidates)
+            results = sorted(matches)
+
+        self.last_query, self.last_results = words, results
+        return results
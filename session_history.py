@@ -0,0 +1,424 @@
+"""
+Compact session history for the Star Points Token Economy.
+
+SessionHistory keeps one row per scored session (the sequence number,
+time, self-grade, bonus, points and a bitmask of the tasks checked) as a
+struct of typed arrays, so a row costs a few dozen bytes instead of a dict
+of Python objects. Task names are kept once in a vocabulary and each row
+stores a bitmask over it, one 64-bit word per 64 names.
+
+Rows from months older than ARCHIVE_AFTER_MONTHS are moved out of the live
+arrays into one zlib-compressed block per month. Scans decompress only the
+months they cover, keeping the last few blocks decompressed, so a child's
+multi-year history stays in a few hundred KB and every scan walks plain
+arrays. Rows are read through SessionView, a __slots__ view holding only
+a block and a row number.
+
+Each archived month also keeps a summary (the tasks checked and the hours
+of the day with a session) so a search for one task or time of day skips
+the months that can't match without decompressing them.
+
+Like the stats, the history is folded in from the ledger and saved as a
+snapshot with the sequence number of the last record it covers.
+"""
+import base64 #Import base64 to keep the blocks in JSON-only backends
+import datetime #Import datetime to group rows by month
+import sys #Import sys to keep the block format little-endian on any machine
+import zlib #Import zlib to compress archived months
+from array import array #Import array for the typed columns
+
+#storage key the history snapshot is kept under for each client
+HISTORY_KEY = "session_history"
+
+#months kept in the live arrays, counting the current one; older months are archived
+ARCHIVE_AFTER_MONTHS = 3
+
+#archived months kept decompressed for repeated scans
+DECOMPRESSED_BLOCKS = 4
+
+#session columns and their array type codes (the task bitmask column is added per block)
+SESSION_COLUMNS = {"seq": "I", "ts": "d", "self_grade": "f", "bonus": "d", "points": "d", "undone": "B"}
+
+#type code of the task bitmask words
+MASK_CODE = "Q"
+
+
+def month_key(ts):
+    """Return the month a timestamp falls in, e.g. "2025-03" """
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m")
+
+
+def archive_cutoff(today=None, months=ARCHIVE_AFTER_MONTHS):
+    """Return the first month kept live, e.g. "2025-01" when today is in March and months is 3"""
+    today = today or datetime.date.today()
+    index = today.year * 12 + today.month - 1 - (months - 1)
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+class Block:
+    """
+    Block is one run of session rows stored column by column.
+    """
+    __slots__ = ("columns", "words")
+
+    def __init__(self, words=1):
+        """
+        Arguments:
+            words(int): bitmask words per row
+        """
+        self.columns = {name: array(code) for name, code in SESSION_COLUMNS.items()}
+        self.columns["tasks"] = array(MASK_CODE)
+        self.words = words
+
+
+    def __len__(self):
+        return len(self.columns["seq"])
+
+
+    def append(self, seq, ts, self_grade, bonus, points, mask):
+        """Add a row, mask being an int over the vocabulary"""
+        for name, value in (("seq", seq), ("ts", ts), ("self_grade", self_grade),
+                            ("bonus", bonus), ("points", points), ("undone", 0)):
+            self.columns[name].append(value)
+        self.columns["tasks"].extend((mask >> (64 * word)) & 0xFFFFFFFFFFFFFFFF for word in range(self.words))
+
+
+    def mask(self, row):
+        """Return a row's task bitmask as an int"""
+        words = self.columns["tasks"][row * self.words:(row + 1) * self.words]
+        return sum(word << (64 * index) for index, word in enumerate(words))
+
+
+    def widen(self, words):
+        """Give every row more bitmask words, once the vocabulary outgrows the current width"""
+        if words <= self.words:
+            return
+        old, self.columns["tasks"] = self.columns["tasks"], array(MASK_CODE)
+        for row in range(len(self)):
+            self.columns["tasks"].extend(old[row * self.words:(row + 1) * self.words])
+            self.columns["tasks"].extend([0] * (words - self.words))
+        self.words = words
+
+
+    def select(self, rows):
+        """Return a new block holding the given rows in the given order"""
+        block = Block(self.words)
+        for name, column in block.columns.items():
+            source = self.columns[name]
+            if name == "tasks":
+                for row in rows:
+                    column.extend(source[row * self.words:(row + 1) * self.words])
+            else:
+                column.extend(source[row] for row in rows)
+        return block
+
+
+    def to_bytes(self):
+        """Return the block as compressed little-endian bytes"""
+        parts = [array("I", [len(self), self.words])]
+        parts += [self.columns[name] for name in list(SESSION_COLUMNS) + ["tasks"]]
+        if sys.byteorder == "big":
+            parts = [array(part.typecode, part) for part in parts]
+            for part in parts:
+                part.byteswap()
+        return zlib.compress(b"".join(part.tobytes() for part in parts), 9)
+
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Rebuild a block written by to_bytes"""
+        raw = zlib.decompress(data)
+        header = array("I")
+        header.frombytes(raw[:header.itemsize * 2])
+        if sys.byteorder == "big":
+            header.byteswap()
+        rows, words = header
+        block = cls(words)
+        offset = header.itemsize * 2
+        for name in list(SESSION_COLUMNS) + ["tasks"]:
+            column = block.columns[name]
+            count = rows * words if name == "tasks" else rows
+            column.frombytes(raw[offset:offset + count * column.itemsize])
+            if sys.byteorder == "big":
+                column.byteswap()
+            offset += count * column.itemsize
+        return block
+
+
+class SessionView:
+    """
+    SessionView reads one session row in place, without copying it out of its block.
+    """
+    __slots__ = ("history", "block", "row")
+
+    def __init__(self, history, block, row):
+        self.history = history
+        self.block = block
+        self.row = row
+
+    @property
+    def seq(self):
+        return self.block.columns["seq"][self.row]
+
+    @property
+    def ts(self):
+        return self.block.columns["ts"][self.row]
+
+    @property
+    def self_grade(self):
+        return self.block.columns["self_grade"][self.row]
+
+    @property
+    def bonus(self):
+        return self.block.columns["bonus"][self.row]
+
+    @property
+    def points(self):
+        return self.block.columns["points"][self.row]
+
+    @property
+    def undone(self):
+        return bool(self.block.columns["undone"][self.row])
+
+    @property
+    def task_mask(self):
+        return self.block.mask(self.row)
+
+    @property
+    def tasks(self):
+        """Names of the tasks checked in the session"""
+        mask = self.task_mask
+        return [name for index, name in enumerate(self.history.vocabulary) if mask >> index & 1]
+
+
+class SessionHistory:
+    """
+    SessionHistory holds every scored session as live typed arrays plus compressed archived months.
+    """
+
+    def __init__(self):
+        self.sequence = 0 #sequence number of the last ledger record folded in
+        self.vocabulary = [] #task names, bit i of a mask is vocabulary[i]
+        self.task_bits = {} #task name -> bit
+        self.live = Block()
+        self.archive = {} #month -> compressed block bytes
+        self.decompressed = {} #month -> Block, the most recently scanned archived months
+        self.summaries = {} #month -> (task mask, hour mask) of an archived month
+
+
+    def __len__(self):
+        return len(self.live) + sum(len(self.archived_block(month)) for month in self.archive)
+
+
+    def words(self):
+        """Return the bitmask words needed for the current vocabulary"""
+        return max(1, (len(self.vocabulary) + 63) // 64)
+
+
+    def task_mask(self, tasks):
+        """Return the bitmask of a list of task names, adding new names to the vocabulary"""
+        mask = 0
+        for task in tasks:
+            if task not in self.task_bits:
+                self.task_bits[task] = len(self.vocabulary)
+                self.vocabulary.append(task)
+            mask |= 1 << self.task_bits[task]
+        self.live.widen(self.words())
+        return mask
+
+
+    def add(self, record):
+        """
+        Fold a ledger record in: awards become rows, an undo marks its award's row
+        and a rescore changes its session's points.
+        Arguments:
+            record(dict): ledger record
+        """
+        self.sequence = record.get("seq", self.sequence + 1)
+        if record["kind"] == "award":
+            mask = self.task_mask(record.get("tasks") or [])
+            self.live.append(self.sequence, record["ts"], record.get("self_grade") or 0,
+                             record.get("bonus") or 0, record["amount"], mask)
+        elif record["kind"] == "undo_award" and "undone_ts" in record:
+            self.update_session(record["undone_ts"], "undone", lambda undone: 1)
+        elif record["kind"] == "rescore" and "rescored_ts" in record:
+            self.update_session(record["rescored_ts"], "points", lambda points: points + record["amount"])
+
+
+    def find(self, ts):
+        """
+        Return the newest session stamped ts that isn't undone, live rows first.
+        Returns:
+            SessionView: the session, or None if there is none
+        """
+        month = month_key(ts)
+        blocks = [self.live] + ([self.archived_block(month)] if month in self.archive else [])
+        for block in blocks:
+            stamps, undone = block.columns["ts"], block.columns["undone"]
+            for row in range(len(block) - 1, -1, -1):
+                if stamps[row] == ts and not undone[row]:
+                    return SessionView(self, block, row)
+        return None
+
+
+    def update_session(self, ts, column, change):
+        """
+        Change one column of the newest session stamped ts that isn't undone.
+        Arguments:
+            ts(float): the session's timestamp
+            column(str): column to change
+            change(callable): returns the new value given the old one
+        """
+        session = self.find(ts)
+        if session is None:
+            return
+        values = session.block.columns[column]
+        values[session.row] = change(values[session.row])
+        if session.block is not self.live:
+            self.archive[month_key(ts)] = session.block.to_bytes()
+
+
+    def archived_block(self, month):
+        """Return an archived month decompressed, keeping the last few decompressed"""
+        block = self.decompressed.pop(month, None)
+        if block is None:
+            block = Block.from_bytes(self.archive[month])
+            while len(self.decompressed) >= DECOMPRESSED_BLOCKS:
+                del self.decompressed[next(iter(self.decompressed))]
+        self.decompressed[month] = block #most recently used last
+        return block
+
+
+    def archive_old(self, cutoff=None):
+        """
+        Move live rows from months before the cutoff into compressed monthly blocks.
+        Arguments:
+            cutoff(str): first month kept live (defaults to archive_cutoff())
+        Returns:
+            int: rows archived
+        """
+        cutoff = cutoff or archive_cutoff()
+        stamps = self.live.columns["ts"]
+        months = {}
+        keep = []
+        for row in range(len(self.live)):
+            month = month_key(stamps[row])
+            if month < cutoff:
+                months.setdefault(month, []).append(row)
+            else:
+                keep.append(row)
+        if not months:
+            return 0
+
+        for month, rows in months.items():
+            rows.sort(key=lambda row: stamps[row])
+            block = self.live.select(rows)
+            if month in self.archive:
+                #late rows for a month already archived (an import) are merged in time order
+                old = self.archived_block(month)
+                block.widen(old.words)
+                old.widen(block.words)
+                merged = Block(block.words)
+                for source in (old, block):
+                    for name, column in merged.columns.items():
+                        column.extend(source.columns[name])
+                order = sorted(range(len(merged)), key=lambda row: merged.columns["ts"][row])
+                block = merged.select(order)
+            self.archive[month] = block.to_bytes()
+            self.summaries[month] = self.summarize(block)
+            self.decompressed.pop(month, None)
+        self.live = self.live.select(keep)
+        return sum(len(rows) for rows in months.values())
+
+
+    @staticmethod
+    def summarize(block):
+        """Return the (task mask, hour mask) of every session in a block"""
+        tasks = hours = 0
+        for row, ts in enumerate(block.columns["ts"]):
+            tasks |= block.mask(row)
+            hours |= 1 << datetime.datetime.fromtimestamp(ts).hour
+        return tasks, hours
+
+
+    def months_matching(self, task_bits=0, hour_bits=0):
+        """
+        Return the months that may hold a session with one of the tasks or in one of the hours.
+        Archived months are ruled out from their summaries without being decompressed.
+        Arguments:
+            task_bits(int): mask of task bits to look for
+            hour_bits(int): mask of hours of the day (bit 0 is midnight) to look for
+        """
+        months = set()
+        for month in self.archive:
+            if month not in self.summaries:
+                self.summaries[month] = self.summarize(self.archived_block(month))
+            tasks, hours = self.summaries[month]
+            if tasks & task_bits or hours & hour_bits:
+                months.add(month)
+        #the live rows are only a few months, their months are always checked
+        months.update(month_key(ts) for ts in self.live.columns["ts"])
+        return sorted(months)
+
+
+    def month_sessions(self, month):
+        """Generator over every session in one month, archived rows then live rows"""
+        if month in self.archive:
+            block = self.archived_block(month)
+            for row in range(len(block)):
+                yield SessionView(self, block, row)
+        for row, ts in enumerate(self.live.columns["ts"]):
+            if month_key(ts) == month:
+                yield SessionView(self, self.live, row)
+
+
+    def scan(self, start=None, end=None):
+        """
+        Generator over the sessions between two moments, archived months first, then live rows.
+        Arguments:
+            start(float): first timestamp included (None for the beginning)
+            end(float): timestamps before this are included (None for no limit)
+        Yields:
+            SessionView: each session, undone ones included (check view.undone)
+        """
+        first = month_key(start) if start is not None else None
+        last = month_key(end) if end is not None else None
+        blocks = [self.archived_block(month) for month in sorted(self.archive)
+                  if (first is None or month >= first) and (last is None or month <= last)]
+        for block in blocks + [self.live]:
+            stamps = block.columns["ts"]
+            for row in range(len(block)):
+                if (start is None or stamps[row] >= start) and (end is None or stamps[row] < end):
+                    yield SessionView(self, block, row)
+
+
+    def nbytes(self):
+        """Return the bytes held by the live arrays and the archived blocks"""
+        live = sum(column.itemsize * len(column) for column in self.live.columns.values())
+        return live + sum(len(data) for data in self.archive.values())
+
+
+    def to_dict(self):
+        """Return the history as plain data for the storage backend"""
+        return {
+            "sequence": self.sequence,
+            "vocabulary": list(self.vocabulary),
+            "live": base64.b64encode(self.live.to_bytes()).decode("ascii"),
+            "archive": {month: base64.b64encode(data).decode("ascii") for month, data in self.archive.items()},
+            "summaries": {month: list(summary) for month, summary in self.summaries.items()},
+        }
+
+
+    @classmethod
+    def from_dict(cls, data):
+        """Load a saved history, or start an empty one if nothing was saved"""
+        history = cls()
+        if data:
+            history.sequence = data["sequence"]
+            history.vocabulary = list(data["vocabulary"])
+            history.task_bits = {task: bit for bit, task in enumerate(history.vocabulary)}
+            history.live = Block.from_bytes(base64.b64decode(data["live"]))
+            history.archive = {month: base64.b64decode(text) for month, text in data["archive"].items()}
+            #snapshots from before summaries existed have them rebuilt when first needed
+            history.summaries = {month: tuple(summary) for month, summary in data.get("summaries", {}).items()}
+        return history
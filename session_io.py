@@ -0,0 +1,329 @@
+"""
+Streaming import and export of session history for the Star Points Token Economy.
+
+Rows flow through a generator pipeline (read -> validate -> batch -> write),
+so memory stays constant however large the file is. Award rows are checked
+with the same rules as WidgetCreator.enter_data, errors are reported per row,
+and valid rows are written to each client's ledger in batched commits.
+
+CSV and JSONL files use these columns (all but self_grade optional):
+    client, date or ts, kind, self_grade, bonus, tasks, checked_tasks, reward, cost
+
+Usage:
+    python session_io.py import sessions.csv --database star_points.db
+    python session_io.py export history.jsonl --database star_points.db --client alice
+"""
+import argparse #Import argparse for the import/export commands
+import csv #Import csv to read and write spreadsheets
+import json #Import json to read and write JSON lines
+import math #Import math to reject nan and infinite values
+import sys #Import sys to report row errors on stderr
+from datetime import datetime #Import datetime to convert dates to timestamps
+from itertools import islice #Import islice to cut the stream into batches
+
+from crdt import IMPORT_DEVICE, count_records, new_device_id #Import the counter update for imported records
+from ledger import RECORD_SIGNS #Import the sign each record kind applies to the balance
+from scoring import ScoringError, parse_checked_tasks, score_entry #Import the scoring rules
+from statefile import StateFileBackend #Import the state file backend
+from storage import DEFAULT_CLIENT, SQLiteBackend #Import the storage backends
+
+#columns written by export, in order
+EXPORT_COLUMNS = ["client", "seq", "date", "kind", "amount", "self_grade", "bonus", "tasks", "reward"]
+
+#separator between task names inside the tasks column
+TASK_SEPARATOR = ";"
+
+
+class RowError:
+    """
+    A row that failed validation, kept with its line number for the report.
+    """
+    __slots__ = ("line", "message")
+
+    def __init__(self, line, message):
+        """
+        Arguments:
+            line(int): line number in the source file
+            message(str): reason the row was rejected
+        """
+        self.line = line
+        self.message = message
+
+    def __str__(self):
+        return f"line {self.line}: {self.message}"
+
+
+def detect_format(path, file_format=None):
+    """Return "csv" or "jsonl" from an explicit format or the file extension"""
+    if file_format:
+        return file_format
+    return "jsonl" if path.lower().endswith((".jsonl", ".json", ".ndjson")) else "csv"
+
+
+def read_rows(path, file_format=None):
+    """
+    Generator yielding each row of a CSV or JSONL file as a dict.
+    Arguments:
+        path(str): file to read
+        file_format(str): "csv" or "jsonl" (detected from the extension if omitted)
+    Yields:
+        tuple: (line number, row dict or None if the line could not be parsed)
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if detect_format(path, file_format) == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError:
+                    yield line_number, None
+
+
+def parse_finite(value, name):
+    """
+    Convert a number from a row, refusing nan and infinity (which float() accepts).
+    Arguments:
+        value(str or float): raw value
+        name(str): what the value is, for the error message
+    Returns:
+        float: the number
+    Raises:
+        ScoringError: if the value is nan or infinite
+    """
+    number = float(value)
+    if not math.isfinite(number):
+        raise ScoringError(f"{name} must be a finite number.")
+    return number
+
+
+def parse_timestamp(row):
+    """
+    Read the session time from a row's "ts" (epoch seconds) or "date" (ISO) column.
+    Returns:
+        float or None: the timestamp, or None to use the import time
+    """
+    value = row.get("ts")
+    if value not in (None, ""):
+        return parse_finite(value, "Timestamp")
+    value = row.get("date")
+    if value not in (None, ""):
+        return datetime.fromisoformat(str(value).strip()).timestamp()
+    return None
+
+
+def validate_rows(rows, default_client=DEFAULT_CLIENT, balance_of=None):
+    """
+    Generator turning raw rows into ledger records, validated like enter_data.
+    Redemptions are refused, as redeem_reward does, unless the balance covers them.
+    Arguments:
+        rows(iterable): (line number, row dict) pairs from read_rows
+        default_client(str): client id for rows without a client column
+        balance_of(callable): returns a client's balance before the import
+            (defaults to every client starting at 0)
+    Yields:
+        tuple: (client id, ledger record dict) for valid rows, or a RowError
+    """
+    balances = {} #client id -> balance including the rows accepted so far
+    for line, row in rows:
+        if not isinstance(row, dict):
+            yield RowError(line, "row is not a valid record")
+            continue
+        try:
+            client = str(row.get("client") or default_client).strip()
+            kind = str(row.get("kind") or "award").strip().lower()
+
+            record = {"kind": kind}
+            timestamp = parse_timestamp(row)
+            if timestamp is not None:
+                record["ts"] = timestamp
+
+            if client not in balances:
+                balances[client] = balance_of(client) if balance_of is not None else 0
+
+            if kind == "award":
+                tasks = row.get("tasks") or []
+                if isinstance(tasks, str):
+                    tasks = [task.strip() for task in tasks.split(TASK_SEPARATOR) if task.strip()]
+                checked_tasks = row.get("checked_tasks")
+                checked_tasks = len(tasks) if checked_tasks in (None, "") else parse_checked_tasks(
+                    checked_tasks, len(tasks))
+
+                #same validation and scoring as the self-grade, bonus points and checklist fields
+                points, self_grade, bonus_points, _ = score_entry(
+                    row.get("self_grade", ""), row.get("bonus", ""), [True] * checked_tasks
+                    )
+                record.update(amount=points, self_grade=self_grade, bonus=bonus_points, tasks=tasks)
+            elif kind == "redeem":
+                cost = parse_finite(row.get("cost") or row.get("amount"), "Reward cost")
+                if cost < 0:
+                    raise ScoringError("Reward cost cannot be negative.")
+                if cost > balances[client]:
+                    raise ScoringError(f"Not enough points to redeem this reward ({balances[client]:g} available).")
+                record.update(amount=cost, reward=str(row.get("reward") or ""))
+            else:
+                raise ScoringError(f"Unknown kind {kind!r}, expected award or redeem.")
+
+        except ScoringError as e:
+            yield RowError(line, str(e))
+        except (TypeError, ValueError) as e:
+            yield RowError(line, f"invalid value ({e})")
+        else:
+            balances[client] += RECORD_SIGNS[kind] * record["amount"]
+            yield client, record
+
+
+def batched(items, size):
+    """
+    Generator cutting a stream into lists of at most size items.
+    Arguments:
+        items(iterable): stream to cut
+        size(int): maximum batch length
+    """
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_sessions(path, backend, default_client=DEFAULT_CLIENT, batch_size=500,
+                    file_format=None, on_error=None):
+    """
+    Stream a CSV or JSONL file of sessions into the backend.
+    Arguments:
+        path(str): file to import
+        backend(StorageBackend): storage to write into
+        default_client(str): client id for rows without a client column
+        batch_size(int): rows per committed batch
+        file_format(str): "csv" or "jsonl" (detected from the extension if omitted)
+        on_error(callable): called with each RowError (defaults to printing on stderr)
+    Returns:
+        tuple: (rows imported, rows rejected)
+    """
+    if on_error is None:
+        on_error = lambda error: print(error, file=sys.stderr)
+
+    ledgers = {} #open ledgers by client id, reused across batches
+    device_id = new_device_id(IMPORT_DEVICE) #this run's own counter entry
+
+    def balance_of(client):
+        """Open a client's ledger and return its balance before the import"""
+        if client not in ledgers:
+            ledgers[client] = backend.open_ledger(client)
+        return ledgers[client].balance
+
+    imported = rejected = 0
+    try:
+        rows = validate_rows(read_rows(path, file_format), default_client, balance_of)
+        for batch in batched(rows, batch_size):
+            #group the batch by client so each ledger gets one append
+            by_client = {}
+            for item in batch:
+                if isinstance(item, RowError):
+                    rejected += 1
+                    on_error(item)
+                else:
+                    by_client.setdefault(item[0], []).append(item[1])
+
+            #commit the whole batch at once
+            with backend.transaction():
+                for client, records in by_client.items():
+                    #validating the client's first row opened its ledger
+                    ledgers[client].append_many(records)
+                    count_records(backend, client, records, device_id)
+                    imported += len(records)
+    finally:
+        for ledger in ledgers.values():
+            ledger.close()
+    return imported, rejected
+
+
+def export_rows(backend, clients):
+    """
+    Generator yielding one flat dict per ledger record for the given clients.
+    Arguments:
+        backend(StorageBackend): storage to read from
+        clients(list): client ids to export
+    """
+    for client in clients:
+        ledger = backend.open_ledger(client)
+        try:
+            for record in ledger.history():
+                tasks = record.get("tasks", "")
+                yield {
+                    "client": client,
+                    "seq": record["seq"],
+                    "date": datetime.fromtimestamp(record["ts"]).isoformat(timespec="seconds"),
+                    "kind": record["kind"],
+                    "amount": record["amount"],
+                    "self_grade": record.get("self_grade", ""),
+                    "bonus": record.get("bonus", ""),
+                    "tasks": TASK_SEPARATOR.join(tasks) if isinstance(tasks, list) else tasks,
+                    "reward": record.get("reward", ""),
+                }
+        finally:
+            ledger.close()
+
+
+def export_sessions(path, backend, clients=None, file_format=None):
+    """
+    Stream the history of one or more clients out to a CSV or JSONL file.
+    Arguments:
+        path(str): file to write
+        backend(StorageBackend): storage to read from
+        clients(list): client ids to export (defaults to every client)
+        file_format(str): "csv" or "jsonl" (detected from the extension if omitted)
+    Returns:
+        int: number of rows written
+    """
+    clients = clients or backend.clients()
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if detect_format(path, file_format) == "csv":
+            writer = csv.DictWriter(f, fieldnames=EXPORT_COLUMNS)
+            writer.writeheader()
+            for row in export_rows(backend, clients):
+                writer.writerow(row)
+                written += 1
+        else:
+            for row in export_rows(backend, clients):
+                f.write(json.dumps(row) + "\n")
+                written += 1
+    return written
+
+
+def main():
+    """Command line entry point for importing and exporting session history"""
+    parser = argparse.ArgumentParser(description="Import or export Star Points session history.")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path", help="CSV or JSONL file to read or write")
+    parser.add_argument("--database", help="SQLite database (default: the state file in --data-dir)")
+    parser.add_argument("--data-dir", default=".", help="folder holding the state file")
+    parser.add_argument("--client", action="append", help="client id (import: default for rows without one, export: repeat to select)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="file format (default: from extension)")
+    parser.add_argument("--batch-size", type=int, default=500, help="rows per committed batch")
+    args = parser.parse_args()
+
+    backend = SQLiteBackend(args.database) if args.database else StateFileBackend(args.data_dir)
+    try:
+        if args.command == "import":
+            default_client = args.client[0] if args.client else DEFAULT_CLIENT
+            imported, rejected = import_sessions(
+                args.path, backend, default_client, args.batch_size, args.format
+                )
+            print(f"Imported {imported} rows, rejected {rejected}")
+        else:
+            written = export_sessions(args.path, backend, args.client, args.format)
+            print(f"Exported {written} rows to {args.path}")
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Startup timing for the Star Points Token Economy.
+
+StartupTimer records how long each launch phase takes (loading data,
+building widgets, first paint, lazy image loading) so slow kiosks can show
+where their launch time goes. Run the app with --timing to print the report.
+"""
+import time #Import time for the high resolution clock
+from contextlib import contextmanager #Import contextmanager for timed phases
+
+
+class StartupTimer:
+    """
+    StartupTimer keeps an ordered list of named phases and their durations.
+    """
+
+    def __init__(self):
+        """Start the clock; every phase is reported relative to this moment"""
+        self.start = time.perf_counter()
+        self.phases = [] #(name, started at, duration) in the order they finished
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Context manager timing the code inside it as one named phase.
+        Arguments:
+            name(str): phase name shown in the report
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, started - self.start, time.perf_counter() - started))
+
+    def mark(self, name):
+        """
+        Record a moment (such as first paint) as a zero length phase.
+        Arguments:
+            name(str): name shown in the report
+        """
+        self.phases.append((name, time.perf_counter() - self.start, 0.0))
+
+    def total(self):
+        """Return the seconds from the start of the clock to the end of the last phase"""
+        return max((started + duration for _, started, duration in self.phases), default=0.0)
+
+    def report(self):
+        """
+        Build the timing report.
+        Returns:
+            str: one line per phase with its start offset and duration in milliseconds
+        """
+        lines = ["Startup timing (ms)", f"{'phase':<24}{'at':>10}{'took':>10}"]
+        for name, started, duration in self.phases:
+            lines.append(f"{name:<24}{started * 1000:>10.1f}{duration * 1000:>10.1f}")
+        lines.append(f"{'total':<24}{self.total() * 1000:>10.1f}")
+        return "\n".join(lines)
@@ -0,0 +1,650 @@
+"""
+Versioned binary state file for the Star Points Token Economy.
+
+Replaces the folder of pickle files with one container file:
+
+    header         magic, format version, section count, section table offset
+    sections       one per stored value or history column, 8-byte aligned
+    section table  name, kind, column type, offset, length and crc32 of each section
+
+Values are stored as JSON, so loading never runs code from the file and
+doesn't depend on Python object layouts. Points history is packed into
+fixed-width columns (sequence, time, kind, amount) plus a details blob,
+so the whole history can be scanned without decoding a record at a time.
+
+The file is memory-mapped and only the header and section table are read
+at open; a section is checksummed and decoded the first time it is asked
+for, and history columns are handed out as zero-copy memoryviews. Writes
+build a new file next to the old one and atomically replace it, so a crash
+never leaves a half-written state file.
+
+Values saved on nearly every award (the balance counter and the undo log)
+are kept out of the state file, in a small append-only journal per client,
+so an award costs one append however large the state file has grown.
+
+Run this file directly to convert a legacy pickle folder:
+    python statefile.py --source . --state star_points.state
+"""
+import argparse #Import argparse for the migration command line
+import bisect #Import bisect to find the first history record after a sequence number
+import json #Import json to encode stored values
+import mmap #Import mmap to read sections without copying them
+import os #Import os for fsync and atomic file replacement
+import pickle #Import pickle to read the legacy files once during migration
+import struct #Import struct to pack the header and section table
+import threading #Import threading to share the file between the Tk and writer threads
+import zlib #Import zlib for the section checksums
+from array import array #Import array to pack history columns
+from contextlib import contextmanager #Import contextmanager for batched writes and column access
+
+from crdt import COUNTER_KEY #Import the balance counter's key, kept in the journal
+from ledger import RECORD_HEADER, PointsLedger, records_after #Import the append-only ledger and its record framing
+from storage import PickleBackend, StorageBackend #Import the backend base and legacy layout
+from undo import UNDO_CHECKPOINTS_KEY, UNDO_EVENTS_KEY, UNDO_KEY, apply_changes #Import the undo log's keys, kept in the journal
+
+#file name of the state file in the data folder
+STATE_FILE = "star_points.state"
+
+#first bytes of every state file
+MAGIC = b"SPSTATE\0"
+
+#current format version, readers refuse files written by a newer version
+FORMAT_VERSION = 1
+
+#header: magic, version, flags, section count, table offset, table crc32, reserved
+HEADER = struct.Struct("<8sHHIQII")
+
+#section table entry: name, kind, column type code, reserved, offset, length, crc32
+SECTION = struct.Struct("<64sBcHQQI")
+
+#section kinds
+KIND_JSON = 0
+KIND_COLUMN = 1
+KIND_BLOB = 2
+
+#history columns and their array type codes (all little-endian, fixed width)
+HISTORY_COLUMNS = {"seq": "I", "ts": "d", "kind": "B", "amount": "d", "details_end": "Q"}
+
+#key of the ledger position (sequence, byte offset) the packed columns reach, where ledger reads resume
+HISTORY_POSITION_KEY = "history.position"
+
+#ledger record kinds stored as one byte in the kind column (new kinds go at the end)
+RECORD_KINDS = ["opening", "award", "redeem", "undo_award", "undo_redeem", "rescore"]
+
+#values saved on nearly every award, kept in each client's journal instead of the state file
+JOURNAL_KEYS = (COUNTER_KEY, UNDO_KEY, UNDO_EVENTS_KEY, UNDO_CHECKPOINTS_KEY)
+
+#ending added to a key for a journal record holding a list's changed positions
+CHANGES_SUFFIX = "+"
+
+#file name of a client's journal, kept in the same folder as its ledger
+JOURNAL_FILE = "values.journal"
+
+#a journal is rewritten with only its latest values once it is this many times their size
+JOURNAL_SLACK = 4
+
+#journals smaller than this are never rewritten
+JOURNAL_MIN_COMPACT = 64 * 1024
+
+
+class StateFormatError(ValueError):
+    """Raised when a state file is damaged or written by a newer format version"""
+
+
+def section_name(client_id, key):
+    """Return the section name a client's value is stored under, e.g. "default/tasks" """
+    return f"{client_id}/{key}"
+
+
+def write_state(path, sections):
+    """
+    Write a new state file atomically.
+    Arguments:
+        path(str): file to write
+        sections(list): (name, kind, type code, data) tuples, data being any bytes-like object
+    """
+    temp_path = path + ".tmp"
+    table = []
+    with open(temp_path, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        for name, kind, typecode, data in sections:
+            #align every section so columns can be cast in place
+            f.write(b"\0" * (-f.tell() % 8))
+            offset = f.tell()
+            f.write(data)
+            table.append(SECTION.pack(
+                name.encode("utf-8"), kind, typecode.encode("ascii"), 0, offset, len(data), zlib.crc32(data)
+                ))
+
+        f.write(b"\0" * (-f.tell() % 8))
+        table_offset = f.tell()
+        table_bytes = b"".join(table)
+        f.write(table_bytes)
+        f.seek(0)
+        f.write(HEADER.pack(
+            MAGIC, FORMAT_VERSION, 0, len(table), table_offset, zlib.crc32(table_bytes), 0
+            ))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+class StateFile:
+    """
+    StateFile is a read-only, memory-mapped view of a state file.
+    Sections are located from the table at open and only checked and decoded when asked for.
+    """
+
+    def __init__(self, path):
+        """
+        Arguments:
+            path(str): state file to open (a missing file opens as empty)
+        """
+        self.path = path
+        self.sections = {} #name -> (kind, type code, offset, length, crc32)
+        self.verified = set() #names of sections whose checksum has been checked
+        self._file = None
+        self._map = None
+
+        if not os.path.exists(path):
+            return
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) < HEADER.size:
+            raise StateFormatError(f"{path} is too short to be a state file")
+        magic, version, _, count, table_offset, table_crc, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise StateFormatError(f"{path} is not a state file")
+        if version > FORMAT_VERSION:
+            raise StateFormatError(f"{path} was written by a newer version (format {version})")
+
+        table_end = table_offset + count * SECTION.size
+        if table_end > len(self._map) or zlib.crc32(self._map[table_offset:table_end]) != table_crc:
+            raise StateFormatError(f"{path} has a damaged section table")
+        for name, kind, typecode, _, offset, length, crc in SECTION.iter_unpack(self._map[table_offset:table_end]):
+            self.sections[name.rstrip(b"\0").decode("utf-8")] = (kind, typecode.decode("ascii"), offset, length, crc)
+
+
+    def section(self, name):
+        """
+        Return a zero-copy view of one section, checking its checksum the first time.
+        The caller must release the view (or use it in a with block) before the file is closed.
+        Arguments:
+            name(str): section name
+        Returns:
+            memoryview: the section's bytes, cast to its column type for column sections
+        """
+        kind, typecode, offset, length, crc = self.sections[name]
+        view = memoryview(self._map)[offset:offset + length]
+        if name not in self.verified:
+            if zlib.crc32(view) != crc:
+                view.release()
+                raise StateFormatError(f"Section {name} of {self.path} is damaged")
+            self.verified.add(name)
+        if kind == KIND_COLUMN:
+            return view.cast(typecode)
+        return view
+
+
+    def value(self, name, default=None):
+        """
+        Decode a JSON section.
+        Arguments:
+            name(str): section name
+            default(any): value to return if the section doesn't exist
+        """
+        if name not in self.sections:
+            return default
+        with self.section(name) as view:
+            return json.loads(str(view, "utf-8"))
+
+
+    def raw_sections(self):
+        """
+        Generator over every section as (name, kind, type code, view) without decoding,
+        used to copy unchanged sections into a rewritten file.
+        """
+        for name, (kind, typecode, offset, length, _) in self.sections.items():
+            with memoryview(self._map)[offset:offset + length] as view:
+                yield name, kind, typecode, view
+
+
+    def close(self):
+        """Unmap and close the file"""
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+
+
+def apply_journal_record(values, key, data):
+    """
+    Apply one journal record to a dict of values.
+    Arguments:
+        values(dict): key -> value, changed in place
+        key(str): record key, ending in CHANGES_SUFFIX for list changes
+        data(bytes): the encoded value, or the encoded [changes, length] of a list
+    Returns:
+        str: the key of the value that changed
+    """
+    if key.endswith(CHANGES_SUFFIX):
+        key = key[:-len(CHANGES_SUFFIX)]
+        changes, length = json.loads(data)
+        values[key] = apply_changes(values.get(key) or [], changes, length)
+    else:
+        values[key] = json.loads(data)
+    return key
+
+
+def encode_history(records, details_start=0):
+    """
+    Pack ledger records into history column data.
+    Arguments:
+        records(list): ledger record dicts
+        details_start(int): length of the details blob the new details are appended to
+    Returns:
+        dict: column name -> array, plus "details" -> bytes
+    """
+    columns = {name: array(typecode) for name, typecode in HISTORY_COLUMNS.items()}
+    details = bytearray()
+    for record in records:
+        columns["seq"].append(record["seq"])
+        columns["ts"].append(record["ts"])
+        columns["kind"].append(RECORD_KINDS.index(record["kind"]))
+        columns["amount"].append(record["amount"])
+        extra = {key: value for key, value in record.items() if key not in ("seq", "ts", "kind", "amount")}
+        details += json.dumps(extra).encode("utf-8") if extra else b""
+        columns["details_end"].append(details_start + len(details))
+    columns["details"] = bytes(details)
+    return columns
+
+
+class ValueJournal:
+    """
+    ValueJournal keeps one client's frequently saved values in an append-only file.
+    A record holds either a whole value or the changed positions of a stored list, and
+    replaying the records in order gives the latest values. Once the file has grown well
+    past those values it is rewritten with only them.
+    """
+
+    def __init__(self, path):
+        """
+        Replay the journal. A torn record at the end is ignored, and only cut off
+        by the first write, so opening a journal never writes to it.
+        Arguments:
+            path(str): journal file (a missing file opens as empty)
+        """
+        self.path = path
+        self.values = {} #key -> latest value
+        self.live = {} #key -> size of the key's last whole-value record
+        self.size = 0 #end of the last intact record
+        self._file = None #opened for appending by the first write
+
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        while self.size + RECORD_HEADER.size <= len(data):
+            length, checksum = RECORD_HEADER.unpack_from(data, self.size)
+            start = self.size + RECORD_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            key, value = payload.split(b"\n", 1)
+            self._apply(key.decode("utf-8"), value, len(payload))
+            self.size = start + length
+
+
+    def _apply(self, key, data, size):
+        """Apply one record to the latest values"""
+        if apply_journal_record(self.values, key, data) == key:
+            self.live[key] = size
+
+
+    def write(self, records):
+        """
+        Append records and sync them to disk.
+        Arguments:
+            records(list): (key, encoded data) pairs, keys ending in CHANGES_SUFFIX for list changes
+        """
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "ab")
+            #drop any partial record left behind by an interrupted write
+            self._file.truncate(self.size)
+        frames = []
+        for key, data in records:
+            frame = self._encode(key, data)
+            self._apply(key, data, len(frame) - RECORD_HEADER.size)
+            frames.append(frame)
+        frames = b"".join(frames)
+        self._file.write(frames)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.size += len(frames)
+
+        if self.size > max(JOURNAL_MIN_COMPACT, JOURNAL_SLACK * sum(self.live.values())):
+            self.compact()
+
+
+    def _encode(self, key, data):
+        """Frame one record as header + key line + data"""
+        payload = key.encode("utf-8") + b"\n" + data
+        return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+    def compact(self):
+        """Atomically rewrite the journal with one whole-value record per key"""
+        frames = [self._encode(key, json.dumps(value).encode("utf-8")) for key, value in self.values.items()]
+        self.live = {key: len(frame) - RECORD_HEADER.size for key, frame in zip(self.values, frames)}
+        frames = b"".join(frames)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(frames)
+            f.flush()
+            os.fsync(f.fileno())
+        self.close()
+        os.replace(temp_path, self.path)
+        self.size = len(frames)
+        self._file = open(self.path, "ab")
+
+
+    def close(self):
+        """Close the file if a write opened it"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class StateFileBackend(StorageBackend):
+    """
+    Backend keeping every value in one versioned state file, with points written to the
+    same per-client ledgers PickleBackend uses. Ledger history is packed into the file's
+    columns when the backend is closed. Values in JOURNAL_KEYS go to each client's journal.
+    """
+
+    def __init__(self, data_dir=".", filename=STATE_FILE, pack_on_close=True):
+        """
+        Open the state file, converting the legacy pickle files the first time.
+        Arguments:
+            data_dir(str): folder holding the state file and the ledgers
+            filename(str): name of the state file
+            pack_on_close(bool): pack new ledger records into the history columns on close
+                (turned off by readers that must not write, such as report workers)
+        """
+        self.data_dir = data_dir
+        self.pack_on_close = pack_on_close
+        self.path = os.path.join(data_dir, filename)
+        self.legacy = PickleBackend(data_dir) #the same folder layout, used for the ledgers
+        self.lock = threading.RLock() #guards the mapped file across threads
+        self.pending = {} #section name -> (kind, type code, data) waiting for the batch to end
+        self.pending_journal = {} #client id -> journal records waiting for the batch to end
+        self.journals = {} #client id -> ValueJournal, opened on first use
+        self.opened_ledgers = set() #clients whose history is packed on close
+        self._depth = 0 #nesting depth of transaction() blocks
+
+        if not os.path.exists(self.path) and legacy_files(data_dir):
+            migrate_pickles(data_dir, self.path)
+        self.state = StateFile(self.path)
+
+
+    @contextmanager
+    def transaction(self):
+        """
+        Context manager grouping every write inside it into one rewrite of the file.
+        Nested blocks join the outer batch.
+        """
+        with self.lock:
+            self._depth += 1
+            try:
+                yield self
+            finally:
+                self._depth -= 1
+            if self._depth == 0:
+                if self.pending:
+                    self._rewrite()
+                for client_id, records in self.pending_journal.items():
+                    self.journal(client_id).write(records)
+                self.pending_journal.clear()
+
+
+    def _rewrite(self):
+        """Write the pending sections and copy every other section over unchanged"""
+        sections = [(name, *section) for name, section in self.pending.items()]
+        for name, kind, typecode, view in self.state.raw_sections():
+            if name in self.pending:
+                continue
+            #older copies of values that have moved to a journal are dropped; only those
+            #keys are looked up, so a save never opens the other clients' journals
+            client_id, key = name.split("/", 1)
+            if key in JOURNAL_KEYS and key in self.journal(client_id).values:
+                continue
+            sections.append((name, kind, typecode, bytes(view)))
+        self.pending.clear()
+
+        #the old mapping must be closed before the file can be replaced on Windows
+        self.state.close()
+        write_state(self.path, sections)
+        self.state = StateFile(self.path)
+
+
+    def journal(self, client_id):
+        """Return a client's journal, reading it the first time"""
+        if client_id not in self.journals:
+            self.journals[client_id] = ValueJournal(os.path.join(self.legacy.client_dir(client_id), JOURNAL_FILE))
+        return self.journals[client_id]
+
+    def load(self, client_id, key, default):
+        name = section_name(client_id, key)
+        with self.lock:
+            if key in JOURNAL_KEYS:
+                journal = self.journal(client_id)
+                values = {key: journal.values[key]} if key in journal.values else {}
+                for record_key, data in self.pending_journal.get(client_id, []):
+                    if record_key in (key, key + CHANGES_SUFFIX):
+                        apply_journal_record(values, record_key, data)
+                if key in values:
+                    #a copy, so the caller can't change the journal's value
+                    return json.loads(json.dumps(values[key]))
+            if name in self.pending:
+                return json.loads(self.pending[name][2])
+            #values saved before the journal existed are still read from the state file
+            return self.state.value(name, default)
+
+    def save_many(self, client_id, items):
+        with self.transaction():
+            for key, value in items.items():
+                data = json.dumps(value).encode("utf-8")
+                if key in JOURNAL_KEYS:
+                    self.pending_journal.setdefault(client_id, []).append((key, data))
+                else:
+                    self.pending[section_name(client_id, key)] = (KIND_JSON, "\0", data)
+
+    def save_changes(self, client_id, key, changes, length):
+        if key not in JOURNAL_KEYS:
+            return super().save_changes(client_id, key, changes, length)
+        #journal lists get a record of just the changed positions
+        with self.transaction():
+            self.pending_journal.setdefault(client_id, []).append(
+                (key + CHANGES_SUFFIX, json.dumps([changes, length]).encode("utf-8"))
+                )
+
+    def open_ledger(self, client_id):
+        self.opened_ledgers.add(client_id)
+        os.makedirs(self.legacy.client_dir(client_id), exist_ok=True)
+        ledger = PointsLedger(self.ledger_path(client_id))
+
+        #carry over the balance from the older total_points value on first run
+        if ledger.sequence == 0:
+            legacy_points = self.load(client_id, "total_points", 0)
+            if legacy_points:
+                ledger.append("opening", legacy_points)
+        return ledger
+
+    def read_history(self, client_id, after=0):
+        #the packed columns first, then the ledger records appended since they were packed
+        last_seq = after
+        for record in self.history(client_id, after):
+            last_seq = record["seq"]
+            yield record
+        start = self.load(client_id, HISTORY_POSITION_KEY, None)
+        for record, _ in records_after(self.ledger_path(client_id), last_seq, start):
+            yield record
+
+    def ledger_path(self, client_id):
+        """Return the ledger file for a client (the same place PickleBackend keeps it, with the id checked)"""
+        return os.path.join(self.legacy.client_dir(client_id), "points.ledger")
+
+    def clients(self):
+        with self.lock:
+            names = set(self.state.sections) | set(self.pending)
+            clients = {name.split("/", 1)[0] for name in names} | set(self.pending_journal)
+        clients.update(client_id for client_id in self.legacy.clients()
+                       if os.path.exists(os.path.join(self.legacy.client_dir(client_id), JOURNAL_FILE)))
+        return sorted(clients)
+
+
+    @contextmanager
+    def history_columns(self, client_id):
+        """
+        Context manager giving zero-copy views of a client's packed history columns.
+        The views are released when the block ends.
+        Arguments:
+            client_id(str): client whose history is read
+        Yields:
+            dict: column name -> memoryview (empty if no history has been packed)
+        """
+        with self.lock:
+            names = [name for name in list(HISTORY_COLUMNS) + ["details"]
+                     if section_name(client_id, f"history.{name}") in self.state.sections]
+            columns = {name: self.state.section(section_name(client_id, f"history.{name}")) for name in names}
+            try:
+                yield columns
+            finally:
+                for view in columns.values():
+                    view.release()
+
+
+    def history(self, client_id, after=0):
+        """
+        Generator over a client's packed history records, oldest first.
+        Arguments:
+            client_id(str): client whose history is read
+            after(int): only yield records with a higher sequence number
+        Yields:
+            dict: each ledger record
+        """
+        with self.history_columns(client_id) as columns:
+            if not columns:
+                return
+            seqs, ends, details = columns["seq"], columns["details_end"], columns["details"]
+            for index in range(bisect.bisect_right(seqs, after), len(seqs)):
+                start = ends[index - 1] if index else 0
+                extra = json.loads(str(details[start:ends[index]], "utf-8")) if ends[index] > start else {}
+                yield dict(extra, seq=seqs[index], ts=columns["ts"][index],
+                           kind=RECORD_KINDS[columns["kind"][index]], amount=columns["amount"][index])
+
+
+    def pack_history(self, client_id):
+        """
+        Append a client's ledger records that aren't packed yet to its history columns.
+        Arguments:
+            client_id(str): client whose ledger is packed
+        Returns:
+            int: number of records packed
+        """
+        with self.lock:
+            with self.history_columns(client_id) as columns:
+                last_seq = columns["seq"][-1] if columns and len(columns["seq"]) else 0
+                old = {name: bytes(view) for name, view in columns.items()}
+
+            #only the ledger records after the last pack are read, starting where it left off
+            records, end = [], None
+            start = self.load(client_id, HISTORY_POSITION_KEY, None)
+            for record, end in records_after(self.ledger_path(client_id), last_seq, start):
+                records.append(record)
+            if not records:
+                return 0
+
+            new = encode_history(records, len(old.get("details", b"")))
+            with self.transaction():
+                for name, data in new.items():
+                    kind, typecode = (KIND_BLOB, "\0") if name == "details" else (KIND_COLUMN, HISTORY_COLUMNS[name])
+                    self.pending[section_name(client_id, f"history.{name}")] = (
+                        kind, typecode, old.get(name, b"") + (data if isinstance(data, bytes) else data.tobytes())
+                        )
+                self.save(client_id, HISTORY_POSITION_KEY, [records[-1]["seq"], end])
+            return len(records)
+
+
+    def close(self):
+        with self.lock:
+            if self.pack_on_close:
+                for client_id in sorted(self.opened_ledgers):
+                    self.pack_history(client_id)
+            for journal in self.journals.values():
+                journal.close()
+            self.state.close()
+
+
+def legacy_files(data_dir):
+    """Return True if a folder holds any of the legacy .pkl files"""
+    return any(name.endswith(".pkl") for name in os.listdir(data_dir)) if os.path.isdir(data_dir) else False
+
+
+def migrate_pickles(source_dir, path, client_ids=None):
+    """
+    Convert a legacy pickle folder into a state file.
+    Every .pkl value of every client is copied; the ledgers stay where they are.
+    Only run this on folders you trust, pickle files can run code when loaded.
+    Arguments:
+        source_dir(str): folder holding tasks.pkl, rewards.pkl, etc.
+        path(str): state file to write
+        client_ids(list): clients to convert (defaults to every client in the folder)
+    Returns:
+        int: number of values converted
+    """
+    source = PickleBackend(source_dir)
+    sections = []
+    if os.path.exists(path):
+        existing = StateFile(path)
+        try:
+            sections = [(name, kind, typecode, bytes(view)) for name, kind, typecode, view in existing.raw_sections()]
+        finally:
+            existing.close()
+    names = {name for name, _, _, _ in sections}
+
+    converted = 0
+    for client_id in client_ids or source.clients():
+        client_dir = source.client_dir(client_id)
+        if not os.path.isdir(client_dir):
+            continue
+        for filename in sorted(os.listdir(client_dir)):
+            if not filename.endswith(".pkl") or section_name(client_id, filename[:-4]) in names:
+                continue
+            with open(os.path.join(client_dir, filename), "rb") as f:
+                value = pickle.load(f)
+            data = json.dumps(value).encode("utf-8")
+            sections.append((section_name(client_id, filename[:-4]), KIND_JSON, "\0", data))
+            converted += 1
+
+    write_state(path, sections)
+    return converted
+
+
+def main():
+    """Command line entry point for converting pickle files into a state file"""
+    parser = argparse.ArgumentParser(description="Convert Star Points pickle files into a state file.")
+    parser.add_argument("--source", default=".", help="folder holding the .pkl files")
+    parser.add_argument("--state", default=STATE_FILE, help="state file to create or update")
+    parser.add_argument("--client", action="append", help="client id to convert (default: every client)")
+    args = parser.parse_args()
+
+    converted = migrate_pickles(args.source, args.state, args.client)
+    print(f"Converted {converted} values from {args.source} into {args.state}")
+
+
+if __name__ == "__main__":
+    main()
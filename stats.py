@@ -0,0 +1,194 @@
+"""
+Running statistics for the Star Points Token Economy.
+
+StatsEngine folds each ledger record into a set of rolling aggregates as
+it is recorded: points per day and per week, how often each task is
+completed, the average self-grade, daily streaks and how often rewards
+are redeemed. Adding a record is O(1) (plus the tasks checked in it), and
+the Stats panel renders from summary(), which only reads the aggregates,
+so stats stay instant no matter how many years of sessions a child has.
+
+Like the ledger, the engine is saved as a snapshot with the sequence
+number of the last record it covers, so startup only folds in the records
+appended since the snapshot was written.
+"""
+import datetime #Import datetime to bucket records by day and week
+
+#storage key the stats snapshot is kept under for each client
+STATS_KEY = "stats"
+
+#records folded in between stats snapshots
+SNAPSHOT_EVERY = 256
+
+
+def day_key(day):
+    """Return the storage key for a day, e.g. "2025-03-05" """
+    return day.isoformat()
+
+
+def week_key(day):
+    """Return the storage key for the ISO week a day falls in, e.g. "2025-W10" """
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+class StatsEngine:
+    """
+    StatsEngine keeps rolling aggregates over a client's awards and redemptions.
+    """
+
+    def __init__(self):
+        self.sequence = 0 #sequence number of the last record folded in
+        self.daily_points = {} #day key -> points earned that day
+        self.weekly_points = {} #week key -> points earned that week
+        self.sessions = 0 #number of entries (awards) recorded
+        self.task_counts = {} #task name -> number of entries it was checked in
+        self.grade_total = 0 #sum of every self-grade
+        self.grade_count = 0 #number of self-grades summed
+        self.first_day = None #ordinal of the first day with an entry
+        self.last_day = None #ordinal of the latest day with an entry
+        self.streak = 0 #consecutive days with an entry, ending on last_day
+        self.best_streak = 0 #longest streak so far
+        self.redemptions = 0 #number of rewards redeemed
+        self.reward_counts = {} #reward name -> number of times redeemed
+
+
+    def add(self, record):
+        """
+        Fold one ledger record into the aggregates.
+        Arguments:
+            record(dict): ledger record with kind, amount, ts and its details
+        """
+        self.sequence = record.get("seq", self.sequence + 1)
+        if record["kind"] == "award":
+            self.add_award(record)
+        elif record["kind"] == "undo_award":
+            self.remove_award(record)
+        elif record["kind"] == "rescore":
+            #a session scored again under new rules moves its own day's points by the difference
+            day = datetime.date.fromtimestamp(record["rescored_ts"])
+            self.daily_points[day_key(day)] = self.daily_points.get(day_key(day), 0) + record["amount"]
+            self.weekly_points[week_key(day)] = self.weekly_points.get(week_key(day), 0) + record["amount"]
+        elif record["kind"] in ("redeem", "undo_redeem"):
+            step = 1 if record["kind"] == "redeem" else -1
+            self.redemptions += step
+            reward = record.get("reward", "")
+            self.reward_counts[reward] = self.reward_counts.get(reward, 0) + step
+
+
+    def add_award(self, record):
+        """Fold an award into the points, task, grade and streak aggregates"""
+        day = datetime.date.fromtimestamp(record["ts"])
+        amount = record["amount"]
+        self.daily_points[day_key(day)] = self.daily_points.get(day_key(day), 0) + amount
+        self.weekly_points[week_key(day)] = self.weekly_points.get(week_key(day), 0) + amount
+
+        self.sessions += 1
+        for task in record.get("tasks", ()):
+            self.task_counts[task] = self.task_counts.get(task, 0) + 1
+        if record.get("self_grade") is not None:
+            self.grade_total += record["self_grade"]
+            self.grade_count += 1
+
+        #streaks only move forward, a late record from another tablet only fills in its day
+        ordinal = day.toordinal()
+        if self.first_day is None or ordinal < self.first_day:
+            self.first_day = ordinal
+        if self.last_day is None or ordinal > self.last_day:
+            self.streak = self.streak + 1 if self.last_day == ordinal - 1 else 1
+            self.last_day = ordinal
+            self.best_streak = max(self.best_streak, self.streak)
+
+
+    def remove_award(self, record):
+        """
+        Take an undone award back out of the points, task and grade aggregates.
+        Streaks are left as they were, a streak that really happened isn't rewritten.
+        """
+        day = datetime.date.fromtimestamp(record["undone_ts"])
+        amount = record["amount"]
+        self.daily_points[day_key(day)] = self.daily_points.get(day_key(day), 0) - amount
+        self.weekly_points[week_key(day)] = self.weekly_points.get(week_key(day), 0) - amount
+
+        self.sessions -= 1
+        for task in record.get("tasks", ()):
+            self.task_counts[task] = self.task_counts.get(task, 0) - 1
+        if record.get("self_grade") is not None:
+            self.grade_total -= record["self_grade"]
+            self.grade_count -= 1
+
+
+    def task_rates(self, tasks):
+        """
+        Return how often each task was completed, as a fraction of all entries.
+        Arguments:
+            tasks(list): task names to report on
+        """
+        return {task: self.task_counts.get(task, 0) / self.sessions if self.sessions else 0 for task in tasks}
+
+
+    def summary(self, tasks=(), today=None):
+        """
+        Return the values shown in the Stats panel, read straight from the aggregates.
+        Arguments:
+            tasks(list): current task names, for the most and least completed task
+            today(date): day to report on (defaults to today)
+        Returns:
+            dict: today, week, average_grade, streak, best_streak, redemptions,
+                redemptions_per_week, most_done and least_done ((task, rate) or None)
+        """
+        today = today or datetime.date.today()
+
+        #a streak is only current if there was an entry today or yesterday
+        streak = self.streak if self.last_day is not None and today.toordinal() - self.last_day <= 1 else 0
+
+        weeks = 1
+        if self.first_day is not None:
+            weeks = max(1, (today.toordinal() - self.first_day) // 7 + 1)
+
+        rates = self.task_rates(tasks)
+        ranked = sorted(rates.items(), key=lambda item: item[1])
+        return {
+            "today": self.daily_points.get(day_key(today), 0),
+            "week": self.weekly_points.get(week_key(today), 0),
+            "average_grade": self.grade_total / self.grade_count if self.grade_count else None,
+            "streak": streak,
+            "best_streak": self.best_streak,
+            "redemptions": self.redemptions,
+            "redemptions_per_week": self.redemptions / weeks,
+            "most_done": ranked[-1] if ranked else None,
+            "least_done": ranked[0] if ranked else None,
+        }
+
+
+    def to_dict(self):
+        """Return the aggregates as plain data for the storage backend"""
+        return {
+            "sequence": self.sequence,
+            "daily_points": dict(self.daily_points),
+            "weekly_points": dict(self.weekly_points),
+            "sessions": self.sessions,
+            "task_counts": dict(self.task_counts),
+            "grade_total": self.grade_total,
+            "grade_count": self.grade_count,
+            "first_day": self.first_day,
+            "last_day": self.last_day,
+            "streak": self.streak,
+            "best_streak": self.best_streak,
+            "redemptions": self.redemptions,
+            "reward_counts": dict(self.reward_counts),
+        }
+
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build an engine from a saved snapshot (None gives an empty engine).
+        Arguments:
+            data(dict): to_dict output
+        """
+        engine = cls()
+        for name, value in (data or {}).items():
+            if hasattr(engine, name):
+                setattr(engine, name, dict(value) if isinstance(value, dict) else value)
+        return engine
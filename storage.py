@@ -0,0 +1,565 @@
+"""
+Storage backends for the Star Points Token Economy.
+
+DataManager reads and writes through a StorageBackend so the same app can
+run on the original pickle files or on a shared SQLite database holding
+every client of a clinic.
+
+- PickleBackend keeps the legacy layout (tasks.pkl, rewards.pkl,
+  reward_costs.pkl and the points ledger) for a single child.
+- SQLiteBackend keeps all clients in one WAL-mode database, keyed and
+  indexed by client id, with batched transactions.
+
+Run this file directly to migrate a legacy pickle folder into SQLite:
+    python storage.py --source . --database star_points.db --client default
+"""
+import argparse #Import argparse for the migration command line
+import json #Import json to store values in the database
+import os #Import os for building file paths
+import pickle #Import pickle to read and write the legacy files
+import re #Import re to check client ids before they become folder names
+import sqlite3 #Import sqlite3 for the multi-client backend
+import threading #Import threading to share one connection safely
+import time #Import time to timestamp point records
+from contextlib import contextmanager, nullcontext #Import context helpers for batched transactions
+
+import crdt #Import the PN-counter used for conflict-free balances
+from ledger import PointsLedger, RECORD_SIGNS, scan_records #Import the append-only ledger used by the legacy backend
+
+#client id used for the original single-child install
+DEFAULT_CLIENT = "default"
+
+#client ids become folder names, so only plain names are allowed
+CLIENT_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def check_client_id(client_id):
+    """
+    Make sure a client id is safe to use as a folder name.
+    Arguments:
+        client_id(str): client id, possibly from a network request
+    Returns:
+        str: the client id
+    Raises:
+        ValueError: if it isn't 1-64 letters, digits, "_" or "-"
+    """
+    if not isinstance(client_id, str) or not CLIENT_ID_PATTERN.fullmatch(client_id):
+        raise ValueError(f"Invalid client id {client_id!r}: use 1-64 letters, digits, _ or -")
+    return client_id
+
+
+class StorageBackend:
+    """
+    Base class for DataManager storage. Values are stored per client under a short key
+    ("tasks", "rewards", "reward_costs"), and points go to a per-client ledger.
+    """
+
+    def load(self, client_id, key, default):
+        """
+        Load one stored value.
+        Arguments:
+            client_id(str): client the value belongs to
+            key(str): name of the value
+            default(any): value to return if nothing is stored
+        """
+        raise NotImplementedError
+
+    def save(self, client_id, key, value):
+        """Save one value for a client"""
+        self.save_many(client_id, {key: value})
+
+    def save_many(self, client_id, items):
+        """
+        Save several values for a client in one batch.
+        Arguments:
+            client_id(str): client the values belong to
+            items(dict): key to value mapping to store
+        """
+        raise NotImplementedError
+
+    def transaction(self):
+        """
+        Context manager grouping writes into one batch where the backend supports it.
+        """
+        return nullcontext()
+
+    def save_changes(self, client_id, key, changes, length):
+        """
+        Save only the changed records of a stored list.
+        Backends that can't update single records rewrite the whole list.
+        Arguments:
+            client_id(str): client the list belongs to
+            key(str): name of the list
+            changes(dict): position to new value for every changed record
+            length(int): new length of the list
+        """
+        value = list(self.load(client_id, key, []))[:length]
+        value.extend([None] * (length - len(value)))
+        for position, item in changes.items():
+            value[position] = item
+        self.save(client_id, key, value)
+
+    def exchange_counter(self, client_id, delta, since):
+        """
+        Merge a client's balance counter delta into this store's copy.
+        Arguments:
+            client_id(str): client the counter belongs to
+            delta(dict): counter entries changed by the caller since its last exchange
+            since(int): this store's counter clock at the caller's last exchange
+        Returns:
+            tuple: (dict of entries the caller is missing, this store's counter clock)
+        """
+        return crdt.exchange_counter(self, client_id, delta, since)
+
+    def open_ledger(self, client_id):
+        """
+        Open the points ledger for a client.
+        Returns:
+            object with append(), append_many(), history(), balance, sequence and close()
+        """
+        raise NotImplementedError
+
+    def read_history(self, client_id, after=0):
+        """
+        Generator over a client's ledger records, oldest first, without opening the ledger
+        for writing. Used by readers such as report workers that must never change a ledger
+        the app may be appending to.
+        Arguments:
+            client_id(str): client whose history is read
+            after(int): only yield records with a higher sequence number
+        Yields:
+            dict: each ledger record
+        """
+        raise NotImplementedError
+
+    def clients(self):
+        """Return a list of client ids known to this backend"""
+        raise NotImplementedError
+
+    def close(self):
+        """Release any open files or connections"""
+
+
+class PickleBackend(StorageBackend):
+    """
+    Legacy backend that keeps one pickle file per value in a folder.
+    The default client uses the folder itself, other clients get a sub folder.
+    """
+
+    def __init__(self, data_dir="."):
+        """
+        Arguments:
+            data_dir(str): folder holding the pickle files
+        """
+        self.data_dir = data_dir
+
+    def client_dir(self, client_id):
+        """Return the folder holding a client's files"""
+        if check_client_id(client_id) == DEFAULT_CLIENT:
+            return self.data_dir
+        return os.path.join(self.data_dir, "clients", client_id)
+
+    def path(self, client_id, key):
+        """Return the pickle file path for a stored value"""
+        return os.path.join(self.client_dir(client_id), f"{key}.pkl")
+
+    def load(self, client_id, key, default):
+        try:
+            #attempt to open the file in binary read mode and load its contents
+            with open(self.path(client_id, key), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            #if the file is missing, return default data
+            return default
+
+    def save_many(self, client_id, items):
+        os.makedirs(self.client_dir(client_id), exist_ok=True)
+        for key, value in items.items():
+            with open(self.path(client_id, key), "wb") as f:
+                pickle.dump(value, f)
+
+    def open_ledger(self, client_id):
+        os.makedirs(self.client_dir(client_id), exist_ok=True)
+        ledger = PointsLedger(os.path.join(self.client_dir(client_id), "points.ledger"))
+
+        #carry over the balance from the older total_points.pkl file on first run
+        if ledger.sequence == 0:
+            legacy_points = self.load(client_id, "total_points", 0)
+            if legacy_points:
+                ledger.append("opening", legacy_points)
+        return ledger
+
+    def read_history(self, client_id, after=0):
+        for record, _ in scan_records(os.path.join(self.client_dir(client_id), "points.ledger")):
+            if record["seq"] > after:
+                yield record
+
+    def clients(self):
+        clients = [DEFAULT_CLIENT]
+        clients_dir = os.path.join(self.data_dir, "clients")
+        if os.path.isdir(clients_dir):
+            #stray files and folders that can't be client ids are left out
+            clients.extend(sorted(name for name in os.listdir(clients_dir)
+                                  if CLIENT_ID_PATTERN.fullmatch(name) and os.path.isdir(os.path.join(clients_dir, name))))
+        return clients
+
+
+#schema for the SQLite backend, every table is keyed by client id first
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clients (
+    client_id TEXT PRIMARY KEY,
+    balance REAL NOT NULL DEFAULT 0,
+    sequence INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS client_values (
+    client_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (client_id, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS client_lists (
+    client_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    PRIMARY KEY (client_id, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS list_items (
+    client_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (client_id, key, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS points (
+    client_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    amount REAL NOT NULL,
+    details TEXT NOT NULL,
+    PRIMARY KEY (client_id, seq)
+) WITHOUT ROWID;
+"""
+
+#statements are kept as constants so sqlite3 reuses its prepared statement cache
+SELECT_VALUE = "SELECT value FROM client_values WHERE client_id = ? AND key = ?"
+UPSERT_VALUE = (
+    "INSERT INTO client_values (client_id, key, value) VALUES (?, ?, ?) "
+    "ON CONFLICT (client_id, key) DO UPDATE SET value = excluded.value"
+)
+DELETE_VALUE = "DELETE FROM client_values WHERE client_id = ? AND key = ?"
+SELECT_LIST_LENGTH = "SELECT length FROM client_lists WHERE client_id = ? AND key = ?"
+UPSERT_LIST_LENGTH = (
+    "INSERT INTO client_lists (client_id, key, length) VALUES (?, ?, ?) "
+    "ON CONFLICT (client_id, key) DO UPDATE SET length = excluded.length"
+)
+SELECT_LIST_ITEMS = (
+    "SELECT position, value FROM list_items WHERE client_id = ? AND key = ? AND position < ? ORDER BY position"
+)
+UPSERT_LIST_ITEM = (
+    "INSERT INTO list_items (client_id, key, position, value) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (client_id, key, position) DO UPDATE SET value = excluded.value"
+)
+TRIM_LIST_ITEMS = "DELETE FROM list_items WHERE client_id = ? AND key = ? AND position >= ?"
+INSERT_CLIENT = "INSERT OR IGNORE INTO clients (client_id) VALUES (?)"
+SELECT_BALANCE = "SELECT balance, sequence FROM clients WHERE client_id = ?"
+UPDATE_BALANCE = "UPDATE clients SET balance = ?, sequence = ? WHERE client_id = ?"
+INSERT_POINTS = (
+    "INSERT INTO points (client_id, seq, ts, kind, amount, details) VALUES (?, ?, ?, ?, ?, ?)"
+)
+SELECT_POINTS = (
+    "SELECT seq, ts, kind, amount, details FROM points WHERE client_id = ? AND seq > ? "
+    "ORDER BY seq LIMIT ?"
+)
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Backend storing every client in one SQLite database.
+    Uses WAL mode so readers never block the writer, and batches writes into transactions.
+    """
+
+    def __init__(self, path="star_points.db"):
+        """
+        Open (or create) the database.
+        Arguments:
+            path(str): database file
+        """
+        self.path = path
+        self.connection = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False, cached_statements=256
+            )
+        self.lock = threading.RLock() #one writer at a time on the shared connection
+        self._depth = 0 #nesting depth of transaction() blocks
+
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Context manager grouping every write inside it into one transaction.
+        Nested blocks join the outer transaction.
+        """
+        with self.lock:
+            if self._depth == 0:
+                self.connection.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self.connection
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.connection.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self.connection.execute("COMMIT")
+
+    def load(self, client_id, key, default):
+        with self.lock:
+            row = self.connection.execute(SELECT_VALUE, (client_id, key)).fetchone()
+            if row is not None:
+                return json.loads(row[0])
+
+            #lists are stored one record per row so single records can be updated
+            row = self.connection.execute(SELECT_LIST_LENGTH, (client_id, key)).fetchone()
+            if row is None:
+                return default
+            #positions never saved (lists saved a few slots at a time) read as None
+            value = [None] * row[0]
+            for position, item in self.connection.execute(SELECT_LIST_ITEMS, (client_id, key, row[0])):
+                value[position] = json.loads(item)
+            return value
+
+    def save_many(self, client_id, items):
+        with self.transaction() as connection:
+            connection.execute(INSERT_CLIENT, (client_id,))
+            for key, value in items.items():
+                if isinstance(value, list):
+                    connection.execute(DELETE_VALUE, (client_id, key))
+                    self._write_list(connection, client_id, key, dict(enumerate(value)), len(value))
+                else:
+                    connection.execute(UPSERT_VALUE, (client_id, key, json.dumps(value)))
+
+    def save_changes(self, client_id, key, changes, length):
+        with self.transaction() as connection:
+            connection.execute(INSERT_CLIENT, (client_id,))
+            if connection.execute(SELECT_VALUE, (client_id, key)).fetchone() is not None:
+                #a list saved before record storage existed is converted in full once
+                StorageBackend.save_changes(self, client_id, key, changes, length)
+                return
+            self._write_list(connection, client_id, key, changes, length)
+
+    def _write_list(self, connection, client_id, key, changes, length):
+        """Write the changed records of a list, its length, and drop records past the end"""
+        connection.executemany(UPSERT_LIST_ITEM, [
+            (client_id, key, position, json.dumps(item)) for position, item in changes.items()
+            ])
+        connection.execute(UPSERT_LIST_LENGTH, (client_id, key, length))
+        connection.execute(TRIM_LIST_ITEMS, (client_id, key, length))
+
+    def open_ledger(self, client_id):
+        return SQLiteLedger(self, client_id)
+
+    def read_history(self, client_id, after=0, batch_size=1000):
+        #read in pages so long histories never sit in memory at once
+        while True:
+            with self.lock:
+                rows = self.connection.execute(SELECT_POINTS, (client_id, after, batch_size)).fetchall()
+            for seq, timestamp, kind, amount, details in rows:
+                yield dict(json.loads(details), seq=seq, ts=timestamp, kind=kind, amount=amount)
+            if len(rows) < batch_size:
+                return
+            after = rows[-1][0]
+
+    def clients(self):
+        with self.lock:
+            return [row[0] for row in self.connection.execute(
+                "SELECT client_id FROM clients ORDER BY client_id"
+                )]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class SQLiteLedger:
+    """
+    Points ledger for one client stored in the SQLite backend.
+    Matches the PointsLedger interface so DataManager can use either.
+    """
+
+    def __init__(self, backend, client_id):
+        """
+        Arguments:
+            backend(SQLiteBackend): backend holding the database connection
+            client_id(str): client whose points this ledger records
+        """
+        self.backend = backend
+        self.client_id = client_id
+        with backend.transaction() as connection:
+            connection.execute(INSERT_CLIENT, (client_id,))
+            #the running balance is stored on the client row, a single indexed lookup
+            self.balance, self.sequence = connection.execute(SELECT_BALANCE, (client_id,)).fetchone()
+
+    def append(self, kind, amount, **details):
+        """
+        Append one award, redemption or opening balance.
+        Returns:
+            float: the balance after this record
+        """
+        return self.append_many([dict(details, kind=kind, amount=amount)])
+
+    def append_many(self, records):
+        """
+        Append several records in a single transaction.
+        Arguments:
+            records(iterable): dicts with kind, amount and optional ts and details
+        Returns:
+            float: the balance after the last record
+        """
+        rows = []
+        balance, sequence = self.balance, self.sequence
+        for record in records:
+            details = dict(record)
+            kind = details.pop("kind")
+            amount = details.pop("amount")
+            timestamp = details.pop("ts", None) or time.time()
+            if kind not in RECORD_SIGNS:
+                raise ValueError(f"Unknown ledger record kind: {kind}")
+            sequence += 1
+            balance += RECORD_SIGNS[kind] * amount
+            rows.append((self.client_id, sequence, timestamp, kind, amount, json.dumps(details)))
+
+        with self.backend.transaction() as connection:
+            connection.executemany(INSERT_POINTS, rows)
+            connection.execute(UPDATE_BALANCE, (balance, sequence, self.client_id))
+
+        #only update the in-memory balance once the transaction committed
+        self.balance, self.sequence = balance, sequence
+        return balance
+
+    def position(self):
+        """Records are looked up by sequence number, so there is no position to keep"""
+        return None
+
+    def history(self, after=0, batch_size=1000, start=None):
+        """
+        Generator over every record for this client, oldest first.
+        Reads in pages so long histories never sit in memory at once.
+        Arguments:
+            after(int): only yield records with a higher sequence number
+            batch_size(int): records read per page
+            start(tuple): ignored, the sequence index already finds the first record
+        Yields:
+            dict: each ledger record
+        """
+        return self.backend.read_history(self.client_id, after, batch_size)
+
+    def compact(self, background=False):
+        """The balance is kept on the client row, so there is nothing to compact"""
+
+    def flush(self):
+        """Every append is committed by its transaction, so there is nothing to flush"""
+
+    def close(self):
+        """The connection is owned by the backend, nothing to close here"""
+
+
+def diff_list(old, new):
+    """
+    Compare two versions of a stored list record by record.
+    Arguments:
+        old(list): list as it was loaded
+        new(list): list as it should be saved
+    Returns:
+        dict or None: position to new value for every changed record,
+            or None if the lists are identical
+    """
+    if old == new:
+        return None
+    return {position: item for position, item in enumerate(new)
+            if position >= len(old) or old[position] != item}
+
+
+def migrate_pickles(source_dir, database_path, client_id=DEFAULT_CLIENT):
+    """
+    One-shot migration of a legacy pickle folder into the SQLite backend.
+    Copies every .pkl value and the full points history of every client: the folder's
+    own files and each clients/<id> folder. The source folder is only read, never written to.
+    Only run this on folders you trust, pickle files can run code when loaded.
+    Arguments:
+        source_dir(str): folder holding tasks.pkl, rewards.pkl, etc.
+        database_path(str): SQLite database to write into
+        client_id(str): client id to store the folder's own files under
+    Returns:
+        int: number of point records copied
+    """
+    source = PickleBackend(source_dir)
+    clients_dir = os.path.join(source_dir, "clients")
+    if os.path.isdir(clients_dir):
+        for name in sorted(set(os.listdir(clients_dir)) - set(source.clients())):
+            print(f"Skipping {os.path.join(clients_dir, name)}: not a client folder")
+
+    #the folder's own files belong to the default client, which may be stored under another id
+    targets = {client_id: DEFAULT_CLIENT}
+    for source_id in source.clients()[1:]:
+        if source_id in targets:
+            raise ValueError(f"Client {source_id} has its own folder in {source_dir}, pick another --client")
+        targets[source_id] = source_id
+
+    target = SQLiteBackend(database_path)
+    try:
+        plans = []
+        for target_id, source_id in targets.items():
+            folder = source.client_dir(source_id)
+            values = {}
+            for filename in sorted(os.listdir(folder)) if os.path.isdir(folder) else ():
+                #total_points.pkl becomes the opening record below
+                if filename.endswith(".pkl") and filename != "total_points.pkl":
+                    values[filename[:-4]] = source.load(source_id, filename[:-4], None)
+
+            #read the ledger file directly, opening it would create it or append an opening record
+            records = list(source.read_history(source_id))
+            if not records:
+                #a folder from before the ledger keeps its balance in total_points.pkl
+                legacy_points = source.load(source_id, "total_points", 0)
+                if legacy_points:
+                    records = [{"kind": "opening", "amount": legacy_points}]
+            if not values and not records:
+                continue
+
+            target_ledger = target.open_ledger(target_id)
+            if target_ledger.sequence:
+                raise ValueError(f"Client {target_id} already has points in {database_path}")
+            plans.append((target_id, values, records, target_ledger))
+
+        #write every client's values and whole history in a single transaction
+        with target.transaction():
+            for target_id, values, records, target_ledger in plans:
+                target.save_many(target_id, values)
+                if records:
+                    for record in records:
+                        record.pop("seq", None)
+                    target_ledger.append_many(records)
+        return sum(len(records) for _, _, records, _ in plans)
+    finally:
+        target.close()
+
+
+def main():
+    """Command line entry point for the pickle to SQLite migration"""
+    parser = argparse.ArgumentParser(description="Migrate Star Points pickle files into SQLite.")
+    parser.add_argument("--source", default=".", help="folder holding the .pkl files")
+    parser.add_argument("--database", default="star_points.db", help="SQLite database to create or update")
+    parser.add_argument("--client", default=DEFAULT_CLIENT, help="client id to store the folder's own files under")
+    args = parser.parse_args()
+
+    copied = migrate_pickles(args.source, args.database, check_client_id(args.client))
+    print(f"Migrated {copied} point records from {args.source} into {args.database}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+"""
+Local sync service for the Star Points Token Economy.
+
+SyncServer is an asyncio server that owns one storage backend and exposes
+the DataManager operations (load, save, award, redeem, history) to every
+tablet in a room over a single long-lived TCP connection each. Messages are
+compact JSON lines tagged with a request id, so a client can pipeline many
+requests before reading the replies.
+
+RemoteBackend is the client side: a StorageBackend that forwards to the
+server, keeps a read-through cache, and drops cached values when the server
+pushes an invalidation after another tablet writes. DataManager works on
+top of it unchanged.
+
+Run the server with:
+    python sync_service.py --database star_points.db --host 0.0.0.0 --port 8765
+"""
+import argparse #Import argparse for the server command line
+import asyncio #Import asyncio for the server
+import json #Import json for the wire format
+import queue #Import queue to hand pushes to the GUI thread
+import socket #Import socket for the client connection
+import threading #Import threading for the client reader thread
+from concurrent.futures import Future, ThreadPoolExecutor #Import futures to match replies to requests
+
+from statefile import StateFileBackend #Import the state file backend
+from storage import SQLiteBackend, StorageBackend, check_client_id #Import the storage backends
+
+DEFAULT_PORT = 8765
+
+
+def encode(message):
+    """Encode one message as a compact JSON line"""
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class SyncServer:
+    """
+    SyncServer serves one backend to many tablets and pushes changes to subscribers.
+    All backend calls run on one worker thread so they happen in arrival order.
+    """
+
+    def __init__(self, backend, host="127.0.0.1", port=DEFAULT_PORT):
+        """
+        Arguments:
+            backend(StorageBackend): storage shared by every tablet
+            host(str): address to listen on ("0.0.0.0" for the whole LAN)
+            port(int): TCP port to listen on
+        """
+        self.backend = backend
+        self.host = host
+        self.port = port
+        self.ledgers = {} #open ledgers by client id
+        self.subscribers = {} #client id -> set of writers to push changes to
+        self.executor = ThreadPoolExecutor(max_workers=1) #serializes backend access
+        self.server = None
+
+
+    async def start(self):
+        """Start listening for tablets"""
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+
+    async def serve_forever(self):
+        """Start the server and run until cancelled"""
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serve one tablet's connection until it closes.
+        Requests are answered in the order they arrive, so pipelined requests stay ordered.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = {}
+                try:
+                    request = json.loads(line)
+                    result, pushes = await loop.run_in_executor(self.executor, self.dispatch, request)
+                    reply = {"id": request.get("id"), "ok": True, "result": result}
+                except Exception as e:
+                    reply, pushes = {"id": request.get("id"), "ok": False, "error": str(e)}, []
+
+                if reply["ok"] and request.get("op") == "subscribe":
+                    self.subscribers.setdefault(request["client"], set()).add(writer)
+
+                writer.write(encode(reply))
+                #let every other tablet watching this client know what changed
+                for client_id, push in pushes:
+                    for subscriber in self.subscribers.get(client_id, ()):
+                        if subscriber is not writer:
+                            subscriber.write(encode(push))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for subscribers in self.subscribers.values():
+                subscribers.discard(writer)
+            writer.close()
+
+
+    def ledger(self, client_id):
+        """Return the open ledger for a client, opening it on first use"""
+        if client_id not in self.ledgers:
+            self.ledgers[client_id] = self.backend.open_ledger(client_id)
+        return self.ledgers[client_id]
+
+
+    def dispatch(self, request):
+        """
+        Run one request against the backend (on the worker thread).
+        Arguments:
+            request(dict): op name and its arguments
+        Returns:
+            tuple: (result, list of (client id, push message) to send to subscribers)
+        """
+        op = request["op"]
+        if op == "clients":
+            return self.backend.clients(), []
+        #the id comes from the network and becomes a folder name on the server
+        client_id = check_client_id(request.get("client"))
+
+        if op == "subscribe":
+            ledger = self.ledger(client_id)
+            return {"balance": ledger.balance, "sequence": ledger.sequence}, []
+        if op == "load":
+            return self.backend.load(client_id, request["key"], request.get("default")), []
+        if op == "save_many":
+            self.backend.save_many(client_id, request["items"])
+            return None, [(client_id, {"push": "invalidate", "client": client_id, "keys": list(request["items"])})]
+        if op == "save_changes":
+            changes = {int(position): item for position, item in request["changes"].items()}
+            self.backend.save_changes(client_id, request["key"], changes, request["length"])
+            return None, [(client_id, {"push": "invalidate", "client": client_id, "keys": [request["key"]]})]
+        if op == "append":
+            ledger = self.ledger(client_id)
+            balance = ledger.append_many(request["records"])
+            push = {"push": "balance", "client": client_id, "balance": balance, "sequence": ledger.sequence}
+            return {"balance": balance, "sequence": ledger.sequence}, [(client_id, push)]
+        if op == "exchange_counter":
+            missing, clock = self.backend.exchange_counter(client_id, request["delta"], request["since"])
+            push = {"push": "counter", "client": client_id, "delta": request["delta"]}
+            return [missing, clock], [(client_id, push)]
+        if op == "history":
+            records = []
+            for record in self.ledger(client_id).history(after=request.get("after", 0)):
+                records.append(record)
+                if len(records) >= request.get("limit", 1000):
+                    break
+            return records, []
+        raise ValueError(f"Unknown operation: {op}")
+
+
+    def close(self):
+        """Stop listening and close every ledger and the backend"""
+        if self.server is not None:
+            self.server.close()
+        self.executor.shutdown(wait=True)
+        for ledger in self.ledgers.values():
+            ledger.close()
+        self.backend.close()
+
+
+class SyncClient:
+    """
+    SyncClient keeps one connection to the server and matches replies to requests by id.
+    A reader thread resolves replies and queues pushes for the GUI thread.
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, timeout=10):
+        """
+        Arguments:
+            host(str): server address
+            port(int): server port
+            timeout(float): seconds to wait for each reply
+        """
+        self.timeout = timeout
+        self.socket = socket.create_connection((host, port), timeout=timeout)
+        self.socket.settimeout(None) #the reader thread blocks until data arrives
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.socket.makefile("rb")
+        self.pending = {} #request id -> Future waiting for its reply
+        self.pushes = queue.Queue() #pushes from the server, drained by the GUI thread
+        self.push_listeners = [] #callbacks run on the reader thread for each push
+        self._next_id = 0
+        self._lock = threading.Lock() #guards request ids and socket writes
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+
+    def _read_loop(self):
+        """Read replies and pushes until the connection closes"""
+        for line in self.file:
+            message = json.loads(line)
+            if "push" in message:
+                for listener in self.push_listeners:
+                    listener(message)
+                self.pushes.put(message)
+                continue
+            future = self.pending.pop(message.get("id"), None)
+            if future is None:
+                continue
+            if message["ok"]:
+                future.set_result(message["result"])
+            else:
+                future.set_exception(RuntimeError(message["error"]))
+
+        #the server went away, fail anything still waiting
+        for future in list(self.pending.values()):
+            future.set_exception(ConnectionError("sync server closed the connection"))
+        self.pending.clear()
+
+
+    def send(self, op, **arguments):
+        """
+        Send a request without waiting for its reply (pipelining).
+        Arguments:
+            op(str): operation name
+            arguments: operation arguments
+        Returns:
+            Future: resolved with the result when the reply arrives
+        """
+        future = Future()
+        with self._lock:
+            self._next_id += 1
+            self.pending[self._next_id] = future
+            self.socket.sendall(encode(dict(arguments, id=self._next_id, op=op)))
+        return future
+
+
+    def call(self, op, **arguments):
+        """Send a request and wait for its result"""
+        return self.send(op, **arguments).result(self.timeout)
+
+
+    def call_many(self, requests):
+        """
+        Pipeline several requests and wait for all of their results.
+        Arguments:
+            requests(list): (op, arguments dict) pairs
+        Returns:
+            list: results in the same order
+        """
+        futures = [self.send(op, **arguments) for op, arguments in requests]
+        return [future.result(self.timeout) for future in futures]
+
+
+    def close(self):
+        """Close the connection"""
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+
+
+class RemoteBackend(StorageBackend):
+    """
+    StorageBackend that forwards to a SyncServer with a read-through cache.
+    Cached values are dropped as soon as the server pushes an invalidation.
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT):
+        """
+        Arguments:
+            host(str): server address
+            port(int): server port
+        """
+        self.client = SyncClient(host, port)
+        self.cache = {} #(client id, key) -> value
+        self.ledgers = {} #client id -> RemoteLedger kept current by balance pushes
+        self.client.push_listeners.append(self.on_push)
+
+
+    def on_push(self, message):
+        """Apply a server push to the cache and ledgers (runs on the reader thread)"""
+        client_id = message["client"]
+        if message["push"] == "invalidate":
+            for key in message["keys"]:
+                self.cache.pop((client_id, key), None)
+        elif message["push"] == "balance" and client_id in self.ledgers:
+            self.ledgers[client_id].update(message["balance"], message["sequence"])
+
+
+    def load(self, client_id, key, default):
+        if (client_id, key) not in self.cache:
+            self.cache[(client_id, key)] = self.client.call("load", client=client_id, key=key, default=default)
+        return self.cache[(client_id, key)]
+
+    def load_many(self, client_id, defaults):
+        """
+        Load several values with one pipelined round of requests.
+        Arguments:
+            client_id(str): client the values belong to
+            defaults(dict): key to default value
+        Returns:
+            dict: key to loaded value
+        """
+        missing = [key for key in defaults if (client_id, key) not in self.cache]
+        results = self.client.call_many([
+            ("load", {"client": client_id, "key": key, "default": defaults[key]}) for key in missing
+            ])
+        self.cache.update({(client_id, key): value for key, value in zip(missing, results)})
+        return {key: self.cache[(client_id, key)] for key in defaults}
+
+    def save_many(self, client_id, items):
+        self.client.call("save_many", client=client_id, items=items)
+        for key, value in items.items():
+            self.cache[(client_id, key)] = value
+
+    def save_changes(self, client_id, key, changes, length):
+        self.client.call("save_changes", client=client_id, key=key,
+                         changes={str(position): item for position, item in changes.items()}, length=length)
+        self.cache.pop((client_id, key), None)
+
+    def exchange_counter(self, client_id, delta, since):
+        missing, clock = self.client.call("exchange_counter", client=client_id, delta=delta, since=since)
+        return missing, clock
+
+    def open_ledger(self, client_id):
+        self.ledgers[client_id] = RemoteLedger(self, client_id)
+        return self.ledgers[client_id]
+
+    def read_history(self, client_id, after=0, batch_size=1000):
+        #fetched in pages, without subscribing to the client's changes
+        while True:
+            records = self.client.call("history", client=client_id, after=after, limit=batch_size)
+            yield from records
+            if len(records) < batch_size:
+                return
+            after = records[-1]["seq"]
+
+    def clients(self):
+        return self.client.call("clients")
+
+    def close(self):
+        self.client.close()
+
+
+class RemoteLedger:
+    """
+    Points ledger for one client kept on the sync server.
+    Matches the PointsLedger interface so DataManager can use it.
+    """
+
+    def __init__(self, backend, client_id):
+        """
+        Subscribe to the client's changes and read its current balance.
+        Arguments:
+            backend(RemoteBackend): backend holding the connection
+            client_id(str): client whose points this ledger records
+        """
+        self.backend = backend
+        self.client_id = client_id
+        self.balance, self.sequence = 0, 0
+        state = backend.client.call("subscribe", client=client_id)
+        self.update(state["balance"], state["sequence"])
+
+    def update(self, balance, sequence):
+        """
+        Take a balance from a reply or push, unless a newer one has already arrived.
+        Arguments:
+            balance(float): balance on the server
+            sequence(int): ledger sequence number the balance belongs to
+        """
+        if sequence >= self.sequence:
+            self.balance, self.sequence = balance, sequence
+
+    def append(self, kind, amount, **details):
+        """Append one record on the server, returning the balance after it"""
+        return self.append_many([dict(details, kind=kind, amount=amount)])
+
+    def append_many(self, records):
+        """Append several records on the server in one request"""
+        state = self.backend.client.call("append", client=self.client_id, records=list(records))
+        self.update(state["balance"], state["sequence"])
+        return state["balance"]
+
+    def position(self):
+        """The server finds records by sequence number, so there is no position to keep"""
+        return None
+
+    def history(self, after=0, batch_size=1000, start=None):
+        """Generator over the records after a sequence number, fetched from the server in pages (start is ignored)"""
+        return self.backend.read_history(self.client_id, after, batch_size)
+
+    def compact(self, background=False):
+        """Compaction happens on the server"""
+
+    def flush(self):
+        """Every append is acknowledged by the server, so there is nothing to flush"""
+
+    def close(self):
+        """The connection is owned by the backend, nothing to close here"""
+
+
+def main():
+    """Command line entry point for running the sync server"""
+    parser = argparse.ArgumentParser(description="Share Star Points data between tablets.")
+    parser.add_argument("--database", help="SQLite database to serve (default: the state file in --data-dir)")
+    parser.add_argument("--data-dir", default=".", help="folder holding the state file")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (0.0.0.0 for the LAN)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port to listen on")
+    args = parser.parse_args()
+
+    backend = SQLiteBackend(args.database) if args.database else StateFileBackend(args.data_dir)
+    server = SyncServer(backend, args.host, args.port)
+    print(f"Serving Star Points data on {args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""
+Shared setup for the Star Points tests: the modules live in the folder above.
+"""
+import os #Import os to find the project folder
+import sys #Import sys to put the project folder on the import path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,89 @@
+"""
+Tests for DataManager reopening its data, including after an unclean exit.
+"""
+import ledger as ledger_module #Import the ledger module to watch where scans start
+from StarPointsTokenEconomyGUI import DataManager #Import the data manager under test
+from statefile import StateFileBackend #Import the default backend
+
+
+def open_manager(data_dir, **kwargs):
+    """Open the default client in a data folder with a fixed device id"""
+    return DataManager(backend=StateFileBackend(str(data_dir)), device_id="test-device", **kwargs)
+
+
+def test_reopen_after_unclean_exit(tmp_path):
+    #awards reach the ledger, but the app dies before close() saves the stats
+    data_manager = open_manager(tmp_path)
+    data_manager.award_points(5, self_grade=4, bonus=0, tasks=["Task 1"])
+    data_manager.award_points(3, self_grade=2, bonus=0, tasks=[])
+
+    reopened = open_manager(tmp_path)
+    try:
+        assert reopened.ledger.balance == 8
+        assert reopened.stats.sessions == 2
+        assert len(reopened.sessions()) == 2
+        assert reopened.balance_at(float("inf")) == 8
+    finally:
+        reopened.close()
+        data_manager.ledger.close()
+
+
+def test_reopen_after_clean_exit(tmp_path):
+    data_manager = open_manager(tmp_path)
+    data_manager.award_points(5, self_grade=4, bonus=0, tasks=["Task 1"])
+    data_manager.close()
+
+    reopened = open_manager(tmp_path)
+    try:
+        assert reopened.total_points == 5
+        assert reopened.stats.sessions == 1
+    finally:
+        reopened.close()
+
+
+def test_catch_up_starts_at_the_saved_ledger_position(tmp_path, monkeypatch):
+    data_manager = open_manager(tmp_path)
+    data_manager.award_points(5, self_grade=4, bonus=0, tasks=["Task 1"])
+    data_manager.award_points(3, self_grade=2, bonus=0, tasks=[])
+    data_manager.close()
+
+    #a record appended outside the app, after the stats were saved
+    backend = StateFileBackend(str(tmp_path))
+    ledger = backend.open_ledger("default")
+    ledger.append("award", 4, ts=0)
+    ledger.close()
+    backend.close()
+
+    offsets = []
+    scan_records = ledger_module.scan_records
+    monkeypatch.setattr(ledger_module, "scan_records", lambda path, offset=0: offsets.append(offset) or scan_records(path, offset))
+
+    reopened = open_manager(tmp_path)
+    try:
+        assert reopened.stats.sessions == 3
+        assert reopened.ledger.balance == 12
+        #one full replay rebuilds the balance, the catch-up only reads the record after the saved position
+        assert offsets.count(0) == 1 and len(offsets) == 2
+    finally:
+        reopened.close()
+
+
+def test_ledger_append_outlasting_the_retries_still_reaches_the_ledger(tmp_path):
+    errors = []
+    data_manager = open_manager(tmp_path, write_behind=True, on_save_error=errors.append)
+    data_manager.writer.retry_delay = 0
+    append, failures = data_manager.ledger.append, [OSError("disk busy")] * (data_manager.writer.retries + 2)
+
+    def flaky_append(*args, **kwargs):
+        if failures:
+            raise failures.pop()
+        return append(*args, **kwargs)
+
+    data_manager.ledger.append = flaky_append
+    data_manager.award_points(5, self_grade=4, bonus=0, tasks=["Task 1"])
+    data_manager.flush()
+    try:
+        assert len(errors) == 1
+        assert data_manager.ledger.balance == data_manager.total_points == 5
+    finally:
+        data_manager.close()
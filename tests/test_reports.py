@@ -0,0 +1,34 @@
+"""
+Tests for the weekly reports reading a client's history.
+"""
+import datetime #Import datetime to pick the week being reported
+import os #Import os to check the report left the ledger alone
+
+from ledger import PointsLedger #Import the ledger the app appends to
+from reports import client_report #Import the report builder under test
+from statefile import StateFileBackend #Import the default backend
+
+
+def test_report_never_writes_to_the_ledger(tmp_path):
+    ledger = PointsLedger(str(tmp_path / "points.ledger"))
+    ledger.append("award", 5, ts=1000.0)
+    ledger.append("award", 3, ts=2000.0)
+    ledger.close()
+
+    #a record still being written by the app looks like a torn frame at the end
+    path = tmp_path / "points.ledger"
+    with open(path, "ab") as f:
+        f.write(b"\x20\x00\x00\x00partial")
+    size = os.path.getsize(path)
+
+    backend = StateFileBackend(str(tmp_path), pack_on_close=False)
+    try:
+        report = client_report(backend, "default", datetime.date.today())
+        other = client_report(backend, "nobody", datetime.date.today())
+    finally:
+        backend.close()
+
+    assert report["balance"] == 8
+    assert os.path.getsize(path) == size
+    assert other["balance"] == 0
+    assert not os.path.exists(tmp_path / "clients" / "nobody")
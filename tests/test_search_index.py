@@ -0,0 +1,22 @@
+"""
+Tests for the search-as-you-type index.
+"""
+from search_index import SearchIndex #Import the index under test
+
+
+def test_set_reindexes_one_edited_position():
+    index = SearchIndex(["Read a book", "Brush teeth"])
+    assert index.search("rea") == [0]
+
+    index.set(0, "Tidy room")
+    index.set(2, "Read comics")
+    assert index.search("rea") == [2]
+    assert index.search("ti ro") == [0]
+    assert not index.set(1, "Brush teeth")
+
+
+def test_update_drops_removed_positions():
+    index = SearchIndex(["Read a book", "Brush teeth", "Read comics"])
+    assert index.update(["Read a book"]) == 2
+    assert index.search("re") == [0]
+    assert len(index) == 1
@@ -0,0 +1,100 @@
+"""
+Tests for importing sessions into a client's ledger.
+"""
+from crdt import reconcile_stores #Import the two-way counter merge
+from session_io import import_sessions #Import the importer under test
+from statefile import StateFileBackend #Import the default backend
+from test_data_manager import open_manager #Import the shared DataManager opener
+
+
+def write_csv(path, lines):
+    """Write a small CSV file of sessions and return its path"""
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_imported_rows_reach_the_balance(tmp_path):
+    data_manager = open_manager(tmp_path)
+    data_manager.award_points(5, self_grade=4, bonus=0, tasks=["Task 1"])
+    data_manager.close()
+
+    path = write_csv(tmp_path / "sessions.csv", ["kind,cost,reward,self_grade,bonus,tasks",
+                                                 "award,,,3,4,Task 1;Task 2",
+                                                 "redeem,2,Sticker,,,"])
+    backend = StateFileBackend(str(tmp_path))
+    try:
+        assert import_sessions(path, backend) == (2, 0)
+    finally:
+        backend.close()
+
+    reopened = open_manager(tmp_path)
+    try:
+        assert reopened.ledger.balance > 5
+        assert reopened.total_points == reopened.ledger.balance
+    finally:
+        reopened.close()
+
+
+def test_invalid_task_counts_and_uncovered_redemptions_are_rejected(tmp_path):
+    data_manager = open_manager(tmp_path)
+    data_manager.award_points(5, self_grade=4, bonus=0, tasks=["Task 1"])
+    data_manager.close()
+
+    path = write_csv(tmp_path / "sessions.csv", ["kind,cost,reward,self_grade,bonus,tasks,checked_tasks,ts",
+                                                 "award,,,3,0,Task 1,-4,",
+                                                 "award,,,3,0,Task 1,1000000,",
+                                                 "award,,,3,0,Task 1,0.5,",
+                                                 "redeem,20,Bike,,,,,",
+                                                 "award,,,3,0,Task 1;Task 2,2,",
+                                                 "redeem,10,Park,,,,,",
+                                                 "redeem,1,Sticker,,,,,",
+                                                 "award,,,nan,0,Task 1,1,",
+                                                 "award,,,3,inf,Task 1,1,",
+                                                 "award,,,3,nan,Task 1,1,",
+                                                 "award,,,3,0,Task 1,1,nan",
+                                                 "award,,,3,0,Task 1,1,inf",
+                                                 "redeem,nan,Sticker,,,,,",
+                                                 "redeem,-inf,Sticker,,,,,"])
+    errors = []
+    backend = StateFileBackend(str(tmp_path))
+    try:
+        assert import_sessions(path, backend, on_error=errors.append) == (2, 12)
+    finally:
+        backend.close()
+
+    assert [error.line for error in errors] == [2, 3, 4, 5, 8, 9, 10, 11, 12, 13, 14, 15]
+
+
+def test_imports_into_separate_stores_add_up_when_reconciled(tmp_path):
+    def import_session(store):
+        path = write_csv(store / "sessions.csv", ["kind,cost,reward,self_grade,bonus,tasks",
+                                                  "award,,,3,4,Task 1;Task 2"])
+        backend = StateFileBackend(str(store))
+        try:
+            assert import_sessions(path, backend) == (1, 0)
+            return backend.open_ledger("default").balance
+        finally:
+            backend.close()
+
+    tablet_dir, classroom_dir = tmp_path / "tablet", tmp_path / "classroom"
+    tablet_dir.mkdir()
+    classroom_dir.mkdir()
+
+    #the tablet has a counter before its import
+    data_manager = open_manager(tablet_dir)
+    data_manager.award_points(5, self_grade=4, bonus=0, tasks=["Task 1"])
+    data_manager.close()
+    balances = [import_session(tablet_dir)]
+
+    #the classroom seeds its counter from an imported ledger, then imports again
+    import_session(classroom_dir)
+    open_manager(classroom_dir).close()
+    balances.append(import_session(classroom_dir))
+
+    tablet, classroom = StateFileBackend(str(tablet_dir)), StateFileBackend(str(classroom_dir))
+    try:
+        #each store's seed and import run has its own counter entry, so nothing is merged away
+        assert reconcile_stores("default", tablet, classroom) == sum(balances)
+    finally:
+        tablet.close()
+        classroom.close()
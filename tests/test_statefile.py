@@ -0,0 +1,88 @@
+"""
+Tests for the state file backend and its per-client journal.
+"""
+import os #Import os to check which files a save touched
+
+import ledger as ledger_module #Import the ledger module to watch where scans start
+from crdt import COUNTER_KEY #Import the balance counter's key
+from statefile import JOURNAL_FILE, STATE_FILE, StateFileBackend #Import the backend under test
+
+
+def test_journal_values_skip_the_state_file(tmp_path):
+    backend = StateFileBackend(str(tmp_path))
+    backend.save("default", "tasks", ["Task 1"])
+    stamp = os.stat(tmp_path / STATE_FILE).st_mtime_ns
+    for balance in range(5):
+        backend.save("default", COUNTER_KEY, {"p": {"device": balance}})
+    backend.close()
+
+    assert os.stat(tmp_path / STATE_FILE).st_mtime_ns == stamp
+    reopened = StateFileBackend(str(tmp_path))
+    try:
+        assert reopened.load("default", COUNTER_KEY, None) == {"p": {"device": 4}}
+        assert reopened.load("default", "tasks", None) == ["Task 1"]
+    finally:
+        reopened.close()
+
+
+def test_torn_journal_record_is_ignored(tmp_path):
+    backend = StateFileBackend(str(tmp_path))
+    backend.save("default", COUNTER_KEY, {"p": {"device": 1}})
+    backend.close()
+    path = tmp_path / JOURNAL_FILE
+    intact = path.read_bytes()
+    path.write_bytes(intact + intact[:10])
+
+    #reading leaves the file alone, the next save cuts the torn record off
+    reader = StateFileBackend(str(tmp_path), pack_on_close=False)
+    assert reader.load("default", COUNTER_KEY, None) == {"p": {"device": 1}}
+    reader.close()
+    assert path.stat().st_size == len(intact) + 10
+
+    writer = StateFileBackend(str(tmp_path))
+    writer.save("default", COUNTER_KEY, {"p": {"device": 2}})
+    writer.close()
+    reopened = StateFileBackend(str(tmp_path))
+    try:
+        assert reopened.load("default", COUNTER_KEY, None) == {"p": {"device": 2}}
+    finally:
+        reopened.close()
+
+
+def test_history_reads_resume_after_the_packed_records(tmp_path, monkeypatch):
+    backend = StateFileBackend(str(tmp_path))
+    ledger = backend.open_ledger("default")
+    for amount in (1, 2, 3):
+        ledger.append("award", amount, ts=0)
+    ledger.close()
+    assert backend.pack_history("default") == 3
+    ledger = backend.open_ledger("default")
+    ledger.append("redeem", 2, ts=0)
+    ledger.close()
+
+    offsets = []
+    scan_records = ledger_module.scan_records
+    monkeypatch.setattr(ledger_module, "scan_records", lambda path, offset=0: offsets.append(offset) or scan_records(path, offset))
+    try:
+        assert [record["seq"] for record in backend.read_history("default")] == [1, 2, 3, 4]
+        assert backend.pack_history("default") == 1
+        #the packed records are never decoded from the ledger again
+        assert 0 not in offsets
+    finally:
+        backend.close()
+
+
+def test_saving_one_client_leaves_the_other_journals_closed(tmp_path):
+    backend = StateFileBackend(str(tmp_path))
+    for client_id in ("alice", "bob", "carol"):
+        backend.save(client_id, "tasks", ["Task 1"])
+        backend.save(client_id, COUNTER_KEY, {"p": {"device": 1}})
+    backend.close()
+
+    reopened = StateFileBackend(str(tmp_path))
+    try:
+        reopened.save("alice", "tasks", ["Task 2"])
+        assert reopened.journals == {}
+        assert reopened.load("bob", "tasks", None) == ["Task 1"]
+    finally:
+        reopened.close()
@@ -0,0 +1,52 @@
+"""
+Tests for the storage backends and the pickle migration.
+"""
+import os #Import os to list the source folder
+import pickle #Import pickle to write a legacy folder
+
+from storage import SQLiteBackend, migrate_pickles #Import the migration under test
+
+
+def test_migration_leaves_the_source_folder_alone(tmp_path):
+    source = tmp_path / "legacy"
+    source.mkdir()
+    for key, value in (("tasks", ["Read"]), ("rewards", ["Park"]), ("reward_costs", [10]), ("total_points", 12)):
+        with open(source / f"{key}.pkl", "wb") as f:
+            pickle.dump(value, f)
+    before = sorted(os.listdir(source))
+
+    database = str(tmp_path / "star_points.db")
+    assert migrate_pickles(str(source), database) == 1
+    assert sorted(os.listdir(source)) == before
+
+    backend = SQLiteBackend(database)
+    try:
+        assert backend.open_ledger("default").balance == 12
+        assert backend.load("default", "tasks", None) == ["Read"]
+    finally:
+        backend.close()
+
+
+def test_migration_copies_every_client_folder(tmp_path):
+    source = tmp_path / "legacy"
+    (source / "clients" / "sam").mkdir(parents=True)
+    (source / "clients" / "notes.txt").write_text("not a client")
+    for folder, values in ((source, {"tasks": ["Read"], "total_points": 12}),
+                           (source / "clients" / "sam", {"tasks": ["Swim"], "task_schedules": {"Swim": [1]},
+                                                         "total_points": 3})):
+        for key, value in values.items():
+            with open(folder / f"{key}.pkl", "wb") as f:
+                pickle.dump(value, f)
+
+    database = str(tmp_path / "star_points.db")
+    assert migrate_pickles(str(source), database, "alex") == 2
+
+    backend = SQLiteBackend(database)
+    try:
+        assert backend.load("alex", "tasks", None) == ["Read"]
+        assert backend.open_ledger("alex").balance == 12
+        assert backend.load("sam", "tasks", None) == ["Swim"]
+        assert backend.load("sam", "task_schedules", None) == {"Swim": [1]}
+        assert backend.open_ledger("sam").balance == 3
+    finally:
+        backend.close()
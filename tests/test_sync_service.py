@@ -0,0 +1,30 @@
+"""
+Tests for the sync server's request handling.
+"""
+import os #Import os to look for files written outside the data folder
+
+import pytest #Import pytest to check the rejected requests
+
+from statefile import StateFileBackend #Import the default backend the server wraps
+from sync_service import SyncServer #Import the server under test
+
+
+def test_client_ids_that_leave_the_data_folder_are_rejected(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    server = SyncServer(StateFileBackend(str(data_dir)))
+    try:
+        for request in ({"op": "save_many", "client": "../../x", "items": {"tasks": ["Read"]}},
+                        {"op": "subscribe", "client": "../x"},
+                        {"op": "append", "client": "/tmp/x", "records": []},
+                        {"op": "load", "client": "", "key": "tasks"},
+                        {"op": "load", "client": None, "key": "tasks"}):
+            with pytest.raises(ValueError):
+                server.dispatch(request)
+        assert sorted(os.listdir(tmp_path)) == ["data"]
+        assert not os.path.exists(data_dir / "clients")
+
+        server.dispatch({"op": "save_many", "client": "Sam_2", "items": {"tasks": ["Read"]}})
+        assert server.dispatch({"op": "load", "client": "Sam_2", "key": "tasks"})[0] == ["Read"]
+    finally:
+        server.close()
@@ -0,0 +1,68 @@
+"""
+Tests for saving the undo log a record at a time.
+"""
+import os #Import os to measure what an award writes
+
+from statefile import JOURNAL_FILE, StateFileBackend #Import the default backend
+from storage import SQLiteBackend #Import the SQLite backend
+from test_data_manager import open_manager #Import the shared DataManager opener
+from undo import UNDO_KEY #Import the undo log's storage key
+from StarPointsTokenEconomyGUI import DataManager #Import the data manager
+
+
+def award(data_manager, times):
+    """Award one point a number of times"""
+    for _ in range(times):
+        data_manager.award_points(1, self_grade=1, bonus=0, tasks=[])
+
+
+def test_undo_log_survives_reopen_past_the_event_limit(tmp_path):
+    for backend in (lambda: StateFileBackend(str(tmp_path)), lambda: SQLiteBackend(str(tmp_path / "star_points.db"))):
+        data_manager = DataManager(backend=backend(), device_id="test-device")
+        award(data_manager, 600)
+        data_manager.undo()
+        award(data_manager, 3)
+        events, cursor = list(data_manager.undo_log.events), data_manager.undo_log.cursor
+        data_manager.close()
+
+        reopened = DataManager(backend=backend(), device_id="test-device")
+        try:
+            assert reopened.undo_log.events == events
+            assert reopened.undo_log.cursor == cursor
+            reopened.undo()
+            assert reopened.total_points == 601
+        finally:
+            reopened.close()
+
+
+def test_award_saves_only_the_new_event(tmp_path):
+    data_manager = open_manager(tmp_path)
+    try:
+        award(data_manager, 100)
+        size = os.path.getsize(tmp_path / JOURNAL_FILE)
+        award(data_manager, 1)
+        assert os.path.getsize(tmp_path / JOURNAL_FILE) - size < 1024
+    finally:
+        data_manager.close()
+
+
+def test_log_saved_whole_by_older_versions_is_loaded(tmp_path):
+    backend = StateFileBackend(str(tmp_path))
+    catalog = {"tasks": [], "rewards": [], "reward_costs": [], "task_schedules": [], "scoring_rules": []}
+    backend.save("default", UNDO_KEY, {
+        "events": [{"type": "points", "kind": "award", "amount": 2, "details": {"ts": 1.0}}],
+        "base": 0, "cursor": 1, "checkpoints": {"0": {"catalog": catalog, "balance": 0}},
+        })
+    backend.close()
+
+    data_manager = open_manager(tmp_path)
+    try:
+        assert data_manager.undo_log.can_undo()
+        data_manager.award_points(1, self_grade=1, bonus=0, tasks=[])
+    finally:
+        data_manager.close()
+    reopened = open_manager(tmp_path)
+    try:
+        assert len(reopened.undo_log.events) == 2
+    finally:
+        reopened.close()
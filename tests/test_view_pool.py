@@ -0,0 +1,32 @@
+"""
+Tests for the pooled widgets, using a stand-in for Tk widgets.
+"""
+from view_pool import WidgetPool #Import the pool under test
+
+
+class FakeButton:
+    """Records the config calls a Tk button would get"""
+
+    def __init__(self, parent):
+        self.configs = []
+
+    def config(self, **options):
+        self.configs.append(options)
+
+    def invoke(self):
+        for options in reversed(self.configs):
+            if "command" in options:
+                return options["command"]()
+
+
+def test_redraws_keep_one_command_per_slot():
+    redeemed = []
+    pool = WidgetPool(None, FakeButton, command=lambda item: redeemed.append(item))
+    button = pool.show(0, item=("Sticker", 10), text="Sticker - 10 pts")
+    pool.show(0, item=("Sticker", 10), text="Sticker - 10 pts")
+    pool.show(0, item=("Park", 20), text="Park - 20 pts")
+    button.invoke()
+
+    assert redeemed == [("Park", 20)]
+    assert sum("command" in options for options in button.configs) == 1
+    assert len(button.configs) == 3
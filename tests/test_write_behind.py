@@ -0,0 +1,64 @@
+"""
+Tests for the write-behind queue's handling of failing writes.
+"""
+from write_behind import WriteBehindQueue #Import the queue under test
+
+
+class FlakyWrite:
+    """A write that raises a given number of times before it succeeds"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.saved = []
+
+    def __call__(self, value):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk busy")
+        self.saved.append(value)
+
+
+def test_failing_write_keeps_the_rest_of_its_batch():
+    flaky, saved = FlakyWrite(1), []
+    writer = WriteBehindQueue(retry_delay=0)
+    writer.submit(("value", "a"), flaky, 1)
+    writer.submit(None, saved.append, 2)
+    writer.submit(None, saved.append, 3)
+    writer.close()
+
+    assert saved == [2, 3]
+    assert flaky.saved == [1]
+    assert writer.stats()["retried"] == 1
+    assert writer.errors == []
+
+
+def test_write_that_keeps_failing_is_reported():
+    reported = []
+    writer = WriteBehindQueue(retries=2, retry_delay=0, on_error=reported.append)
+    writer.submit(("value", "a"), FlakyWrite(5), 1)
+    writer.close()
+
+    assert len(reported) == 1 and isinstance(reported[0], OSError)
+    assert writer.stats()["errors"] == 1
+
+
+def test_newer_write_replaces_a_failed_one():
+    flaky = FlakyWrite(1)
+    writer = WriteBehindQueue(retry_delay=0.2)
+    writer.submit(("value", "a"), flaky, 1)
+    writer.flush(timeout=0.1)
+    writer.submit(("value", "a"), flaky, 2)
+    writer.close()
+
+    assert flaky.saved == [2]
+
+
+def test_kept_write_is_reported_but_not_given_up():
+    reported, flaky = [], FlakyWrite(5)
+    writer = WriteBehindQueue(retries=2, retry_delay=0, on_error=reported.append)
+    writer.submit(None, flaky, 1, keep=True)
+    assert writer.flush(timeout=5)
+    writer.close()
+
+    assert flaky.saved == [1]
+    assert len(reported) == 1 and isinstance(reported[0], OSError)
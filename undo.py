@@ -0,0 +1,242 @@
+"""
+Undo and redo for the Star Points Token Economy.
+
+Every change made through DataManager is recorded as an invertible event:
+
+- a points event (an award or redemption) is undone by appending a
+  compensating ledger record, so the ledger stays append-only and the
+  balance, PN-counter and stats all see the correction
+- a catalog event (a Parent Portal save) keeps the changed positions of
+  each list both ways, so it is undone or redone by applying one diff
+
+Stepping back or forward is O(1) in the length of the history. Every
+CHECKPOINT_EVERY events the catalog and balance are checkpointed, so the
+state at any point in the log is rebuilt from the nearest checkpoint plus
+at most CHECKPOINT_EVERY events, never by replaying the whole log. The
+log is bounded to MAX_EVENTS events and is saved with the client's data,
+so undo survives a restart.
+
+The log is saved a record at a time: a small header with the cursor, and
+the events and checkpoints as stored lists whose slots are reused in turn,
+so each change saves only the new event, and a checkpoint is saved once
+when it is taken.
+"""
+
+#storage key of the undo log's header (cursor and the positions its events cover) for each client
+UNDO_KEY = "undo_log"
+
+#storage keys of the undo log's events and checkpoints, saved a record at a time
+UNDO_EVENTS_KEY = "undo_events"
+UNDO_CHECKPOINTS_KEY = "undo_checkpoints"
+
+#events between catalog and balance checkpoints
+CHECKPOINT_EVERY = 32
+
+#events kept in the log, older ones are dropped a checkpoint at a time
+MAX_EVENTS = 512
+
+#slots in the stored event and checkpoint lists, reused in turn by position
+EVENT_SLOTS = MAX_EVENTS + CHECKPOINT_EVERY
+CHECKPOINT_SLOTS = MAX_EVENTS // CHECKPOINT_EVERY + 2
+
+#ledger record kind that reverses each kind of points event
+INVERSE_KINDS = {"award": "undo_award", "redeem": "undo_redeem"}
+
+#catalog lists covered by catalog events
+CATALOG_KEYS = ("tasks", "rewards", "reward_costs", "task_schedules", "scoring_rules")
+
+
+def diff_both_ways(old, new):
+    """
+    Return the changes that turn old into new and new back into old.
+    Arguments:
+        old(list): list before the change
+        new(list): list after the change
+    Returns:
+        tuple: ((changes, length) forward, (changes, length) backward)
+    """
+    forward = {position: item for position, item in enumerate(new)
+               if position >= len(old) or old[position] != item}
+    backward = {position: item for position, item in enumerate(old)
+                if position >= len(new) or new[position] != item}
+    return (forward, len(new)), (backward, len(old))
+
+
+def apply_changes(values, changes, length):
+    """
+    Return a copy of a list with changed positions replaced and its length set.
+    Arguments:
+        values(list): list to change
+        changes(dict): position -> new item (positions may be strings after a JSON round trip)
+        length(int): length of the result
+    """
+    result = list(values[:length]) + [None] * max(0, length - len(values))
+    for position, item in changes.items():
+        result[int(position)] = item
+    return result
+
+
+def apply_catalog(catalog, event, direction):
+    """
+    Apply a catalog event to a catalog state.
+    Arguments:
+        catalog(dict): key -> list
+        event(dict): catalog event
+        direction(str): "forward" to redo, "backward" to undo
+    Returns:
+        dict: the new catalog state
+    """
+    catalog = dict(catalog)
+    for key, (changes, length) in event[direction].items():
+        #checkpoints saved before a list was added to the catalog don't have it
+        catalog[key] = apply_changes(catalog.get(key, []), changes, length)
+    return catalog
+
+
+def points_delta(event, direction="forward"):
+    """Return the change in balance an event makes in one direction"""
+    if event["type"] != "points":
+        return 0
+    delta = event["amount"] if event["kind"] == "award" else -event["amount"]
+    return delta if direction == "forward" else -delta
+
+
+class EventLog:
+    """
+    EventLog is a bounded list of invertible events with a cursor and periodic checkpoints.
+    Events before the cursor are applied (undoable), events from the cursor on are redoable.
+    """
+
+    def __init__(self, catalog, balance=0):
+        """
+        Start an empty log from the current state.
+        Arguments:
+            catalog(dict): key -> list for every catalog list
+            balance(float): current balance
+        """
+        self.events = [] #events in the log, oldest first
+        self.base = 0 #position of events[0] counted from the first event ever recorded
+        self.cursor = 0 #position just past the last applied event
+        self.checkpoints = {0: {"catalog": catalog, "balance": balance}} #position -> state
+        self.unsaved_events = set() #positions of events not saved yet
+        self.unsaved_checkpoints = {0} #positions of checkpoints not saved yet
+
+
+    def can_undo(self):
+        return self.cursor > self.base
+
+    def can_redo(self):
+        return self.cursor < self.base + len(self.events)
+
+
+    def record(self, event, state):
+        """
+        Add an event that has just been applied, dropping anything that could be redone.
+        Arguments:
+            event(dict): the event
+            state(callable): returns the current state (catalog and balance) for a checkpoint
+        """
+        del self.events[self.cursor - self.base:]
+        for position in [position for position in self.checkpoints if position > self.cursor]:
+            del self.checkpoints[position]
+
+        self.events.append(event)
+        self.unsaved_events.add(self.cursor)
+        self.cursor += 1
+        if self.cursor % CHECKPOINT_EVERY == 0:
+            self.checkpoints[self.cursor] = state()
+            self.unsaved_checkpoints.add(self.cursor)
+
+        #drop the oldest checkpoint interval once the log is full
+        if len(self.events) > MAX_EVENTS:
+            self.events = self.events[CHECKPOINT_EVERY:]
+            del self.checkpoints[self.base]
+            self.base += CHECKPOINT_EVERY
+
+
+    def undo(self):
+        """Step back one event and return it (the caller applies its inverse)"""
+        self.cursor -= 1
+        return self.events[self.cursor - self.base]
+
+    def redo(self):
+        """Step forward one event and return it (the caller applies it again)"""
+        event = self.events[self.cursor - self.base]
+        self.cursor += 1
+        return event
+
+
+    def state_at(self, position):
+        """
+        Rebuild the catalog and balance at a position in the log.
+        Starts from the nearest checkpoint at or before it, so at most CHECKPOINT_EVERY events are replayed.
+        Arguments:
+            position(int): position between base and the end of the log
+        Returns:
+            dict: catalog and balance
+        """
+        start = max(checkpoint for checkpoint in self.checkpoints if checkpoint <= position)
+        catalog = self.checkpoints[start]["catalog"]
+        balance = self.checkpoints[start]["balance"]
+        for event in self.events[start - self.base:position - self.base]:
+            if event["type"] == "catalog":
+                catalog = apply_catalog(catalog, event, "forward")
+            balance += points_delta(event)
+        return {"catalog": catalog, "balance": balance}
+
+
+    def take_changes(self):
+        """
+        Return what has to be saved since the last call.
+        Returns:
+            tuple: (header dict, {slot: event} for new events, {slot: checkpoint} for new checkpoints)
+        """
+        end = self.base + len(self.events)
+        events = {position % EVENT_SLOTS: self.events[position - self.base]
+                  for position in self.unsaved_events if self.base <= position < end}
+        checkpoints = {(position // CHECKPOINT_EVERY) % CHECKPOINT_SLOTS: dict(self.checkpoints[position], position=position)
+                       for position in self.unsaved_checkpoints if position in self.checkpoints}
+        self.unsaved_events.clear()
+        self.unsaved_checkpoints.clear()
+        return {"base": self.base, "cursor": self.cursor, "end": end}, events, checkpoints
+
+
+    @classmethod
+    def from_stored(cls, header, events, checkpoints, catalog, balance=0):
+        """
+        Load a saved log, or start a new one from the current state if nothing usable was saved.
+        Arguments:
+            header(dict): header saved under UNDO_KEY, or None
+            events(list): event slots saved under UNDO_EVENTS_KEY
+            checkpoints(list): checkpoint slots saved under UNDO_CHECKPOINTS_KEY
+            catalog(dict): current catalog, used for a new log
+            balance(float): current balance, used for a new log
+        """
+        log = cls(catalog, balance)
+        if not header:
+            return log
+
+        if "events" in header:
+            #saved whole by an older version, every record is saved again one at a time
+            log.events = list(header["events"])
+            log.base, log.cursor = header["base"], header["cursor"]
+            log.checkpoints = {int(position): state for position, state in header["checkpoints"].items()}
+            log.unsaved_events = set(range(log.base, log.base + len(log.events)))
+            log.unsaved_checkpoints = set(log.checkpoints)
+            return log
+
+        base, end = header["base"], header["end"]
+        slots = [events[position % EVENT_SLOTS] if position % EVENT_SLOTS < len(events) else None
+                 for position in range(base, end)]
+        saved = {}
+        for state in checkpoints:
+            if state and base <= state["position"] <= end:
+                saved[state["position"]] = {"catalog": state["catalog"], "balance": state["balance"]}
+
+        #a save that never finished leaves a gap, the log then starts over from the current state
+        if None in slots or base not in saved:
+            return log
+        log.events, log.checkpoints = slots, saved
+        log.base, log.cursor = base, header["cursor"]
+        log.unsaved_checkpoints.clear()
+        return log
@@ -0,0 +1,219 @@
+"""
+Widget reuse helpers for the Star Points Token Economy.
+
+Instead of destroying and re-creating widgets on every refresh, the GUI
+keeps a pool of widgets and only reconfigures the ones whose values have
+changed. Debouncer collapses a burst of events (keystrokes in a filter
+box) into one redraw once they pause. ResourceGauge shows the live widget
+count and memory use so a kiosk can be checked to stay flat over a long
+session.
+"""
+import os #Import os to read the page size for the memory gauge
+import time #Import time to timestamp gauge samples
+import tkinter as tk #Import Tkinter for the gauge label
+
+
+class BoundLabel:
+    """
+    BoundLabel ties a widget's text to a value and only reconfigures it when the value changes.
+    """
+
+    def __init__(self, widget, template="{}"):
+        """
+        Arguments:
+            widget(Widget): label or button whose text is updated
+            template(str): format string the value is inserted into
+        """
+        self.widget = widget
+        self.template = template
+        self.value = object() #sentinel so the first set always draws
+
+    def set(self, value):
+        """
+        Show a new value.
+        Arguments:
+            value(any): value to display
+        Returns:
+            bool: True if the widget had to be reconfigured
+        """
+        if value == self.value:
+            return False
+        self.value = value
+        self.widget.config(text=self.template.format(value))
+        return True
+
+
+class WidgetPool:
+    """
+    WidgetPool hands out reusable widgets by slot number.
+    Unused slots are hidden with grid_remove rather than destroyed.
+    """
+
+    def __init__(self, parent, factory, command=None):
+        """
+        Arguments:
+            parent(Widget): frame the widgets live in
+            factory(callable): builds a new widget given the parent
+            command(callable): called with a slot's item when its widget is clicked; each widget
+                gets one fixed command when it is created, so redraws never register new ones
+        """
+        self.parent = parent
+        self.factory = factory
+        self.command = command
+        self.widgets = [] #every widget ever created, in slot order
+        self.options = [] #last config options applied to each slot
+        self.items = [] #what each slot currently shows, handed to command
+        self.visible = 0 #number of slots currently shown
+
+    def show(self, slot, item=None, **options):
+        """
+        Show a slot's widget with the given config options, creating it only the first time.
+        Arguments:
+            slot(int): slot number
+            item(any): what the slot shows, passed to command when the widget is clicked
+            options: config options (text, variable...) to apply if they changed
+        Returns:
+            Widget: the widget in that slot, for the caller to grid
+        """
+        while len(self.widgets) <= slot:
+            widget = self.factory(self.parent)
+            if self.command is not None:
+                widget.config(command=lambda slot=len(self.widgets): self.command(self.items[slot]))
+            self.widgets.append(widget)
+            self.options.append({})
+            self.items.append(None)
+        self.items[slot] = item
+
+        widget = self.widgets[slot]
+        changed = {key: value for key, value in options.items() if self.options[slot].get(key) != value}
+        if changed:
+            widget.config(**changed)
+            self.options[slot].update(changed)
+        self.visible = max(self.visible, slot + 1)
+        return widget
+
+    def hide_from(self, count):
+        """
+        Hide every slot from count onward, keeping the widgets for later.
+        Arguments:
+            count(int): number of slots to keep visible
+        """
+        for widget in self.widgets[count:self.visible]:
+            widget.grid_remove()
+        self.visible = min(self.visible, count)
+
+
+class Debouncer:
+    """
+    Debouncer runs a callback once events have stopped arriving for a short delay.
+    """
+
+    def __init__(self, root, callback, delay_ms=120):
+        """
+        Arguments:
+            root(Widget): widget whose event loop runs the callback
+            callback(callable): called with no arguments after the last trigger
+            delay_ms(int): quiet time before the callback runs
+        """
+        self.root = root
+        self.callback = callback
+        self.delay_ms = delay_ms
+        self.pending = None #id of the scheduled callback, if one is waiting
+
+    def trigger(self, *args):
+        """Restart the delay (extra arguments from Tk bindings and traces are ignored)"""
+        if self.pending is not None:
+            self.root.after_cancel(self.pending)
+        self.pending = self.root.after(self.delay_ms, self.run)
+
+    def run(self):
+        """Run the callback now, cancelling a scheduled run"""
+        if self.pending is not None:
+            self.root.after_cancel(self.pending)
+            self.pending = None
+        self.callback()
+
+
+def count_widgets(widget):
+    """
+    Count a widget and all of its descendants, including Toplevel windows.
+    Arguments:
+        widget(Widget): root of the tree to count
+    """
+    count = 0
+    stack = [widget]
+    while stack:
+        current = stack.pop()
+        count += 1
+        stack.extend(current.winfo_children())
+    return count
+
+
+def current_memory_kb():
+    """
+    Return the resident memory of this process in kilobytes.
+    Uses /proc on Linux and the peak resident size elsewhere; None if unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource #Import resource lazily, it doesn't exist on Windows
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class ResourceGauge:
+    """
+    ResourceGauge shows the live widget count and memory use in a label,
+    and can append every sample to a CSV file for long soak tests.
+    """
+
+    def __init__(self, root, parent=None, interval_ms=5000, log_path=None, extra=None):
+        """
+        Arguments:
+            root(Tk): main window whose widgets are counted
+            parent(Widget): where the gauge label is placed (defaults to root)
+            interval_ms(int): milliseconds between samples
+            log_path(str): optional CSV file each sample is appended to
+            extra(callable): optional function returning a dict of more values to show and log
+        """
+        self.root = root
+        self.interval_ms = interval_ms
+        self.log_path = log_path
+        self.extra = extra
+        self.label = tk.Label(parent or root, fg="gray", bg="light blue")
+        self.view = BoundLabel(self.label)
+        self.samples = 0
+
+    def sample(self):
+        """
+        Take one sample.
+        Returns:
+            tuple: (widget count, memory in kB or None)
+        """
+        return count_widgets(self.root), current_memory_kb()
+
+    def update(self):
+        """Take a sample, refresh the label and log, and schedule the next one"""
+        widgets, memory_kb = self.sample()
+        memory = "n/a" if memory_kb is None else f"{memory_kb / 1024:.1f} MB"
+        extra = self.extra() if self.extra is not None else {}
+        text = f"Widgets: {widgets}   Memory: {memory}"
+        for name, value in extra.items():
+            text += f"   {name}: {value}"
+        self.view.set(text)
+        self.samples += 1
+
+        if self.log_path:
+            new_file = not os.path.exists(self.log_path)
+            with open(self.log_path, "a") as f:
+                if new_file:
+                    f.write(",".join(["time", "widgets", "memory_kb"] + list(extra)) + "\n")
+                values = [f"{time.time():.0f}", str(widgets), "" if memory_kb is None else str(memory_kb)]
+                f.write(",".join(values + [str(value) for value in extra.values()]) + "\n")
+
+        self.root.after(self.interval_ms, self.update)
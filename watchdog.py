@@ -0,0 +1,160 @@
+"""
+Event loop stall watchdog for the Star Points Token Economy.
+
+StallWatchdog heartbeats through root.after on the Tk thread. A sampler
+thread watches the heartbeat, and when it is late by more than the
+threshold the Tk thread is stuck (disk I/O, image decoding, widget churn),
+so the sampler captures the Tk thread's stack every SAMPLE_MS until the
+heartbeat comes back. Each stall is then written to the stall log as one
+compact block: when it started, how long it lasted and the distinct
+stacks seen, innermost call last, with how many samples hit each.
+
+A stall still going after ONGOING_REPORT_S is written straight away
+marked "ongoing", so a kiosk that is killed while frozen still leaves a
+trace. Run the app with --watchdog-ms to turn it on.
+"""
+import os #Import os to shorten file names in the log
+import sys #Import sys to read the Tk thread's current frame
+import threading #Import threading for the sampler thread
+import time #Import time for the heartbeat clock
+import traceback #Import traceback to walk the sampled stack
+
+from metrics import REGISTRY, count #Import the metrics registry to export stall counts and durations
+
+#stall log written next to the app
+DEFAULT_LOG_PATH = "stall_log.txt"
+
+#milliseconds between heartbeats
+HEARTBEAT_MS = 100
+
+#milliseconds between stack samples while the Tk thread is stalled
+SAMPLE_MS = 50
+
+#stack frames kept per sample, counted from the innermost
+STACK_DEPTH = 12
+
+#distinct stacks written per stall
+MAX_STACKS = 5
+
+#seconds after which a stall is written before it ends
+ONGOING_REPORT_S = 5.0
+
+REGISTRY.help["ui_stall"] = "Length of each event loop stall over the watchdog threshold"
+
+
+def compact_stack(frame, depth=STACK_DEPTH):
+    """
+    Return a stack as one line of file:line function, outermost first.
+    Arguments:
+        frame(frame): innermost frame
+        depth(int): frames kept from the innermost end
+    """
+    frames = traceback.extract_stack(frame)[-depth:]
+    return " > ".join(f"{os.path.basename(summary.filename)}:{summary.lineno} {summary.name}" for summary in frames)
+
+
+class StallWatchdog:
+    """
+    StallWatchdog detects and logs stalls of the Tk event loop.
+    """
+
+    def __init__(self, root, threshold_ms, log_path=DEFAULT_LOG_PATH, heartbeat_ms=HEARTBEAT_MS):
+        """
+        Arguments:
+            root(Tk): window whose event loop is watched
+            threshold_ms(int): a heartbeat this late counts as a stall
+            log_path(str): file stalls are appended to
+            heartbeat_ms(int): milliseconds between heartbeats
+        """
+        self.root = root
+        self.threshold = threshold_ms / 1000
+        self.heartbeat = heartbeat_ms / 1000
+        self.log_path = log_path
+        self.last_beat = time.perf_counter()
+        self.tk_thread = None #ident of the thread running the event loop
+        self.running = False
+        self.stalls = 0 #stalls logged since start
+
+
+    def start(self):
+        """Start heartbeating and sampling. Call from the Tk thread."""
+        self.tk_thread = threading.get_ident()
+        self.running = True
+        self.beat()
+        threading.Thread(target=self.watch, name="stall-watchdog", daemon=True).start()
+
+
+    def stop(self):
+        """Stop watching, e.g. before the shutdown work or once the event loop has returned"""
+        self.running = False
+
+
+    def beat(self):
+        """Record a heartbeat and schedule the next one"""
+        self.last_beat = time.perf_counter()
+        if self.running:
+            self.root.after(int(self.heartbeat * 1000), self.beat)
+
+
+    def watch(self):
+        """Sampler thread: wait for a late heartbeat, then sample the Tk thread until it recovers"""
+        while self.running:
+            late = time.perf_counter() - self.last_beat - self.heartbeat
+            if late < self.threshold:
+                time.sleep(max(self.threshold - late, SAMPLE_MS / 1000))
+                continue
+            self.sample_stall(self.last_beat)
+
+
+    def sample_stall(self, beat):
+        """
+        Sample the Tk thread's stack until the heartbeat after a stalled one arrives.
+        Arguments:
+            beat(float): time of the last heartbeat before the stall
+        """
+        stacks = {} #compact stack -> samples
+        reported = False
+        while self.running and self.last_beat == beat:
+            frame = sys._current_frames().get(self.tk_thread)
+            if frame is not None:
+                stack = compact_stack(frame)
+                stacks[stack] = stacks.get(stack, 0) + 1
+            del frame
+            stalled = time.perf_counter() - beat - self.heartbeat
+            if stalled >= ONGOING_REPORT_S and not reported:
+                self.write_stall(beat, stalled, stacks, ongoing=True)
+                reported = True
+            time.sleep(SAMPLE_MS / 1000)
+        if not self.running:
+            #stopped for shutdown work, which blocks the loop on purpose
+            return
+
+        #the heartbeat came back late by the length of the stall
+        stalled = (self.last_beat if self.last_beat != beat else time.perf_counter()) - beat - self.heartbeat
+        self.stalls += 1
+        count("ui_stalls")
+        if REGISTRY.enabled:
+            REGISTRY.observe("ui_stall", stalled)
+        self.write_stall(beat, stalled, stacks)
+
+
+    def write_stall(self, beat, stalled, stacks, ongoing=False):
+        """
+        Append one stall to the log.
+        Arguments:
+            beat(float): time of the last heartbeat before the stall
+            stalled(float): seconds the event loop was stuck
+            stacks(dict): compact stack -> number of samples
+            ongoing(bool): the stall had not ended when it was written
+        """
+        started = time.time() - (time.perf_counter() - beat - self.heartbeat)
+        samples = sum(stacks.values())
+        lines = [f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))} "
+                 f"stall {stalled * 1000:.0f} ms{' (ongoing)' if ongoing else ''}, {samples} samples"]
+        for stack, hits in sorted(stacks.items(), key=lambda item: -item[1])[:MAX_STACKS]:
+            lines.append(f"  {hits}x {stack}")
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            print(f"Unable to write stall log {self.log_path}: {e}")
@@ -0,0 +1,246 @@
+"""
+Write-behind persistence for the Star Points Token Economy.
+
+Button callbacks hand their writes to a WriteBehindQueue and return at
+once; a background worker thread performs them. Repeated writes to the same
+key that are still waiting are coalesced into one, and each batch of writes
+is followed by a single sync so the disk is flushed once per batch rather
+than once per write. flush() blocks until everything queued has been
+written, which the app calls on Exit and when the window is closed.
+
+Each write runs on its own, so one failing write never takes the rest of
+its batch with it. A failed write is put back at the front of the queue and
+retried, and if it keeps failing it is reported through on_error. Writes
+submitted with keep=True (ledger appends, which nothing else would redo)
+are reported but stay queued until they succeed or the queue is closed.
+"""
+import threading #Import threading for the background writer
+import time #Import time to measure flush latency
+from collections import OrderedDict #Import OrderedDict to keep writes in order
+from contextlib import nullcontext #Import nullcontext for batches without a transaction
+
+#times a failing write is retried before it is given up and reported
+SAVE_RETRIES = 3
+
+#seconds to wait before retrying failed writes
+RETRY_DELAY = 0.5
+
+
+class WriteBehindQueue:
+    """
+    WriteBehindQueue runs queued writes on a background thread in submission order.
+    """
+
+    def __init__(self, batch_context=None, after_batch=None, name="star-points-writer",
+                 retries=SAVE_RETRIES, retry_delay=RETRY_DELAY, on_error=None):
+        """
+        Arguments:
+            batch_context(callable): returns a context manager wrapped around each batch
+                (e.g. the backend's transaction)
+            after_batch(callable): called after each batch, e.g. to fsync the ledger
+            name(str): name of the worker thread
+            retries(int): times a failing write is retried before it is given up
+            retry_delay(float): seconds to wait before retrying
+            on_error(callable): called on the worker thread with each exception that
+                couldn't be saved past (defaults to printing it)
+        """
+        self.batch_context = batch_context or nullcontext
+        self.after_batch = after_batch
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.on_error = on_error or (lambda e: print(f"Unable to save data: {e}"))
+
+        self._pending = OrderedDict() #key -> (function, args, kwargs, merge, failed attempts, keep)
+        self._condition = threading.Condition()
+        self._busy = False #True while the worker is running a batch
+        self._closed = False
+        self._next_id = 0 #counter giving uncoalesced writes a unique key
+
+        #metrics
+        self.writes = 0 #writes performed
+        self.coalesced = 0 #writes replaced by a newer write to the same key
+        self.batches = 0 #batches performed
+        self.last_flush_ms = 0.0 #time the last batch took
+        self.max_flush_ms = 0.0 #slowest batch so far
+        self.retried = 0 #writes put back in the queue after failing
+        self.errors = [] #exceptions of writes given up, and of failed batch syncs
+
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+
+    def submit(self, key, function, *args, merge=None, keep=False, **kwargs):
+        """
+        Queue a write.
+        Arguments:
+            key(hashable): writes with the same key are coalesced (None never coalesces)
+            function(callable): the write to perform
+            args, kwargs: arguments for function
+            merge(callable): combines the queued args with the new args when coalescing;
+                by default the newer write simply replaces the queued one
+            keep(bool): keep retrying after the write is reported instead of giving it up,
+                until the queue is closed
+        """
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed")
+            if key is None:
+                self._next_id += 1
+                key = ("unique", self._next_id)
+            elif key in self._pending:
+                #replace the waiting write in place so ordering is preserved
+                self.coalesced += 1
+                if merge is not None:
+                    args = merge(self._pending[key][1], args)
+            self._pending[key] = (function, args, kwargs, merge, 0, keep)
+            self._condition.notify()
+
+
+    def depth(self):
+        """Return the number of writes waiting to run"""
+        with self._condition:
+            return len(self._pending)
+
+
+    def stats(self):
+        """
+        Return the queue metrics.
+        Returns:
+            dict: depth, writes, coalesced, batches, last and max flush time in ms, retried, errors
+        """
+        with self._condition:
+            return {
+                "depth": len(self._pending),
+                "writes": self.writes,
+                "coalesced": self.coalesced,
+                "batches": self.batches,
+                "last_flush_ms": self.last_flush_ms,
+                "max_flush_ms": self.max_flush_ms,
+                "retried": self.retried,
+                "errors": len(self.errors),
+            }
+
+
+    def _run(self):
+        """Worker loop: take every waiting write as one batch and run it"""
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending and self._closed:
+                    return
+                batch = list(self._pending.items())
+                self._pending.clear()
+                self._busy = True
+
+            started = time.perf_counter()
+            failed = [] #(key, write, exception) of the writes that raised
+            try:
+                with self.batch_context():
+                    for key, write in batch:
+                        try:
+                            write[0](*write[1], **write[2])
+                        except Exception as e:
+                            failed.append((key, write, e))
+            except Exception as e:
+                #the batch itself didn't commit, so every keyed write is saved again; writes without
+                #a key (ledger appends) go to their own files and must not be repeated
+                raised = {key for key, _, _ in failed}
+                failed += [(key, write, e) for key, write in batch
+                           if key not in raised and not (isinstance(key, tuple) and key[:1] == ("unique",))]
+            try:
+                if self.after_batch is not None:
+                    self.after_batch()
+            except Exception as e:
+                self.report(e)
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._condition:
+                self.writes += len(batch) - len(failed)
+                self.batches += 1
+                self.last_flush_ms = elapsed_ms
+                self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+                reported, requeued = self._requeue(failed)
+                self._busy = False
+                self._condition.notify_all()
+
+            for e in reported:
+                self.report(e)
+            if requeued:
+                time.sleep(self.retry_delay)
+
+
+    def _requeue(self, failed):
+        """
+        Put failed writes back at the front of the queue, in their original order.
+        A newer write to the same key replaces the failed one (merged with it if it has a merge).
+        Must be called with the condition held.
+        Arguments:
+            failed(list): (key, write, exception) per failed write
+        Returns:
+            tuple: (exceptions to report, number of writes put back)
+        """
+        reported, requeued = [], 0
+        for key, (function, args, kwargs, merge, attempts, keep), e in reversed(failed):
+            if attempts >= self.retries:
+                if not keep or self._closed:
+                    reported.append(e)
+                    continue
+                #a kept write is reported once and then retried until it succeeds
+                if attempts == self.retries:
+                    reported.append(e)
+            newer = self._pending.get(key)
+            if newer is not None:
+                if newer[3] is None:
+                    continue #the newer write replaces the failed one
+                function, args, kwargs = newer[0], newer[3](args, newer[1]), newer[2]
+            self._pending[key] = (function, args, kwargs, merge, attempts + 1, keep)
+            self._pending.move_to_end(key, last=False)
+            self.retried += 1
+            requeued += 1
+        return reported, requeued
+
+
+    def report(self, e):
+        """Keep an exception for the stats and hand it to on_error"""
+        self.errors.append(e)
+        try:
+            self.on_error(e)
+        except Exception as error:
+            print(f"Unable to report a save error: {error}")
+
+
+    def flush(self, timeout=None):
+        """
+        Block until every queued write has been performed.
+        Arguments:
+            timeout(float): maximum seconds to wait (None waits forever)
+        Returns:
+            bool: True if the queue drained, False on timeout
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+
+    def close(self):
+        """Write everything still queued and stop the worker thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._worker.join()
+
+
+def merge_list_changes(queued_args, new_args):
+    """
+    Combine two queued StorageBackend.save_changes calls for the same list into one.
+    Arguments:
+        queued_args(tuple): (client_id, key, changes, length) still waiting
+        new_args(tuple): (client_id, key, changes, length) just submitted
+    Returns:
+        tuple: arguments for one save_changes call with the same result as both
+    """
+    client_id, key, queued_changes, _ = queued_args
+    _, _, new_changes, length = new_args
+    changes = dict(queued_changes)
+    changes.update(new_changes)
+    return client_id, key, {position: item for position, item in changes.items() if position < length}, length